@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""
+Measures the CPU cost of polling an idle camera: the receive loop calling
+avRecvFrameData2 and getting AV_ER_DATA_NOREADY back.  Compares the
+exception-raising wrapper with the status-code fast path.
+
+The vendor library is replaced by a function that returns NOREADY straight
+away, so the figures are the python-side overhead per poll only.  Run from
+the code directory:
+
+    python3 -m benchmarks.recv_idle
+"""
+
+import argparse
+import ctypes as c
+import logging
+import time
+import tutk_wrapper.wrapper as tw
+import tutk_wrapper.models as tm
+import tutk_wrapper.exceptions as te
+import tutk_wrapper.constants as tc
+import tutk_wrapper.shared as shared
+from tutk_proxy.models import RECV_RETRY_CODES
+
+log = logging.getLogger(__name__)
+
+# the receive loop sleeps 10ms between empty polls
+POLLS_PER_SECOND = 100
+
+
+class IdleFunction():
+    argtypes = None
+    restype = None
+
+    def __call__(self, *args) -> int:
+        return tc.AVErrorCode.AV_ER_DATA_NOREADY.value
+
+
+class IdleLibrary():
+    def __init__(self) -> None:
+        self.avRecvFrameData2 = IdleFunction()
+
+
+def get_args() -> dict:
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '-n',
+        '--polls',
+        required=False,
+        default=200000,
+        type=int,
+        help='polls per measurement'
+    )
+
+    return parser.parse_args()
+
+
+def poll_exceptions(polls: int, args: tuple) -> None:
+    """
+    The receive loop before the fast path.
+    """
+    for _ in range(polls):
+        try:
+            tw.avRecvFrameData2(*args)
+        except te.TutkLibraryException as e:
+            log.debug(f'got tutk library exception {e}')
+
+            if e.args[0] in (
+                tc.AVErrorCode.AV_ER_DATA_NOREADY,
+                tc.AVErrorCode.AV_ER_LOSED_THIS_FRAME,
+                tc.AVErrorCode.AV_ER_INCOMPLETE_FRAME
+            ):
+                continue
+
+
+def poll_status_codes(polls: int, args: tuple) -> None:
+    """
+    The receive loop with avRecvFrameData2_rc.
+    """
+    for _ in range(polls):
+        rc = tw.avRecvFrameData2_rc(*args)
+
+        if rc < 0 and rc in RECV_RETRY_CODES:
+            continue
+
+
+def measure(poll, polls: int, args: tuple) -> float:
+    """
+    Returns CPU seconds per poll.
+    """
+    started = time.process_time()
+    poll(polls, args)
+
+    return (time.process_time() - started) / polls
+
+
+if __name__ == "__main__":
+    args = get_args()
+    logging.basicConfig(level=logging.INFO)
+
+    shared.library_instance = IdleLibrary()
+    shared.av_initialized = True
+
+    buffer = c.create_string_buffer(1024)
+    recv_args = (
+        0,
+        buffer,
+        len(buffer),
+        c.c_int(),
+        c.c_int(),
+        tm.FRAMEINFO(),
+        c.sizeof(tm.FRAMEINFO),
+        c.c_int(),
+        c.c_int()
+    )
+
+    for name, poll in (
+        ('exceptions', poll_exceptions),
+        ('status codes', poll_status_codes)
+    ):
+        per_poll = measure(poll, args.polls, recv_args)
+        print(
+            f'{name:>12}: {per_poll * 1e6:6.2f} us/poll, '
+            f'{per_poll * POLLS_PER_SECOND * 100:6.3f}% of a core per idle '
+            f'camera'
+        )
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""
+Compares polling for frames every STREAM_POLL_INTERVAL with waiting on
+channel callbacks (ChannelWakeup), for an idle camera's CPU use and for the
+latency from a frame arriving to the receive loop picking it up.
+
+The vendor library is replaced by functions that report a frame ready when
+a producer thread says so.  In callback mode, that thread calls the
+registered ctypes callback, as the library's own threads would.  Run from
+the code directory:
+
+    python3 -m benchmarks.recv_wakeup
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+import tutk_wrapper.wrapper as tw
+import tutk_wrapper.constants as tc
+import tutk_wrapper.shared as shared
+from tutk_proxy.arena import (
+    FrameArena,
+    recv_frames
+)
+from tutk_proxy.wakeup import ChannelWakeup
+from tutk_proxy.constants import (
+    STREAM_POLL_INTERVAL,
+    WAKEUP_TIMEOUT
+)
+
+
+class FakeFunction():
+    argtypes = None
+    restype = None
+
+    def __init__(self, func) -> None:
+        self.func = func
+
+    def __call__(self, *args) -> int:
+        return self.func(*args)
+
+
+class FakeLibrary():
+    """
+    Has a frame ready whenever ready_at is set.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.ready_at: list[float] = list()
+        self.callback = None
+        self.avRecvFrameData2 = FakeFunction(self._recv)
+        self.IOTC_Session_Set_Channel_RcvCb = FakeFunction(self._set_callback)
+
+    def _recv(self, *args) -> int:
+        with self.lock:
+            if not self.ready_at:
+                return tc.AVErrorCode.AV_ER_DATA_NOREADY.value
+
+            self.ready_at.pop(0)
+
+        return 1
+
+    def _set_callback(self, session_id, channel_id, callback, user_data):
+        self.callback = callback if callback else None
+
+        return 0
+
+    def deliver(self) -> None:
+        with self.lock:
+            self.ready_at.append(time.perf_counter())
+
+        if self.callback:
+            self.callback(0, 0, None, 1, None)
+
+
+def get_args() -> dict:
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '-d',
+        '--duration',
+        required=False,
+        default=5,
+        type=float,
+        help='seconds per measurement'
+    )
+
+    parser.add_argument(
+        '-r',
+        '--rate',
+        required=False,
+        default=20,
+        type=float,
+        help='frames per second delivered in the latency measurement'
+    )
+
+    return parser.parse_args()
+
+
+def receive(
+    library: FakeLibrary,
+    wakeup: ChannelWakeup,
+    duration_s: float
+) -> tuple[float, int, list[float]]:
+    """
+    Runs a receive loop for duration_s.  Returns (CPU seconds, wakeups,
+    latencies).
+    """
+    arena = FrameArena()
+    wakeups = 0
+    latencies = list()
+    deadline = time.monotonic() + duration_s
+    started = time.process_time()
+
+    while time.monotonic() < deadline:
+        with library.lock:
+            pending = list(library.ready_at)
+
+        recv_frames(0, 64, arena)
+        now = time.perf_counter()
+        latencies.extend(now - t for t in pending[:len(arena)])
+
+        if len(arena):
+            continue
+
+        wakeups += 1
+        if wakeup:
+            wakeup.wait(WAKEUP_TIMEOUT)
+        else:
+            time.sleep(STREAM_POLL_INTERVAL)
+
+    arena.release()
+
+    return time.process_time() - started, wakeups, latencies
+
+
+def produce(
+    library: FakeLibrary,
+    rate: float,
+    duration_s: float
+) -> None:
+    deadline = time.monotonic() + duration_s
+
+    while time.monotonic() < deadline:
+        time.sleep(random.expovariate(rate))
+        library.deliver()
+
+
+def measure(
+    name: str,
+    event_driven: bool,
+    args: dict
+) -> None:
+    library = FakeLibrary()
+    shared.library_instance = library
+    shared.av_initialized = True
+    shared.prototypes.clear()
+    wakeup = ChannelWakeup(0) if event_driven else None
+
+    cpu_s, wakeups, _ = receive(library, wakeup, args.duration)
+    print(
+        f'{name:>9} idle: {cpu_s / args.duration * 100:6.3f}% of a core, '
+        f'{wakeups / args.duration:6.1f} wakeups/s'
+    )
+
+    producer = threading.Thread(
+        target=produce,
+        args=(library, args.rate, args.duration)
+    )
+    producer.start()
+    _, _, latencies = receive(library, wakeup, args.duration)
+    producer.join()
+
+    if latencies:
+        latencies.sort()
+        print(
+            f'{name:>9} latency: median '
+            f'{statistics.median(latencies) * 1000:6.3f}ms, p99 '
+            f'{latencies[int(len(latencies) * 0.99)] * 1000:6.3f}ms '
+            f'over {len(latencies)} frames'
+        )
+
+    if wakeup:
+        wakeup.close()
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    measure('polling', False, args)
+    measure('callback', True, args)
@@ -0,0 +1,42 @@
+import pytest
+import tutk_wrapper.shared as shared
+from tutk_proxy.models import (
+    TutkDevice,
+    TutkDeviceSettings
+)
+from .fakes import FakeLibrary
+
+
+@pytest.fixture
+def library(monkeypatch) -> FakeLibrary:
+    """
+    Loads a FakeLibrary in place of the vendor library.
+    """
+    library = FakeLibrary()
+    monkeypatch.setattr(shared, 'library_instance', library)
+    monkeypatch.setattr(shared, 'av_initialized', True)
+    monkeypatch.setattr(shared, 'prototypes', dict())
+
+    return library
+
+
+@pytest.fixture
+def device(library) -> TutkDevice:
+    """
+    A device with a session open on the fake library.
+    """
+    device = TutkDevice(
+        uid='TESTUID0000000000001',
+        ip_address='127.0.0.1',
+        device_settings=TutkDeviceSettings(
+            username='admin',
+            password='password',
+            timeout_s=1
+        )
+    )
+    device.device_state.client_sid = 1
+    device.device_state.device_sid = 1
+
+    yield device
+
+    device.disconnect()
@@ -0,0 +1,54 @@
+from multiprocessing.connection import Connection
+import time
+from tutk_proxy.models import TutkDeviceStreamInfo
+
+STATUS_INTERVAL = 0.05
+
+
+def worker_main(
+    worker_id: int,
+    conn: Connection,
+    library_path: str,
+    lan_first: bool,
+    max_devices: int,
+    log_level: int
+) -> None:
+    """
+    Speaks the worker protocol without a library.  Each camera's status
+    carries the worker running it as fps and its port as last_frame_size.
+    """
+    cameras: dict[str, TutkDeviceStreamInfo] = dict()
+
+    try:
+        while True:
+            if conn.poll(STATUS_INTERVAL):
+                command, *args = conn.recv()
+
+                if command == 'start':
+                    uid, settings, ip_address, port = args
+                    cameras[uid] = TutkDeviceStreamInfo(
+                        fps=worker_id,
+                        last_frame_size=port
+                    )
+                elif command == 'stop':
+                    uid, = args
+                    cameras.pop(uid, None)
+                    conn.send(('stopped', uid))
+                elif command == 'exit':
+                    break
+
+            conn.send(('status', dict(cameras)))
+    except (EOFError, OSError):
+        pass
+
+
+def scan_main(
+    conn: Connection,
+    library_path: str,
+    lan_first: bool,
+    timeout_ms: int,
+    max_devices: int,
+    log_level: int
+) -> None:
+    conn.send({'FAKEUID0000000000001': ('192.0.2.1', 32761)})
+    time.sleep(0.01)
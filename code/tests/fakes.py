@@ -0,0 +1,162 @@
+from collections import deque
+import ctypes as c
+import threading
+import time
+import tutk_wrapper.constants as tc
+
+
+class FakeFunction():
+    """
+    Stands in for a ctypes library function: accepts argtypes and restype,
+    records its calls and delegates to impl.
+    """
+    def __init__(
+        self,
+        name: str,
+        impl
+    ) -> None:
+        self.name = name
+        self.impl = impl
+        self.argtypes = None
+        self.restype = None
+        self.calls: list[tuple] = list()
+
+    def __call__(self, *args):
+        self.calls.append(args)
+
+        return self.impl(*args)
+
+
+class FakeLibrary():
+    """
+    Stands in for the vendor library.  Functions succeed by default;
+    set(name, impl) overrides one.  A device streams the frames queued with
+    queue_frame(), and ioctrl responses queued with queue_ioctrl().
+    """
+    def __init__(self) -> None:
+        self.functions: dict[str, FakeFunction] = dict()
+        self.frames: deque = deque()
+        self.ioctrls: deque = deque()
+        self.session_mode = 2
+        self.next_sid = 0
+        self.lock = threading.Lock()
+
+        self.set('avRecvFrameData2', self._recv_frame)
+        self.set('avRecvIOCtrl', self._recv_ioctrl)
+        self.set('IOTC_Session_Check', self._session_check)
+        self.set('IOTC_Get_SessionID', self._get_session_id)
+        self.set('IOTC_Connect_ByUID_Parallel', lambda uid, sid: sid)
+        self.set('avClientStart2', lambda *args: 0)
+        self.set('avResendBufUsageRate', lambda channel_id: 0.0)
+
+    def set(
+        self,
+        name: str,
+        impl
+    ) -> FakeFunction:
+        function = FakeFunction(name, impl)
+        self.functions[name] = function
+
+        return function
+
+    def __getattr__(self, name: str) -> FakeFunction:
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        functions = self.__dict__['functions']
+
+        if name not in functions:
+            functions[name] = FakeFunction(name, lambda *args: 0)
+
+        return functions[name]
+
+    def calls(self, name: str) -> list[tuple]:
+        return getattr(self, name).calls
+
+    def _get_session_id(self) -> int:
+        with self.lock:
+            self.next_sid += 1
+
+            return self.next_sid
+
+    def _session_check(
+        self,
+        session_id: int,
+        session_info
+    ) -> int:
+        session_info.Mode = self.session_mode
+
+        return 0
+
+    def queue_frame(
+        self,
+        data: bytes,
+        keyframe: bool = False,
+        timestamp: int = 0,
+        frame_number: int = None
+    ) -> None:
+        with self.lock:
+            self.frames.append((
+                data,
+                1 if keyframe else 0,
+                timestamp,
+                len(self.frames) if frame_number is None else frame_number
+            ))
+
+    def _recv_frame(
+        self,
+        channel_id,
+        buffer,
+        buffer_size,
+        size_received,
+        size_sent,
+        frame_info,
+        frame_info_size,
+        frame_info_size_received,
+        frame_number
+    ) -> int:
+        with self.lock:
+            if not self.frames:
+                return tc.AVErrorCode.AV_ER_DATA_NOREADY
+
+            data, flags, timestamp, number = self.frames.popleft()
+
+        # as the library does, a frame that doesn't fit is dropped
+        if len(data) > buffer_size:
+            size_sent.value = len(data)
+            return tc.AVErrorCode.AV_ER_BUFPARA_MAXSIZE_INSUFF
+
+        c.memmove(c.cast(buffer, c.c_void_p).value, data, len(data))
+        size_received.value = len(data)
+        size_sent.value = len(data)
+        frame_info.flags = flags
+        frame_info.timestamp = timestamp
+        frame_info.codec_id = 78
+        frame_number.value = number
+
+        return len(data)
+
+    def queue_ioctrl(
+        self,
+        message_type: int,
+        payload: bytes
+    ) -> None:
+        self.ioctrls.append((message_type, payload))
+
+    def _recv_ioctrl(
+        self,
+        channel_id,
+        message_type,
+        buffer,
+        max_size,
+        timeout_ms
+    ) -> int:
+        if not self.ioctrls:
+            time.sleep(0.005)
+            return tc.AVErrorCode.AV_ER_TIMEOUT
+
+        response_type, payload = self.ioctrls.popleft()
+        message_type.value = response_type
+        c.memmove(buffer, payload, len(payload))
+
+        return len(payload)
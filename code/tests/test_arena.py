@@ -0,0 +1,107 @@
+import pytest
+import tutk_wrapper.constants as tc
+from tutk_proxy.arena import (
+    FrameArena,
+    recv_frames
+)
+from tutk_proxy.buffers import FrameBufferPool
+from tutk_proxy.constants import (
+    FRAME_BUFFER_MIN_SIZE,
+    FRAME_BUFFER_HEADROOM,
+    FRAME_BUFFER_SHRINK_AFTER
+)
+
+
+@pytest.fixture
+def arena() -> FrameArena:
+    arena = FrameArena(
+        size=4 * FRAME_BUFFER_MIN_SIZE,
+        max_frames=8,
+        pool=FrameBufferPool()
+    )
+    arena.reserve = FRAME_BUFFER_MIN_SIZE
+
+    yield arena
+
+    arena.release()
+
+
+def test_receives_burst_back_to_back(library, arena):
+    for i in range(3):
+        library.queue_frame(bytes([i]) * (i + 1), keyframe=not i)
+
+    rc = recv_frames(0, 8, arena)
+
+    assert rc == tc.AVErrorCode.AV_ER_DATA_NOREADY
+    assert len(arena) == 3
+    assert [arena.data(i) for i in range(3)] == [b'\x00', b'\x01' * 2,
+                                                  b'\x02' * 3]
+    assert list(arena.offsets[:3]) == [0, 1, 3]
+    assert list(arena.frame_numbers[:3]) == [0, 1, 2]
+    assert arena.frame_infos[0].flags == 1
+
+
+def test_stops_at_max_frames(library, arena):
+    for i in range(5):
+        library.queue_frame(b'p')
+
+    rc = recv_frames(0, 2, arena)
+
+    # more are ready; the caller comes straight back for them
+    assert rc >= 0
+    assert len(arena) == 2
+
+    recv_frames(0, 8, arena)
+
+    assert len(arena) == 3
+    assert list(arena.frame_numbers[:3]) == [2, 3, 4]
+
+
+def test_stops_when_reserve_no_longer_fits(library, arena):
+    for i in range(5):
+        library.queue_frame(b'p' * FRAME_BUFFER_MIN_SIZE)
+
+    recv_frames(0, 8, arena)
+
+    # a partial burst; the rest stays queued for the next one
+    assert len(arena) == 4
+    assert len(library.frames) == 1
+
+
+def test_oversize_frame_grows_arena(library, arena):
+    size = 3 * FRAME_BUFFER_MIN_SIZE
+    library.queue_frame(b'k' * size, keyframe=True)
+    library.queue_frame(b'p')
+
+    rc = recv_frames(0, 8, arena)
+
+    # the library dropped the keyframe but the burst carried on
+    assert rc == tc.AVErrorCode.AV_ER_DATA_NOREADY
+    assert arena.oversize_frames == 1
+    assert [arena.data(i) for i in range(len(arena))] == [b'p']
+    assert arena.reserve == int(size * FRAME_BUFFER_HEADROOM)
+
+    # the buffer is replaced before the next burst, which now fits
+    library.queue_frame(b'k' * size, keyframe=True)
+    recv_frames(0, 8, arena)
+
+    assert arena.size >= arena.reserve
+    assert arena.data(0) == b'k' * size
+
+
+def test_reserve_shrinks_after_quiet_period(arena):
+    arena.observe(8 * FRAME_BUFFER_MIN_SIZE)
+
+    assert not arena.maybe_shrink(arena.window_start + 1)
+
+    arena.observe(100)
+
+    assert not arena.maybe_shrink(
+        arena.window_start + FRAME_BUFFER_SHRINK_AFTER
+    )
+
+    # nothing large was seen in the window that just ended
+    arena.observe(100)
+
+    assert arena.maybe_shrink(arena.window_start + FRAME_BUFFER_SHRINK_AFTER)
+    assert arena.reserve == FRAME_BUFFER_MIN_SIZE
@@ -0,0 +1,62 @@
+import ctypes as c
+from tutk_proxy.buffers import (
+    AdaptiveFrameBuffer,
+    FrameBufferPool,
+    bucket_size
+)
+from tutk_proxy.constants import (
+    FRAME_BUFFER_MIN_SIZE,
+    FRAME_BUFFER_MAX_SIZE,
+    FRAME_BUFFER_HEADROOM
+)
+
+
+def test_bucket_size_rounds_up_and_clamps():
+    assert bucket_size(1) == FRAME_BUFFER_MIN_SIZE
+    assert bucket_size(FRAME_BUFFER_MIN_SIZE + 1) == 2 * FRAME_BUFFER_MIN_SIZE
+    assert bucket_size(10 * FRAME_BUFFER_MAX_SIZE) == FRAME_BUFFER_MAX_SIZE
+
+
+def test_pool_reuses_released_buffers():
+    pool = FrameBufferPool(max_idle=1)
+    first = pool.acquire(1000)
+    second = pool.acquire(1000)
+
+    pool.release(first)
+    pool.release(second)
+
+    # one idle buffer is kept per bucket; the other is left to the gc
+    assert pool.acquire(FRAME_BUFFER_MIN_SIZE) is first
+    assert pool.acquire(FRAME_BUFFER_MIN_SIZE) is not second
+    assert c.sizeof(pool.acquire(2 * FRAME_BUFFER_MIN_SIZE)) \
+        == 2 * FRAME_BUFFER_MIN_SIZE
+
+
+def test_adaptive_buffer_grows_to_fit():
+    pool = FrameBufferPool()
+    frame_buffer = AdaptiveFrameBuffer(FRAME_BUFFER_MIN_SIZE, pool)
+    small = frame_buffer.buffer
+
+    assert not frame_buffer.observe(FRAME_BUFFER_MIN_SIZE)
+
+    size = 3 * FRAME_BUFFER_MIN_SIZE
+
+    assert frame_buffer.observe(size)
+    assert frame_buffer.size == bucket_size(int(size * FRAME_BUFFER_HEADROOM))
+    assert frame_buffer.resizes == 1
+
+    # the outgrown buffer went back to the pool for the next stream
+    assert pool.acquire(FRAME_BUFFER_MIN_SIZE) is small
+
+    large = frame_buffer.buffer
+    frame_buffer.release()
+
+    assert frame_buffer.buffer is None
+    assert pool.acquire(size) is large
+
+
+def test_adaptive_buffer_stops_at_max_size():
+    frame_buffer = AdaptiveFrameBuffer(FRAME_BUFFER_MAX_SIZE, FrameBufferPool())
+
+    assert not frame_buffer.observe(2 * FRAME_BUFFER_MAX_SIZE)
+    assert frame_buffer.size == FRAME_BUFFER_MAX_SIZE
@@ -0,0 +1,137 @@
+import time
+import tutk_wrapper.constants as tc
+import tutk_proxy.connect as connect
+import tutk_proxy.sessionpath as sessionpath
+from tutk_proxy.connect import ConnectOperation
+from tutk_proxy.capacity import SessionCapacity
+from tutk_proxy.constants import IOTCSessionMode
+from tutk_proxy.sessionpath import SessionPathMonitor
+
+
+def test_spare_sessions_dont_queue():
+    capacity = SessionCapacity(limit=1, spare=1)
+
+    assert capacity.acquire_spare()
+    assert not capacity.acquire_spare()
+
+    capacity.release_spare()
+
+    assert capacity.acquire_spare()
+    assert capacity.acquire(timeout_s=0)
+
+
+def test_standby_needs_a_spare_session(device, library, monkeypatch):
+    capacity = SessionCapacity(limit=4, spare=0)
+    monkeypatch.setattr(sessionpath, 'session_capacity', capacity)
+    library.session_mode = IOTCSessionMode.RLY
+
+    path = SessionPathMonitor(device, interval_s=0)
+    path.sample()
+
+    assert path.thread is None
+    assert not library.calls('IOTC_Connect_ByUID_Parallel')
+
+    path.close()
+
+
+def test_failed_standby_frees_its_spare(device, library, monkeypatch):
+    capacity = SessionCapacity(limit=4, spare=1)
+    monkeypatch.setattr(sessionpath, 'session_capacity', capacity)
+    library.session_mode = IOTCSessionMode.RLY
+
+    path = SessionPathMonitor(device, interval_s=0)
+    path.sample()
+
+    deadline = time.monotonic() + 5
+    while path.thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert library.calls('IOTC_Connect_ByUID_Parallel')
+
+    # the standby came up relayed too, so it was discarded
+    assert path.standby is None
+    assert capacity.spare_in_use == 0
+
+    path.close()
+
+
+def test_standby_closed_when_its_check_fails(device, library, monkeypatch):
+    capacity = SessionCapacity(limit=4, spare=1)
+    monkeypatch.setattr(sessionpath, 'session_capacity', capacity)
+    library.session_mode = IOTCSessionMode.RLY
+    checks = list()
+
+    # the streaming session checks out; the standby fails right after login
+    def session_check(sid, info) -> int:
+        checks.append(sid)
+
+        if len(checks) > 1:
+            return tc.IOTCErrorCode.IOTC_ER_REMOTE_TIMEOUT_DISCONNECT
+
+        return library._session_check(sid, info)
+
+    library.set('IOTC_Session_Check', session_check)
+
+    path = SessionPathMonitor(device, interval_s=0)
+    path.sample()
+
+    deadline = time.monotonic() + 5
+    while path.thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert path.standby is None
+    assert library.calls('IOTC_Session_Close') == [(checks[1],)]
+    assert capacity.spare_in_use == 0
+
+    path.close()
+
+
+def test_limit_restored_once_sessions_free_up():
+    capacity = SessionCapacity(limit=4)
+
+    for _ in range(3):
+        assert capacity.acquire(timeout_s=0)
+
+    # the third connect found the library out of sessions
+    capacity.exceeded(Exception('IOTC_ER_EXCEED_MAX_SESSION'))
+    capacity.release()
+
+    assert capacity.limit == 2
+    assert not capacity.acquire(timeout_s=0)
+
+    capacity.release()
+
+    assert capacity.limit == 4
+    assert capacity.acquire(timeout_s=0)
+
+
+def test_hedged_attempts_need_a_spare_session(library, monkeypatch):
+    capacity = SessionCapacity(limit=4, spare=0)
+    monkeypatch.setattr(connect, 'session_capacity', capacity)
+    def slow_connect(uid, sid) -> int:
+        time.sleep(0.2)
+        return sid
+
+    library.set('IOTC_Connect_ByUID_Parallel', slow_connect)
+
+    operation = ConnectOperation('UID', deadline_s=1, hedge_after_s=0.05)
+    operation.run()
+
+    assert len(library.calls('IOTC_Connect_ByUID_Parallel')) == 1
+
+
+def test_hedged_attempts_free_their_spares(library, monkeypatch):
+    capacity = SessionCapacity(limit=4, spare=2)
+    monkeypatch.setattr(connect, 'session_capacity', capacity)
+
+    def slow_connect(uid, sid) -> int:
+        time.sleep(0.2)
+        return sid
+
+    library.set('IOTC_Connect_ByUID_Parallel', slow_connect)
+
+    operation = ConnectOperation('UID', deadline_s=1, hedge_after_s=0.05)
+    operation.run()
+
+    assert len(library.calls('IOTC_Connect_ByUID_Parallel')) > 1
+    assert capacity.spare_in_use == 0
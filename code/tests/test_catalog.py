@@ -0,0 +1,119 @@
+from concurrent.futures import TimeoutError
+import errno
+import io
+import os
+import sqlite3
+import pytest
+import tutk_proxy.catalog as catalog_module
+from tutk_proxy.frames import TutkFrame
+from tutk_proxy.catalog import (
+    copy_range,
+    RecordingCatalog,
+    RecordingSink
+)
+
+
+@pytest.fixture
+def catalog(tmp_path) -> RecordingCatalog:
+    catalog = RecordingCatalog(str(tmp_path / 'catalog.db'))
+
+    yield catalog
+
+    catalog.close()
+
+
+def keyframe(timestamp: int) -> TutkFrame:
+    return TutkFrame(flags=1, timestamp=timestamp)
+
+
+def test_open_segment_returns_committed_id(catalog):
+    segment_id = catalog.open_segment('A', '/a.h264', 10, 0)
+
+    with catalog.read_lock:
+        rows = catalog.reader.execute(
+            'SELECT id, uid FROM segments'
+        ).fetchall()
+
+    assert rows == [(segment_id, 'A')]
+
+
+def test_open_segment_fails_with_batch(catalog, monkeypatch):
+    def fail(*args):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(catalog, '_apply', fail)
+
+    with pytest.raises(sqlite3.OperationalError):
+        catalog.open_segment('A', '/a.h264', 10, 0, timeout_s=1)
+
+
+def test_recording_rejects_unseekable_file(catalog):
+    class Pipe(io.BytesIO):
+        name = '<stdout>'
+
+        def seekable(self) -> bool:
+            return False
+
+    with pytest.raises(ValueError):
+        RecordingSink(catalog, 'A', Pipe())
+
+
+def test_recording_continues_without_catalog(tmp_path):
+    class StalledCatalog():
+        def open_segment(self, *args):
+            raise TimeoutError()
+
+    with open(tmp_path / 'a.h264', 'ab') as dest_file:
+        sink = RecordingSink(StalledCatalog(), 'A', dest_file)
+        sink.write(TutkFrame(), b'p')
+        sink.write(keyframe(1), b'key')
+        sink.write(TutkFrame(), b'p')
+        sink.flush()
+
+    assert sink.catalog is None
+    assert (tmp_path / 'a.h264').read_bytes() == b'keyp'
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'source.h264'
+    path.write_bytes(bytes(range(256)) * 4)
+
+    with open(path, 'rb') as f:
+        yield f
+
+
+def refuse(code: int):
+    def copy_file_range(*args):
+        raise OSError(code, os.strerror(code))
+
+    return copy_file_range
+
+
+def test_copy_range_falls_back_to_sendfile(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        catalog_module.os,
+        'copy_file_range',
+        refuse(errno.EXDEV),
+        raising=False
+    )
+
+    with open(tmp_path / 'clip.h264', 'wb') as dest:
+        assert copy_range(source.fileno(), dest.fileno(), 256, 512) == 512
+
+    assert (tmp_path / 'clip.h264').read_bytes() == bytes(range(256)) * 2
+
+
+def test_copy_range_raises_io_errors(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        catalog_module.os,
+        'copy_file_range',
+        refuse(errno.ENOSPC),
+        raising=False
+    )
+
+    with open(tmp_path / 'clip.h264', 'wb') as dest:
+        with pytest.raises(OSError) as e:
+            copy_range(source.fileno(), dest.fileno(), 0, 512)
+
+    assert e.value.errno == errno.ENOSPC
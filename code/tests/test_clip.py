@@ -0,0 +1,35 @@
+import os
+import stat
+import pytest
+from tutk_proxy.catalog import ClipRange
+from tutk_proxy.clip import remux_mp4
+
+FAILING_FFMPEG = """#!/bin/sh
+for arg; do dest="$arg"; done
+echo "invalid data found" >&2
+: > "$dest"
+exit 1
+"""
+
+
+@pytest.fixture
+def ffmpeg(tmp_path, monkeypatch) -> None:
+    path = tmp_path / 'bin' / 'ffmpeg'
+    path.parent.mkdir()
+    path.write_text(FAILING_FFMPEG)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', str(path.parent), prepend=os.pathsep)
+
+
+def test_ffmpeg_exiting_early_is_reported(tmp_path, ffmpeg):
+    recording = tmp_path / 'a.h264'
+    recording.write_bytes(bytes(4 * 1024 * 1024))
+    dest_path = tmp_path / 'a.mp4'
+
+    with pytest.raises(RuntimeError, match='invalid data found'):
+        remux_mp4(
+            [ClipRange(str(recording), 0, 10, 0, 4 * 1024 * 1024, 0)],
+            str(dest_path)
+        )
+
+    assert not dest_path.exists()
@@ -0,0 +1,126 @@
+import threading
+import time
+import pytest
+from tutk_proxy.cluster import (
+    ClusterCoordinator,
+    ClusterNode
+)
+
+UIDS = [f'CAMERA{i:02d}' for i in range(12)]
+
+
+class Node():
+    """
+    A ClusterNode whose cameras are just recorded.
+    """
+    def __init__(
+        self,
+        node_id: str,
+        coordinator: ClusterCoordinator
+    ) -> None:
+        self.running: set[str] = set()
+        self.lock = threading.Lock()
+        self.node = ClusterNode(
+            node_id=node_id,
+            coordinator=coordinator.address,
+            start=self.start,
+            stop=self.stop,
+            stream_infos=dict,
+            interval_s=0.05,
+            timeout_s=0.5
+        )
+
+    def start(self, uid: str) -> None:
+        with self.lock:
+            self.running.add(uid)
+
+    def stop(self, uid: str) -> None:
+        with self.lock:
+            self.running.discard(uid)
+
+    def cameras(self) -> set[str]:
+        with self.lock:
+            return set(self.running)
+
+
+@pytest.fixture
+def coordinator() -> ClusterCoordinator:
+    coordinator = ClusterCoordinator(uids=UIDS, port=0, timeout_s=0.5)
+    coordinator.start()
+
+    yield coordinator
+
+    if not coordinator.stopped.is_set():
+        coordinator.close()
+
+
+def wait_for(condition, timeout_s: float = 5) -> None:
+    deadline = time.monotonic() + timeout_s
+
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.02)
+
+
+def test_nodes_share_cameras_and_take_over_on_leave(coordinator):
+    a = Node('a', coordinator)
+    b = Node('b', coordinator)
+    a.node.start()
+
+    wait_for(lambda: a.cameras() == set(UIDS))
+
+    b.node.start()
+
+    wait_for(lambda: b.cameras() and a.cameras() | b.cameras() == set(UIDS)
+             and not a.cameras() & b.cameras())
+
+    assert coordinator.assignments() == {
+        'a': sorted(a.cameras()),
+        'b': sorted(b.cameras())
+    }
+
+    b.node.close()
+
+    assert not b.cameras()
+    wait_for(lambda: a.cameras() == set(UIDS))
+
+    a.node.close()
+
+
+def test_partitioned_node_releases_cameras(coordinator):
+    a = Node('a', coordinator)
+    a.node.start()
+
+    wait_for(lambda: a.cameras() == set(UIDS))
+
+    coordinator.close()
+
+    # kept while the lease lasts, then given up
+    time.sleep(0.2)
+    assert a.cameras() == set(UIDS)
+    wait_for(lambda: not a.cameras(), timeout_s=2)
+
+    a.node.close()
+
+
+def test_failed_start_retried_at_next_heartbeat(coordinator):
+    a = Node('a', coordinator)
+    failures = [UIDS[0]]
+    start = a.start
+
+    def flaky_start(uid: str) -> None:
+        if uid in failures:
+            failures.remove(uid)
+            raise FileExistsError(f'/tutk-{uid}')
+
+        start(uid)
+
+    a.node.start_camera = flaky_start
+    a.node.start()
+
+    wait_for(lambda: a.cameras() == set(UIDS))
+
+    assert not failures
+    assert a.node.thread.is_alive()
+
+    a.node.close()
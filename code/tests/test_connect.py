@@ -0,0 +1,124 @@
+import time
+import pytest
+import tutk_proxy.connect as connect
+import tutk_proxy.models as models
+import tutk_proxy.proxy as proxy
+from tutk_proxy.connect import (
+    ConnectLatency,
+    open_all
+)
+from tutk_proxy.constants import (
+    IOTCSessionMode,
+    CONNECT_LAN_SEARCH_TIMEOUT
+)
+from tutk_proxy.models import TutkDevice
+
+
+class SlowDevice():
+    def __init__(self, uid: str, open_s: float) -> None:
+        self.uid = uid
+        self.open_s = open_s
+        self.deadline_s: float = None
+
+    def open(
+        self,
+        deadline_s: float,
+        hedge_after_s: float = None
+    ) -> bool:
+        self.deadline_s = deadline_s
+        time.sleep(min(self.open_s, deadline_s))
+
+        return self.open_s <= deadline_s
+
+    def abort(self) -> None:
+        pass
+
+
+def test_open_all_shares_one_deadline():
+    devices = [SlowDevice(str(i), 0.2) for i in range(4)]
+
+    started = time.monotonic()
+    ready = open_all(devices, deadline_s=0.5, max_workers=1)
+    elapsed = time.monotonic() - started
+
+    assert ready == {'0': True, '1': True, '2': False, '3': False}
+    assert elapsed < 0.7
+    assert devices[1].deadline_s < devices[0].deadline_s
+    assert devices[3].deadline_s is None
+
+
+@pytest.fixture
+def lan_first(monkeypatch):
+    monkeypatch.setattr(connect, 'lan_first', False)
+
+
+def test_lan_first_sets_timeouts_before_enabling(library, lan_first):
+    calls = list()
+
+    for name in (
+        'IOTC_Setup_DetectNetwork_Timeout',
+        'IOTC_Setup_LANConnection_Timeout',
+        'IOTC_Setup_P2PConnection_Timeout'
+    ):
+        library.set(
+            name,
+            lambda timeout_ms, name=name:
+                calls.append((name, timeout_ms)) or 0
+        )
+
+    assert connect.configure_lan_first(
+        lan_timeout_ms=300,
+        p2p_timeout_ms=500,
+        detect_network_timeout_ms=100
+    )
+
+    # search the LAN first, then P2P, giving up on the servers quickly
+    assert calls == [
+        ('IOTC_Setup_DetectNetwork_Timeout', 100),
+        ('IOTC_Setup_LANConnection_Timeout', 300),
+        ('IOTC_Setup_P2PConnection_Timeout', 500)
+    ]
+    assert connect.lan_first_enabled()
+
+
+def test_lan_first_stays_off_without_library_support(library, lan_first):
+    def missing(timeout_ms):
+        raise AttributeError('IOTC_Setup_P2PConnection_Timeout')
+
+    library.set('IOTC_Setup_P2PConnection_Timeout', missing)
+
+    assert not connect.configure_lan_first()
+    assert not connect.lan_first_enabled()
+
+
+def test_lan_first_caps_scan(library, lan_first):
+    library.set('IOTC_Lan_Search2', lambda devices, count, timeout_ms: 0)
+    connect.configure_lan_first()
+
+    proxy.scan_local_subnet(timeout_ms=5000)
+
+    assert library.calls('IOTC_Lan_Search2')[0][2] == \
+        CONNECT_LAN_SEARCH_TIMEOUT
+
+
+def test_connect_latency_kept_by_mode(library, monkeypatch):
+    latency = ConnectLatency(samples=2)
+    monkeypatch.setattr(models, 'connect_latency', latency)
+
+    for mode in (IOTCSessionMode.LAN, IOTCSessionMode.P2P,
+                 IOTCSessionMode.RLY, IOTCSessionMode.LAN,
+                 IOTCSessionMode.LAN):
+        library.session_mode = mode
+        device = TutkDevice(uid='TESTUID0000000000001')
+
+        assert device.connect(deadline_s=1)
+
+        device.disconnect()
+
+    summary = latency.summary()
+
+    # a connect that fell back to P2P or relay isn't counted as LAN
+    assert list(summary) == ['P2P', 'RLY', 'LAN']
+    assert {mode: s['count'] for mode, s in summary.items()} == \
+        {'P2P': 1, 'RLY': 1, 'LAN': 3}
+    assert len(latency.samples[IOTCSessionMode.LAN]) == 2
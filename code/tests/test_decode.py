@@ -0,0 +1,117 @@
+from concurrent.futures import Future
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import tutk_proxy.decode as decode
+from tutk_proxy.decode import DecodeStage
+from tutk_proxy.frames import TutkFrame
+from tutk_proxy.constants import FrameFlag
+
+SPS = b'\x00\x00\x00\x01\x67\x42\x00\x1e'
+PPS = b'\x00\x00\x00\x01\x68\xce\x3c\x80'
+IDR = b'\x00\x00\x00\x01\x65\x88\x84\x00'
+
+
+class FakePool():
+    """
+    Holds submitted decode jobs until the test completes them.
+    """
+    def __init__(self) -> None:
+        self.jobs: list[tuple[Future, tuple]] = list()
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        self.jobs.append((future, args))
+
+        return future
+
+
+@pytest.fixture
+def pool(monkeypatch) -> FakePool:
+    pool = FakePool()
+    monkeypatch.setattr(decode, 'av', object())
+    monkeypatch.setattr(decode, 'get_decode_pool', lambda: pool)
+
+    return pool
+
+
+@pytest.fixture
+def decoded() -> list:
+    return list()
+
+
+@pytest.fixture
+def stage(pool, decoded) -> DecodeStage:
+    stage = DecodeStage(
+        lambda frame, pixels: decoded.append((frame, pixels)),
+        width=4,
+        height=2,
+        slots=1,
+        slot_size=64
+    )
+
+    yield stage
+
+    for future, _ in pool.jobs:
+        future.cancel()
+
+    stage.close()
+
+
+def keyframe(number: int) -> TutkFrame:
+    return TutkFrame(flags=FrameFlag.IPC_FRAME_FLAG_IFRAME, frame_number=number)
+
+
+def finish(stage: DecodeStage, pool: FakePool, value: int) -> None:
+    """
+    Completes the oldest job as a worker would, filling its output slot.
+    """
+    future, (_, length, output_name, width, height, _) = pool.jobs.pop(0)
+    slot = [o.name for o in stage.outputs].index(output_name)
+    stage.outputs[slot].buf[:width * height] = bytes([value]) * width * height
+    future.set_result((height, width))
+
+
+def test_busy_slot_skips_keyframe(stage, pool, decoded):
+    stage.write(keyframe(0), SPS + PPS + IDR)
+    stage.write(keyframe(1), IDR)
+
+    assert len(pool.jobs) == 1
+    assert stage.skipped == 1
+
+    finish(stage, pool, 7)
+
+    # the slot is free again once the first decode is handed back
+    stage.write(keyframe(2), IDR)
+
+    assert len(pool.jobs) == 1
+    assert [frame.frame_number for frame, _ in decoded] == [0]
+    assert decoded[0][1].shape == (2, 4)
+    assert (decoded[0][1] == 7).all()
+
+
+def test_parameter_sets_prepended(stage, pool):
+    stage.write(keyframe(0), SPS + PPS + IDR)
+    finish(stage, pool, 0)
+    stage.write(keyframe(1), IDR)
+
+    _, (input_name, length, *_) = pool.jobs[0]
+
+    assert bytes(stage.inputs[0].buf[:length]) == SPS + PPS + IDR
+
+
+def test_predicted_frames_ignored(stage, pool):
+    stage.write(TutkFrame(), IDR)
+
+    assert not pool.jobs
+
+
+def test_flush_waits_for_pending(stage, pool):
+    stage.write(keyframe(0), SPS + PPS + IDR)
+
+    assert not stage.flush(timeout_s=0.01)
+
+    finish(stage, pool, 0)
+
+    assert stage.flush(timeout_s=0)
@@ -0,0 +1,92 @@
+import os
+import pytest
+from tutk_proxy.frames import TutkFrame
+from tutk_proxy.framebus import (
+    FrameBusWriter,
+    FrameBusReader,
+    ENTRY
+)
+
+
+@pytest.fixture
+def name() -> str:
+    return f'tutk-test-{os.getpid()}'
+
+
+@pytest.fixture
+def writer(name) -> FrameBusWriter:
+    writer = FrameBusWriter(name, slots=4, data_size=64)
+
+    yield writer
+
+    writer.close()
+
+
+def write(writer: FrameBusWriter, data: bytes) -> None:
+    writer.write(TutkFrame(size=len(data)), data)
+
+
+def test_reads_frames_in_order(writer, name):
+    reader = FrameBusReader(name)
+
+    for i in range(3):
+        write(writer, bytes([i]) * 8)
+
+    frames = [reader.read() for _ in range(3)]
+
+    assert [data for _, data in frames] == [bytes([i]) * 8 for i in range(3)]
+    assert reader.read() == (None, None)
+    assert reader.dropped == 0
+
+    reader.close()
+
+
+def test_skips_lapped_frames(writer, name):
+    reader = FrameBusReader(name)
+
+    for i in range(10):
+        write(writer, bytes([i]) * 8)
+
+    frame, data = reader.read()
+
+    assert data == bytes([6]) * 8
+    assert reader.dropped == 6
+
+    reader.close()
+
+
+def test_retries_torn_entry(writer, name, monkeypatch):
+    reader = FrameBusReader(name)
+    write(writer, b'a' * 8)
+
+    # the first read of the entry sees it half written, with a stale offset
+    entry = reader._entry(0)
+    torn = [ENTRY.unpack(ENTRY.pack(entry[0], 32, *entry[2:]))]
+    entries = reader._entry
+    monkeypatch.setattr(
+        reader,
+        '_entry',
+        lambda seq: torn.pop() if torn else entries(seq)
+    )
+
+    frame, data = reader.read()
+
+    assert data == b'a' * 8
+    assert frame.offset == 0
+    assert reader.dropped == 0
+
+    reader.close()
+
+
+def test_create_replaces_stale_bus(name):
+    stale = FrameBusWriter(name, slots=4, data_size=64)
+    write(stale, b'stale')
+
+    writer = FrameBusWriter.create(name)
+    reader = FrameBusReader(name, from_start=True)
+
+    assert reader.read() == (None, None)
+
+    reader.close()
+    writer.close()
+    stale.shm.close()
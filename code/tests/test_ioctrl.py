@@ -0,0 +1,67 @@
+import pytest
+import tutk_wrapper.constants as tc
+import tutk_wrapper.exceptions as te
+
+
+def test_failed_send_fails_request(device, library):
+    library.set(
+        'avSendIOCtrl',
+        lambda *args: tc.AVErrorCode.AV_ER_SENDIOCTRL_ALREADY_CALLED
+    )
+
+    response = device.request_ioctrl(
+        tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_SETSTREAMCTRL_REQ,
+        bytes(8)
+    )
+
+    with pytest.raises(te.TutkLibraryException):
+        response.result(timeout=1)
+
+    assert device.device_state.device_sid is None
+
+
+def test_failed_send_fails_set_stream_quality(device, library):
+    library.set(
+        'avSendIOCtrl',
+        lambda *args: tc.AVErrorCode.AV_ER_SENDIOCTRL_ALREADY_CALLED
+    )
+
+    assert not device.set_stream_quality(
+        quality=tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_LOW
+    )
+    assert not device.set_stream_quality(
+        quality=tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_LOW,
+        wait=False
+    )
+
+
+def test_response_resolves_request(device, library):
+    # reply once the request is sent, as a device would
+    library.set(
+        'avSendIOCtrl',
+        lambda *args: library.queue_ioctrl(
+            tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_SETSTREAMCTRL_RESP,
+            bytes(8)
+        ) or 0
+    )
+
+    assert device.set_stream_quality(
+        quality=tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_LOW
+    )
+
+
+def test_sync_time_doesnt_wait_for_acknowledgement(device, library):
+    assert device.sync_time()
+
+    message_types = [call[1] for call in library.calls('avSendIOCtrl')]
+
+    assert message_types == [tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_SET_TIME]
+
+
+def test_sync_time_reports_failed_send(device, library):
+    library.set(
+        'avSendIOCtrl',
+        lambda *args: tc.AVErrorCode.AV_ER_SENDIOCTRL_ALREADY_CALLED
+    )
+
+    assert not device.sync_time()
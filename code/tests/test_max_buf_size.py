@@ -0,0 +1,33 @@
+import tutk_proxy.models as models
+
+
+def start(device, library) -> list[bool]:
+    held = list()
+    library.set(
+        'avClientStart2',
+        lambda *args: held.append(models.av_client_start_lock.locked()) or 0
+    )
+    device._start_av_client(1, 0, 1)
+
+    return held
+
+
+def test_unsized_clients_start_in_parallel(device, library, monkeypatch):
+    monkeypatch.setattr(models, 'av_client_max_buf_size_kb', None)
+
+    assert start(device, library) == [False]
+    assert not library.calls('avClientSetMaxBufSize')
+
+
+def test_buffer_size_is_set_once_per_change(device, library, monkeypatch):
+    monkeypatch.setattr(models, 'av_client_max_buf_size_kb', None)
+    device.device_settings.max_buf_size_kb = 512
+
+    assert start(device, library) == [True]
+    assert start(device, library) == [True]
+
+    device.device_settings.max_buf_size_kb = None
+
+    # another device's size is still in effect, so start under the lock
+    assert start(device, library) == [True]
+    assert library.calls('avClientSetMaxBufSize') == [(512,)]
@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from tutk_proxy.motion import (
+    MotionDetector,
+    MotionMonitor
+)
+
+
+@pytest.fixture
+def monitor() -> MotionMonitor:
+    monitor = MotionMonitor(
+        detector=MotionDetector(width=8, height=8),
+        interval_s=60
+    )
+
+    yield monitor
+
+    monitor.stop()
+
+
+def thumbnail(value: int):
+    return np.full((8, 8), value, np.uint8)
+
+
+def test_change_is_motion(monitor):
+    monitor.submit('A', thumbnail(0))
+    monitor.evaluate()
+    monitor.submit('A', thumbnail(255))
+    monitor.evaluate()
+
+    assert monitor.is_active('A')
+
+
+def test_reset_rebuilds_background(monitor):
+    monitor.submit('A', thumbnail(0))
+    monitor.evaluate()
+
+    monitor.reset('A')
+    monitor.submit('A', thumbnail(255))
+    monitor.evaluate()
+    monitor.submit('A', thumbnail(255))
+    monitor.evaluate()
+
+    assert not monitor.is_active('A')
@@ -0,0 +1,63 @@
+import pytest
+import tutk_wrapper.constants as tc
+from tutk_proxy.models import (
+    TutkDevice,
+    TutkDeviceSettings
+)
+from tutk_proxy.pool import TutkSessionPool
+from tutk_proxy.timesync import TimeSyncDaemon
+
+UID = 'TESTUID0000000000001'
+
+
+@pytest.fixture
+def pool(library):
+    pool = TutkSessionPool(
+        TutkDeviceSettings(
+            username='admin',
+            password='password',
+            timeout_s=1
+        ),
+        connect_deadline_s=1
+    )
+    pool.add(TutkDevice(uid=UID, ip_address='127.0.0.1'))
+
+    yield pool
+
+    pool.close()
+
+
+def test_lease_reuses_session(pool, library):
+    with pool.lease(UID) as device:
+        device_sid = device.device_state.device_sid
+
+    with pool.lease(UID) as device:
+        assert device.device_state.device_sid == device_sid
+
+    assert len(library.calls('IOTC_Connect_ByUID_Parallel')) == 1
+
+
+def test_lease_reconnects_failed_session(pool, library):
+    with pool.lease(UID):
+        pass
+
+    check = library.functions['IOTC_Session_Check'].impl
+    failures = [tc.IOTCErrorCode.IOTC_ER_INVALID_SID]
+    library.set(
+        'IOTC_Session_Check',
+        lambda *args: failures.pop() if failures else check(*args)
+    )
+
+    with pool.lease(UID) as device:
+        assert device.device_state.device_sid != None
+
+    assert len(library.calls('IOTC_Connect_ByUID_Parallel')) == 2
+
+
+def test_sync_daemon_leases_from_pool(pool, library):
+    daemon = TimeSyncDaemon(pool)
+
+    # timestamps aren't known to be a clock, so the time is always set
+    assert daemon.sync_all() == {UID: True}
+    assert daemon.sync_all() == {UID: True}
+    assert len(library.calls('IOTC_Connect_ByUID_Parallel')) == 1
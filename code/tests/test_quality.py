@@ -0,0 +1,127 @@
+import tutk_wrapper.models as tm
+import tutk_wrapper.constants as tc
+from tutk_proxy.constants import StreamChannel
+from tutk_proxy.models import TutkDeviceSettings
+from tutk_proxy.quality import StreamQualityGovernor
+
+
+class Device():
+    def __init__(
+        self,
+        uid: str,
+        quality: tc.AvIOCtrlQuality = None
+    ) -> None:
+        self.uid = uid
+        self.device_settings = TutkDeviceSettings(stream_quality=quality)
+        self.requests: list[tuple] = list()
+
+    def set_stream_quality(
+        self,
+        stream_channel: StreamChannel,
+        quality: tc.AvIOCtrlQuality,
+        wait: bool = True
+    ) -> bool:
+        self.requests.append((stream_channel, quality))
+        self.device_settings.stream_channel = stream_channel
+        self.device_settings.stream_quality = quality
+
+        return True
+
+
+def check(
+    governor: StreamQualityGovernor,
+    device: Device,
+    kilobytes: int
+) -> None:
+    governor.last_check -= 1
+    governor.record(device, kilobytes * 1000)
+    governor.check()
+
+    # the device's own receive loop sends any change on its next frame
+    governor.record(device, 0)
+
+
+def test_restores_configured_quality():
+    governor = StreamQualityGovernor(max_bandwidth_kbps=1000, interval_s=60)
+    device = Device('A', tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_HIGH)
+    governor.register(device)
+
+    check(governor, device, 1000)
+    check(governor, device, 0)
+
+    assert device.requests == [
+        (StreamChannel.SUB, tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_LOW),
+        (StreamChannel.MAIN, tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_HIGH)
+    ]
+    assert not governor.demoted
+
+
+def test_restores_max_without_configured_quality():
+    governor = StreamQualityGovernor(max_bandwidth_kbps=1000, interval_s=60)
+    device = Device('A')
+    governor.register(device)
+
+    check(governor, device, 1000)
+    check(governor, device, 0)
+
+    assert device.requests[-1] == \
+        (StreamChannel.MAIN, tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_MAX)
+
+
+def test_unregister_forgets_demotion():
+    governor = StreamQualityGovernor(max_bandwidth_kbps=1000, interval_s=60)
+    device = Device('A')
+    governor.register(device)
+
+    check(governor, device, 1000)
+    governor.unregister(device)
+
+    assert not governor.demoted
+
+
+def test_change_sent_from_owning_receive_loop():
+    governor = StreamQualityGovernor(max_bandwidth_kbps=1000, interval_s=60)
+    busy, quiet = Device('A'), Device('B')
+    governor.register(busy)
+    governor.register(quiet)
+    governor.record(busy, 1000 * 1000)
+    governor.last_check -= 1
+
+    # a check run from the quiet camera's receive loop demotes the busy one
+    governor.record(quiet, 0)
+    governor.check()
+    governor.record(quiet, 0)
+
+    assert not busy.requests
+
+    governor.record(busy, 0)
+
+    assert busy.requests == \
+        [(StreamChannel.SUB, tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_LOW)]
+    assert busy in governor.demoted
+
+
+def test_failed_demotion_isnt_restored():
+    governor = StreamQualityGovernor(max_bandwidth_kbps=1000, interval_s=60)
+    device = Device('A')
+    device.set_stream_quality = lambda **kwargs: False
+    governor.register(device)
+
+    check(governor, device, 1000)
+
+    assert not governor.demoted
+
+
+def test_start_video_requests_camera_index(device, library):
+    device.device_settings.stream_channel = StreamChannel.SUB
+    device.device_state.channel_id_control = 0
+
+    assert device._send_stream_ctrl(tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_START)
+
+    _, message_type, payload, _ = library.calls('avSendIOCtrl')[-1]
+    message = tm.SMsgAVIoctrlAVStream.from_buffer_copy(
+        payload[:8]
+    )
+
+    assert message_type == tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_START
+    assert message.channel == 0
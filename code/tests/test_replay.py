@@ -0,0 +1,109 @@
+import threading
+import time
+import pytest
+from tutk_proxy.replay import ReplaySource
+from tutk_proxy.sinks import FrameSink
+
+SPS = b'\x00\x00\x00\x01\x67\x42\x00\x1e'
+PPS = b'\x00\x00\x00\x01\x68\xce\x3c\x80'
+IDR = b'\x00\x00\x00\x01\x65\x88\x84\x00'
+P = b'\x00\x00\x00\x01\x41\x9a\x02\x00'
+
+
+class FakeCatalog():
+    def __init__(self, keyframes: list[tuple[float, int]]) -> None:
+        self.keyframe_times = keyframes
+
+    def keyframes(self, path: str) -> list[tuple[float, int]]:
+        return self.keyframe_times
+
+
+class CollectingSink(FrameSink):
+    def __init__(self) -> None:
+        self.frames = list()
+        self.first = threading.Event()
+
+    def write(self, frame, data) -> None:
+        self.frames.append((frame, data))
+        self.first.set()
+
+
+@pytest.fixture
+def recording(tmp_path) -> tuple[str, list[int]]:
+    """
+    A recording of a leading P frame then three GOPs of four frames.
+    Returns its path and the offsets of its keyframes.
+    """
+    data = bytearray(P)
+    keyframe_offsets = list()
+
+    for _ in range(3):
+        keyframe_offsets.append(len(data))
+        data += SPS + PPS + IDR + P * 3
+
+    path = tmp_path / 'recording.h264'
+    path.write_bytes(data)
+
+    return str(path), keyframe_offsets
+
+
+def test_times_interpolated_between_keyframes(recording):
+    path, offsets = recording
+    catalog = FakeCatalog([(100.0, offsets[0]), (101.0, offsets[1]),
+                           (500.0, offsets[2])])
+
+    with ReplaySource(path, catalog=catalog, frame_rate=10) as replay:
+        times = list(replay.times)
+
+    assert len(times) == 13
+
+    # before the first keyframe, frames are spaced at frame_rate
+    assert times[0] == pytest.approx(99.9)
+    assert times[1:5] == pytest.approx([100, 100.25, 100.5, 100.75])
+
+    # a gap between recordings isn't spread over the GOP before it
+    assert times[5:9] == pytest.approx([101, 101.1, 101.2, 101.3])
+    assert times[9:] == pytest.approx([500, 500.1, 500.2, 500.3])
+
+
+def test_uncatalogued_frames_spaced_at_frame_rate(recording):
+    path, _ = recording
+
+    with ReplaySource(path, frame_rate=10) as replay:
+        assert list(replay.times) == pytest.approx(
+            [i / 10 for i in range(13)]
+        )
+        assert [replay[i].is_keyframe for i in (0, 1, 2)] == \
+            [False, True, False]
+
+
+def test_pacing_skips_gaps(recording):
+    path, offsets = recording
+    catalog = FakeCatalog([(100.0, offsets[0]), (101.0, offsets[1]),
+                           (500.0, offsets[2])])
+    sink = CollectingSink()
+
+    with ReplaySource(path, catalog=catalog, speed=100) as replay:
+        started = time.monotonic()
+        replay.stream_to(sinks=[sink])
+
+    # ~2s of frames at 100x; waiting out the 399s gap would take ~4s
+    assert time.monotonic() - started < 1
+    assert len(sink.frames) == 13
+
+
+def test_stop_during_pacing(recording):
+    path, _ = recording
+    sink = CollectingSink()
+    replay = ReplaySource(path, speed=0.001)
+    replay.stream_to(sinks=[sink], blocking=False)
+
+    assert sink.first.wait(5)
+
+    # the next frame is 100s away at this speed
+    started = time.monotonic()
+    replay.close()
+
+    assert time.monotonic() - started < 1
+    assert not replay.thread.is_alive()
+    assert len(sink.frames) == 1
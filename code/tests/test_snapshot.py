@@ -0,0 +1,32 @@
+from concurrent.futures import Future
+import pytest
+import tutk_proxy.decode as decode
+from tutk_proxy.exceptions import TutkDecoderUnavailableException
+
+
+def test_snapshot_without_decoder_doesnt_start_video(device, library,
+                                                     monkeypatch):
+    monkeypatch.setattr(decode, 'av', None)
+
+    with pytest.raises(TutkDecoderUnavailableException):
+        device.snapshot()
+
+    assert not library.calls('avSendIOCtrl')
+
+
+def test_cancelled_snapshot_isnt_stored(device):
+    future = Future()
+    future.cancel()
+
+    device._store_last_frame_jpg(future)
+
+    assert device.stream_info.last_frame_jpg is None
+
+
+def test_snapshot_result_is_stored(device):
+    future = Future()
+    future.set_result(b'jpeg')
+
+    device._store_last_frame_jpg(future)
+
+    assert device.stream_info.last_frame_jpg == b'jpeg'
@@ -0,0 +1,192 @@
+import threading
+import time
+import pytest
+import tutk_wrapper.constants as tc
+import tutk_proxy.models as models
+from tutk_proxy.frames import FrameLossCounter
+from tutk_proxy.sinks import FrameSink
+
+
+class RecordingSink(FrameSink):
+    def __init__(self, events: list = None, delay_s: float = 0) -> None:
+        self.frames: list = list()
+        self.events = events if events is not None else list()
+        self.delay_s = delay_s
+        self.closed = False
+
+    def write(self, frame, data) -> None:
+        time.sleep(self.delay_s)
+        self.frames.append((frame, data))
+        self.events.append('write')
+
+    def close(self) -> None:
+        self.closed = True
+        self.events.append('close')
+
+
+def stream_in_thread(device, sinks) -> threading.Thread:
+    thread = threading.Thread(
+        target=device.stream_to,
+        kwargs={'blocking': True, 'sinks': sinks}
+    )
+    thread.start()
+
+    while not device.device_state.streaming:
+        time.sleep(0.001)
+
+    return thread
+
+
+def test_frame_sink_is_abstract():
+    with pytest.raises(TypeError):
+        FrameSink()
+
+
+def test_exit_drains_stream_before_disconnecting(device, library):
+    events = list()
+    sink = RecordingSink(events, delay_s=0.002)
+    library.set('avClientStop', lambda *args: events.append('disconnect'))
+
+    for i in range(100):
+        library.queue_frame(bytes([i]) * 10, keyframe=not i)
+
+    thread = stream_in_thread(device, [sink])
+
+    with device:
+        pass
+
+    thread.join(1)
+
+    assert not thread.is_alive()
+    assert len(sink.frames) == 100
+    assert events[-2:] == ['close', 'disconnect']
+
+
+def test_sinks_closed_when_stream_cant_start(device, library):
+    sink = RecordingSink()
+    library.set(
+        'IOTC_Session_Check',
+        lambda *args: tc.IOTCErrorCode.IOTC_ER_INVALID_SID
+    )
+
+    device.stream_to(blocking=True, sinks=[sink])
+
+    assert sink.closed
+    assert device.stream_stopped.is_set()
+
+
+class OneCatchUp():
+    usage = 0.0
+
+    def __init__(self) -> None:
+        self.checks = 0
+
+    def check(self, channel_id: int) -> bool:
+        self.checks += 1
+
+        return self.checks == 1
+
+
+def test_frames_skipped_after_catch_up_arent_counted(device, library,
+                                                     monkeypatch):
+    monkeypatch.setattr(models, 'CatchUpPolicy', OneCatchUp)
+    device.device_state.channel_id_control = 0
+    device.device_state.channel_id_video = 0
+    device.device_state.resend_on = True
+
+    class FeedingSink(RecordingSink):
+        def write(self, frame, data) -> None:
+            super().write(frame, data)
+
+            # the rest arrives after the first burst has been caught up
+            if frame.frame_number == 1:
+                library.queue_frame(b'p', frame_number=2)
+                library.queue_frame(b'p', frame_number=3)
+                library.queue_frame(b'k', keyframe=True, frame_number=4)
+                library.queue_frame(b'p', frame_number=5)
+            elif frame.frame_number == 5:
+                device.stop_stream()
+
+    library.queue_frame(b'k', keyframe=True, frame_number=0)
+    library.queue_frame(b'p', frame_number=1)
+    sink = FeedingSink()
+
+    device.stream_to(blocking=True, sinks=[sink])
+
+    assert [f.frame_number for f, _ in sink.frames] == [0, 1, 4, 5]
+    assert device.stream_info.frames_received == 4
+    assert device.stream_info.skipped_frames == 2
+    assert device.stream_info.dropped_frames == 0
+
+
+def test_losses_rebase_on_new_session():
+    losses = FrameLossCounter()
+
+    for frame_number in (10, 11, 13):
+        losses.record(frame_number)
+
+    assert losses.dropped == 1
+
+    losses.rebase()
+
+    for frame_number in (0, 1, 2):
+        losses.record(frame_number)
+
+    assert losses.dropped == 1
+
+
+def test_failing_sink_still_stops_stream(device, library):
+    class FailingSink(RecordingSink):
+        def write(self, frame, data) -> None:
+            raise OSError('No space left on device')
+
+    other = RecordingSink()
+    library.queue_frame(b'k', keyframe=True)
+
+    with pytest.raises(OSError):
+        device.stream_to(blocking=True, sinks=[FailingSink(), other])
+
+    assert other.closed
+    assert not device.device_state.streaming
+    assert device.stream_stopped.is_set()
+
+
+def test_unknown_error_code_ends_stream(device, library):
+    sink = RecordingSink()
+    library.queue_frame(b'k', keyframe=True)
+    library.set(
+        'avRecvFrameData2',
+        lambda *args: library._recv_frame(*args) if library.frames else -99999
+    )
+
+    device.stream_to(blocking=True, sinks=[sink])
+
+    assert len(sink.frames) == 1
+    assert sink.closed
+    assert device.stream_stopped.is_set()
+
+
+def test_stream_info_current_during_stream(device, library):
+    seen = list()
+
+    class CheckingSink(RecordingSink):
+        def write(self, frame, data) -> None:
+            super().write(frame, data)
+
+            # the previous burst is already reflected in stream_info
+            seen.append(device.stream_info.frames_received)
+
+            if len(self.frames) == 1:
+                library.queue_frame(b'pp', frame_number=1)
+                library.queue_frame(b'ppp', frame_number=3)
+            elif len(self.frames) == 3:
+                device.stop_stream()
+
+    library.queue_frame(b'k', keyframe=True, frame_number=0)
+
+    device.stream_to(blocking=True, sinks=[CheckingSink()])
+
+    assert seen == [0, 1, 1]
+    assert device.stream_info.frames_received == 3
+    assert device.stream_info.last_frame_size == 3
+    assert device.stream_info.dropped_frames == 1
@@ -0,0 +1,119 @@
+from contextlib import contextmanager
+import time
+import pytest
+import tutk_wrapper.models as tm
+import tutk_wrapper.exceptions as te
+from tutk_proxy.timesync import (
+    FrameClock,
+    TimeSyncDaemon,
+    frame_time
+)
+from tutk_proxy.utils import (
+    utc_offset,
+    local_epoch
+)
+
+CLOCK = 1700000000
+
+
+def observe(
+    clock: FrameClock,
+    timestamps: list[int],
+    interval_s: float = 1
+) -> None:
+    for i, timestamp in enumerate(timestamps):
+        clock.observe(timestamp, 1000 + i * interval_s)
+
+
+def test_detects_clock():
+    clock = FrameClock(window_s=2)
+    observe(clock, [CLOCK, CLOCK + 1, CLOCK + 2])
+
+    assert clock.is_clock
+    assert clock.seconds(CLOCK) == CLOCK
+
+
+def test_detects_millisecond_counter_past_epoch_min():
+    clock = FrameClock(window_s=2)
+    uptime_ms = 1500000000
+    observe(clock, [uptime_ms, uptime_ms + 1000, uptime_ms + 2000])
+
+    assert clock.is_clock is False
+    assert clock.seconds(uptime_ms) is None
+
+
+def test_undecided_until_window_passes():
+    clock = FrameClock(window_s=2)
+    observe(clock, [CLOCK, CLOCK + 1])
+
+    assert clock.is_clock is None
+    assert clock.seconds(CLOCK) is None
+
+
+def test_unset_clock_is_not_read():
+    clock = FrameClock(window_s=2)
+    observe(clock, [1000, 1001, 1002])
+
+    assert clock.is_clock
+    assert clock.seconds(1002) is None
+
+
+def test_frame_time_uses_received_time_unless_clock():
+    clock = FrameClock(window_s=2)
+
+    assert frame_time(CLOCK, clock, received_time=5) == 5
+    assert frame_time(CLOCK, None, received_time=5) == 5
+
+    observe(clock, [CLOCK, CLOCK + 1, CLOCK + 2])
+
+    assert frame_time(CLOCK, clock, received_time=5) == \
+        pytest.approx(CLOCK - utc_offset(), abs=1)
+
+
+def test_streaming_drift_uses_latest_frame(device):
+    now = time.time()
+    device_now = int(local_epoch(now)) + 30
+    device.device_state.streaming = True
+
+    for i in range(3):
+        frame_info = tm.FRAMEINFO(timestamp=device_now - 2 + i)
+        device.frame_index.append(frame_info, 100, i, 0)
+        device.frame_clock.observe(frame_info.timestamp, now - 2 + i)
+
+    assert device.measure_clock_drift() == pytest.approx(30, abs=1)
+
+
+class FakePool():
+    def __init__(self, devices: dict) -> None:
+        self.devices = devices
+
+    def uids(self) -> list[str]:
+        return list(self.devices)
+
+    @contextmanager
+    def lease(self, uid: str):
+        yield self.devices[uid]
+
+
+class FakeDevice():
+    def __init__(self, error: Exception = None) -> None:
+        self.error = error
+
+    def measure_clock_drift(self) -> float:
+        if self.error:
+            raise self.error
+
+        return 0.0
+
+
+def test_failed_device_doesnt_end_round():
+    pool = FakePool({
+        'A': FakeDevice(),
+        'B': FakeDevice(te.TutkLibraryException(-20015)),
+        'C': FakeDevice(ValueError('-99999 is not a valid AVErrorCode')),
+        'D': FakeDevice()
+    })
+
+    results = TimeSyncDaemon(pool, max_workers=2).sync_all()
+
+    assert results == {'A': True, 'B': False, 'C': False, 'D': True}
@@ -0,0 +1,33 @@
+import os
+import select
+from tutk_proxy.wakeup import ChannelWakeup
+
+
+def test_signal_wakes_waiter(library):
+    wakeup = ChannelWakeup(1)
+
+    wakeup.signal()
+
+    assert wakeup.wait(0)
+    assert not wakeup.wait(0)
+
+    wakeup.close()
+
+
+def test_signal_after_close_is_ignored(library):
+    wakeup = ChannelWakeup(1)
+    wakeup.close()
+
+    # the closed descriptor's number is likely to be handed out again
+    read_fd, write_fd = os.pipe()
+
+    try:
+        wakeup.signal()
+        wakeup.close()
+
+        ready, _, _ = select.select([read_fd], [], [], 0)
+
+        assert not ready
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
@@ -0,0 +1,148 @@
+import os
+import signal
+import threading
+import time
+import pytest
+import tutk_proxy.workers as workers
+from tutk_proxy.frames import TutkFrame
+from tutk_proxy.models import TutkDeviceSettings
+from tutk_proxy.sinks import FrameSink
+from tutk_proxy.workers import WorkerSupervisor
+from . import fake_workers
+
+UIDS = [f'FAKEUID{os.getpid():08d}{i:05d}' for i in range(4)]
+
+
+@pytest.fixture
+def supervisor(monkeypatch) -> WorkerSupervisor:
+    monkeypatch.setattr(workers, 'worker_main', fake_workers.worker_main)
+    monkeypatch.setattr(workers, 'scan_main', fake_workers.scan_main)
+    monkeypatch.setattr(workers, 'WORKER_STATUS_INTERVAL', 0.05)
+    monkeypatch.setattr(workers, 'WORKER_RESTART_BACKOFF', 0.5)
+
+    supervisor = WorkerSupervisor(workers=2)
+
+    yield supervisor
+
+    supervisor.close()
+
+
+def wait_for(condition, timeout_s: float = 10) -> None:
+    deadline = time.monotonic() + timeout_s
+
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.02)
+
+
+def running_on(supervisor: WorkerSupervisor) -> dict[str, int]:
+    """
+    Returns {uid: worker} as reported by the workers themselves.
+    """
+    with supervisor.lock:
+        return {
+            uid: info.fps for uid, info in supervisor.stream_infos.items()
+        }
+
+
+def test_crashed_worker_cameras_rehome_and_rebalance(supervisor):
+    supervisor.start()
+
+    for uid in UIDS:
+        supervisor.add(uid, TutkDeviceSettings())
+
+    wait_for(lambda: len(running_on(supervisor)) == 4)
+
+    crashed = supervisor.workers[0]
+    survivor = supervisor.workers[1]
+    pid = crashed.process.pid
+    os.kill(pid, signal.SIGSEGV)
+
+    # every camera moves to the surviving worker...
+    wait_for(lambda: set(running_on(supervisor).values()) == {1}
+             and len(running_on(supervisor)) == 4)
+
+    # ...and half come back once the crashed one is restarted
+    wait_for(lambda: sorted(running_on(supervisor).values()) == [0, 0, 1, 1])
+
+    assert crashed.process.pid != pid
+    assert crashed.crashes == 1
+    assert len(crashed.uids) == len(survivor.uids) == 2
+    assert not supervisor.moving
+
+
+def test_scanned_address_reaches_worker(supervisor):
+    assert supervisor.scan(timeout_ms=100) == \
+        {'FAKEUID0000000000001': ('192.0.2.1', 32761)}
+
+    supervisor.start()
+    supervisor.add('FAKEUID0000000000001', TutkDeviceSettings())
+
+    wait_for(lambda: 'FAKEUID0000000000001' in supervisor.stream_infos)
+
+    assert supervisor.stream_infos['FAKEUID0000000000001'].last_frame_size \
+        == 32761
+
+
+class RecordingSink(FrameSink):
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.frames: list[bytes] = list()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.closed = False
+
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        if self.fail:
+            raise ValueError('I/O operation on closed file.')
+
+        self.writing.set()
+        self.release.wait()
+        self.frames.append(bytes(data))
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def collector(supervisor: WorkerSupervisor) -> threading.Thread:
+    return next(t for t in supervisor.threads if t.name == 'collector')
+
+
+def test_remove_waits_for_collector_to_close_reader(supervisor):
+    sink = RecordingSink()
+    sink.release.clear()
+    supervisor.start()
+    supervisor.add(UIDS[0], TutkDeviceSettings(), sinks=[sink])
+    supervisor.buses[UIDS[0]].write(TutkFrame(size=4), b'abcd')
+
+    assert sink.writing.wait(5)
+
+    # the collector is mid-write; the reader and sink stay open until it's done
+    supervisor.remove(UIDS[0])
+    assert not sink.closed
+
+    sink.release.set()
+    wait_for(lambda: sink.closed)
+
+    assert sink.frames == [b'abcd']
+    assert collector(supervisor).is_alive()
+
+
+def test_failing_sink_is_dropped(supervisor):
+    good, bad = RecordingSink(), RecordingSink(fail=True)
+    supervisor.start()
+    supervisor.add(UIDS[0], TutkDeviceSettings(), sinks=[bad, good])
+
+    for data in (b'1111', b'2222'):
+        supervisor.buses[UIDS[0]].write(TutkFrame(size=4), data)
+
+    wait_for(lambda: len(good.frames) == 2)
+
+    assert bad.closed
+    assert not good.closed
+    assert collector(supervisor).is_alive()
@@ -8,19 +8,82 @@ Actions supported:
     - scan: scans local subnet for compatible devices using multicast packet
     - sync: syncs the local time with a remote device
     - stream: streams raw video frames from a remote device to target file
+    - snapshot: saves a single picture from a remote device as jpeg or png
+    - sync-daemon: keeps the time of many remote devices synced on a schedule
+    - clip: exports part of a catalogued recording as h264 or mp4
+    - replay: plays a recording back onto a frame bus, without a camera
+    - fleet: streams many remote devices in supervised worker processes
+    - coordinator: shards devices over fleet nodes by consistent hashing
+    - node: streams the devices a coordinator assigns to this host
 """
 
 from tutk_proxy import proxy
 from typing import BinaryIO
+from datetime import datetime
 import argparse
 import logging
+import os
+import signal
+import socket
 from tutk_proxy.models import (
     TutkDevice,
     TutkDeviceSettings
 )
+from tutk_proxy.constants import (
+    StreamChannel,
+    SYNC_INTERVAL,
+    SYNC_DRIFT_THRESHOLD,
+    SYNC_WORKERS,
+    CONNECT_DEADLINE,
+    CONNECT_HEDGE_AFTER,
+    FLEET_DEFAULT_DEVICES,
+    POOL_IDLE_TIMEOUT,
+    CLUSTER_PORT,
+    CLUSTER_NODE_TIMEOUT
+)
+from tutk_proxy.quality import StreamQualityGovernor
+from tutk_proxy.timesync import TimeSyncDaemon
+from tutk_proxy.pool import TutkSessionPool
+from tutk_proxy.sinks import FileSink
+from tutk_proxy.activity import ActivityDetector
+from tutk_proxy.catalog import (
+    RecordingCatalog,
+    RecordingSink
+)
+from tutk_proxy.clip import (
+    CLIP_FORMATS,
+    export_clip
+)
+from tutk_proxy.replay import ReplaySource
+from tutk_proxy.decode import require_decoder
+from tutk_proxy.exceptions import TutkDecoderUnavailableException
+from tutk_proxy.workers import WorkerSupervisor
+from tutk_proxy.cluster import (
+    ClusterCoordinator,
+    ClusterNode
+)
+from tutk_proxy.motion import (
+    MotionMonitor,
+    MotionGate
+)
+from tutk_proxy.framebus import (
+    FrameBusWriter,
+    frame_bus_name
+)
+from tutk_wrapper.constants import AvIOCtrlQuality
 
 log = logging.getLogger(__name__)
 
+QUALITY_LEVELS = ['max', 'high', 'middle', 'low', 'min']
+
+# actions that don't load the tutk library in this process; clip and replay
+# work on recordings, fleet and node load it in worker processes, and the
+# coordinator never connects to devices
+OFFLINE_ACTIONS = ('clip', 'replay', 'fleet', 'coordinator', 'node')
+
+# called on SIGINT/SIGTERM to stop the running action gracefully
+shutdown_handlers: list = list()
+
 
 def get_args() -> dict:
     parser = argparse.ArgumentParser()
@@ -29,8 +92,32 @@ def get_args() -> dict:
     scan = action.add_parser('scan')
     stream = action.add_parser('stream')
     sync = action.add_parser('sync')
+    sync_daemon = action.add_parser('sync-daemon')
+    snapshot = action.add_parser('snapshot')
+    clip = action.add_parser('clip')
+    replay = action.add_parser('replay')
+    fleet = action.add_parser('fleet')
+    coordinator = action.add_parser('coordinator')
+    node = action.add_parser('node')
     group_verbosity = parser.add_mutually_exclusive_group()
 
+    parser.add_argument(
+        '--lan-first',
+        required=False,
+        action='store_true',
+        default=False,
+        help='tune scans and connects for cameras on a network without '
+        'internet access'
+    )
+
+    parser.add_argument(
+        '--max-devices',
+        required=False,
+        default=FLEET_DEFAULT_DEVICES,
+        type=int,
+        help='cameras to size the library\'s sessions and channels for'
+    )
+
     group_verbosity.add_argument(
         '-v',
         '--verbose',
@@ -99,6 +186,112 @@ def get_args() -> dict:
         help='file to write video frames to; use - for stdout'
     )
 
+    stream.add_argument(
+        '--stream-channel',
+        required=False,
+        default='main',
+        choices=[s.name.lower() for s in StreamChannel],
+        help='stream to request from the device; sub requires --quality'
+    )
+
+    stream.add_argument(
+        '--quality',
+        required=False,
+        default=None,
+        choices=QUALITY_LEVELS,
+        help='quality level to request from the device'
+    )
+
+    stream.add_argument(
+        '--auto-quality',
+        required=False,
+        action='store_true',
+        default=False,
+        help='drop to the substream when over bandwidth/cpu budget'
+    )
+
+    stream.add_argument(
+        '--max-bandwidth-kbps',
+        required=False,
+        default=None,
+        type=int,
+        help='bandwidth budget (kbps) for --auto-quality'
+    )
+
+    stream.add_argument(
+        '--max-cpu-percent',
+        required=False,
+        default=None,
+        type=float,
+        help='cpu budget (percent of one core) for --auto-quality'
+    )
+
+    stream.add_argument(
+        '--event-driven',
+        required=False,
+        action='store_true',
+        default=False,
+        help='wait for channel callbacks instead of polling for frames'
+    )
+
+    stream.add_argument(
+        '--max-buf-size-kb',
+        required=False,
+        default=None,
+        type=int,
+        help='size of the library\'s video buffer; applies to every camera '
+        'in the process'
+    )
+
+    stream.add_argument(
+        '--no-catch-up',
+        required=False,
+        action='store_true',
+        default=False,
+        help='don\'t flush queued video when the stream falls behind'
+    )
+
+    stream.add_argument(
+        '--no-migrate-relay',
+        required=False,
+        action='store_true',
+        default=False,
+        help='don\'t move relayed streams to a LAN or P2P session'
+    )
+
+    stream.add_argument(
+        '--frame-bus',
+        required=False,
+        action='store_true',
+        default=False,
+        help='also publish frames to shared memory for local readers'
+    )
+
+    stream.add_argument(
+        '--record-on-motion',
+        required=False,
+        action='store_true',
+        default=False,
+        help='only write frames while motion is detected'
+    )
+
+    stream.add_argument(
+        '--activity-gate',
+        required=False,
+        action='store_true',
+        default=False,
+        help='with --record-on-motion, only decode while frame sizes '
+        'suggest activity'
+    )
+
+    stream.add_argument(
+        '--catalog',
+        required=False,
+        default=None,
+        type=str,
+        help='index the recording in this SQLite catalog for clip lookup'
+    )
+
     sync.add_argument(
         '-d',
         '--deviceuid',
@@ -132,7 +325,386 @@ def get_args() -> dict:
         help='timeout for scanning and connecting to devices'
     )
     
-    return parser.parse_args()
+    sync_daemon.add_argument(
+        '-d',
+        '--deviceuid',
+        required=False,
+        action='append',
+        type=str,
+        help='device UID; repeat for several devices, omit for all found'
+    )
+
+    sync_daemon.add_argument(
+        '-u',
+        '--username',
+        required=True,
+        type=str,
+        help='username to use to connect to devices'
+    )
+
+    sync_daemon.add_argument(
+        '-p',
+        '--password',
+        required=True,
+        type=str,
+        help='password to use to connect to devices'
+    )
+
+    sync_daemon.add_argument(
+        '-t',
+        '--timeout',
+        required=False,
+        default=5000,
+        type=int,
+        help='timeout for scanning and connecting to devices'
+    )
+
+    sync_daemon.add_argument(
+        '-i',
+        '--interval',
+        required=False,
+        default=SYNC_INTERVAL,
+        type=int,
+        help='seconds between syncs'
+    )
+
+    sync_daemon.add_argument(
+        '--drift-threshold',
+        required=False,
+        default=SYNC_DRIFT_THRESHOLD,
+        type=float,
+        help='seconds of measured drift before a device is synced'
+    )
+
+    sync_daemon.add_argument(
+        '--workers',
+        required=False,
+        default=SYNC_WORKERS,
+        type=int,
+        help='number of devices to sync in parallel'
+    )
+
+    sync_daemon.add_argument(
+        '--connect-deadline',
+        required=False,
+        default=CONNECT_DEADLINE,
+        type=float,
+        help='seconds to connect and log in to a device before giving up'
+    )
+
+    sync_daemon.add_argument(
+        '--hedge-after',
+        required=False,
+        default=CONNECT_HEDGE_AFTER,
+        type=float,
+        help='seconds before a second connect attempt is started, 0 for none'
+    )
+    
+    snapshot.add_argument(
+        '-d',
+        '--deviceuid',
+        required=True,
+        type=str,
+        help='device UID'
+    )
+
+    snapshot.add_argument(
+        '-u',
+        '--username',
+        required=True,
+        type=str,
+        help='username to use to connect to device'
+    )
+
+    snapshot.add_argument(
+        '-p',
+        '--password',
+        required=True,
+        type=str,
+        help='password to use to connect to device'
+    )
+
+    snapshot.add_argument(
+        '-t',
+        '--timeout',
+        required=False,
+        default=5000,
+        type=int,
+        help='timeout for scanning and connecting to devices'
+    )
+
+    snapshot.add_argument(
+        '-f',
+        '--filename',
+        required=True,
+        type=argparse.FileType(mode='wb'),
+        help='file to write the picture to; use - for stdout'
+    )
+
+    snapshot.add_argument(
+        '--format',
+        required=False,
+        default='jpeg',
+        choices=['jpeg', 'png'],
+        help='picture format'
+    )
+
+    clip.add_argument(
+        '-d',
+        '--deviceuid',
+        required=True,
+        type=str,
+        help='device UID'
+    )
+
+    clip.add_argument(
+        '-c',
+        '--catalog',
+        required=True,
+        type=str,
+        help='SQLite catalog written by stream --catalog'
+    )
+
+    clip.add_argument(
+        '-s',
+        '--start',
+        required=True,
+        type=parse_time,
+        help='start of the clip, as an ISO 8601 local time or epoch seconds'
+    )
+
+    clip.add_argument(
+        '-e',
+        '--end',
+        required=True,
+        type=parse_time,
+        help='end of the clip, as an ISO 8601 local time or epoch seconds'
+    )
+
+    clip.add_argument(
+        '-f',
+        '--filename',
+        required=True,
+        type=str,
+        help='file to write the clip to'
+    )
+
+    clip.add_argument(
+        '--format',
+        required=False,
+        default='mp4',
+        choices=CLIP_FORMATS,
+        help='clip format; mp4 requires ffmpeg'
+    )
+
+    replay.add_argument(
+        '-d',
+        '--deviceuid',
+        required=True,
+        type=str,
+        help='device UID to publish the frame bus as'
+    )
+
+    replay.add_argument(
+        '-f',
+        '--filename',
+        required=True,
+        type=str,
+        help='recording to play back'
+    )
+
+    replay.add_argument(
+        '-c',
+        '--catalog',
+        required=False,
+        default=None,
+        type=str,
+        help='SQLite catalog the recording was indexed in, for frame times'
+    )
+
+    replay.add_argument(
+        '--speed',
+        required=False,
+        default=1.0,
+        type=float,
+        help='playback speed relative to real time; 0 for as fast as possible'
+    )
+
+    replay.add_argument(
+        '--loop',
+        required=False,
+        action='store_true',
+        default=False,
+        help='restart from the beginning when the recording ends'
+    )
+
+    fleet.add_argument(
+        '-d',
+        '--deviceuid',
+        required=True,
+        action='append',
+        type=str,
+        help='device UID; repeat for several devices'
+    )
+
+    fleet.add_argument(
+        '-u',
+        '--username',
+        required=True,
+        type=str,
+        help='username to use to connect to devices'
+    )
+
+    fleet.add_argument(
+        '-p',
+        '--password',
+        required=True,
+        type=str,
+        help='password to use to connect to devices'
+    )
+
+    fleet.add_argument(
+        '-t',
+        '--timeout',
+        required=False,
+        default=5000,
+        type=int,
+        help='timeout (ms) for connecting to devices'
+    )
+
+    fleet.add_argument(
+        '-w',
+        '--workers',
+        required=False,
+        default=None,
+        type=int,
+        help='worker processes; defaults to one per cpu'
+    )
+
+    fleet.add_argument(
+        '-r',
+        '--record-dir',
+        required=False,
+        default=None,
+        type=str,
+        help='directory to append each camera\'s video to, as <uid>.h264'
+    )
+
+    coordinator.add_argument(
+        '-d',
+        '--deviceuid',
+        required=True,
+        action='append',
+        type=str,
+        help='device UID; repeat for several devices'
+    )
+
+    coordinator.add_argument(
+        '-l',
+        '--listen',
+        required=False,
+        default=f'127.0.0.1:{CLUSTER_PORT}',
+        type=str,
+        help='host:port to listen for node heartbeats on'
+    )
+
+    node.add_argument(
+        '-c',
+        '--coordinator',
+        required=False,
+        default=f'127.0.0.1:{CLUSTER_PORT}',
+        type=str,
+        help='host:port of the coordinator'
+    )
+
+    node.add_argument(
+        '-n',
+        '--node-id',
+        required=False,
+        default=None,
+        type=str,
+        help='name of this node, unique in the cluster and kept across '
+        'restarts; defaults to the hostname'
+    )
+
+    node.add_argument(
+        '-u',
+        '--username',
+        required=True,
+        type=str,
+        help='username to use to connect to devices'
+    )
+
+    node.add_argument(
+        '-p',
+        '--password',
+        required=True,
+        type=str,
+        help='password to use to connect to devices'
+    )
+
+    node.add_argument(
+        '-t',
+        '--timeout',
+        required=False,
+        default=5000,
+        type=int,
+        help='timeout (ms) for connecting to devices'
+    )
+
+    node.add_argument(
+        '-w',
+        '--workers',
+        required=False,
+        default=None,
+        type=int,
+        help='worker processes; defaults to one per cpu, and sets the '
+        'node\'s share of devices'
+    )
+
+    node.add_argument(
+        '-r',
+        '--record-dir',
+        required=False,
+        default=None,
+        type=str,
+        help='directory to append each camera\'s video to, as <uid>.h264'
+    )
+
+    args = parser.parse_args()
+
+    # the substream is selected along with a quality level
+    if args.action == 'stream' and args.stream_channel != 'main' \
+        and not args.quality:
+        parser.error('--stream-channel sub requires --quality')
+
+    # without a budget the governor would never act
+    if args.action == 'stream' and args.auto_quality \
+        and args.max_bandwidth_kbps == None and args.max_cpu_percent == None:
+        parser.error(
+            '--auto-quality requires --max-bandwidth-kbps and/or '
+            '--max-cpu-percent'
+        )
+
+    # the catalog indexes byte offsets into the recording
+    if args.action == 'stream' and args.catalog \
+        and not args.filename.seekable():
+        parser.error('--catalog requires -f to be a file')
+
+    return args
+
+
+def parse_address(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(':')
+
+    return host or '127.0.0.1', int(port)
+
+
+def parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 
 
 def init_logging(log_level: int) -> None:
@@ -153,9 +725,26 @@ def find_device(
     return next(iter(matches), None)
 
 
+def handle_signal(signum: int, frame) -> None:
+    if not shutdown_handlers:
+        raise KeyboardInterrupt()
+
+    log.info(f'received {signal.Signals(signum).name}, shutting down')
+
+    # a second signal interrupts whatever is still running
+    handlers = list(shutdown_handlers)
+    shutdown_handlers.clear()
+
+    for handler in handlers:
+        handler()
+
+
 def initialise(
     verbose: bool,
-    quiet: bool
+    quiet: bool,
+    load_library: bool = True,
+    lan_first: bool = False,
+    max_devices: int = FLEET_DEFAULT_DEVICES
 ):
     # configure log levels
     init_logging(
@@ -164,8 +753,15 @@ def initialise(
         else 20
     )
 
-    # initialise the camera proxy
-    proxy.initialise()
+    # initialise the camera proxy; offline actions don't need the library
+    if load_library:
+        proxy.initialise(
+            lan_first=lan_first,
+            max_devices=max_devices
+        )
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
 
 
 def action_stream(
@@ -173,7 +769,20 @@ def action_stream(
     username: str,
     password: str,
     timeout_ms: int,
-    dest_file: BinaryIO
+    dest_file: BinaryIO,
+    stream_channel: str = 'main',
+    quality: str = None,
+    auto_quality: bool = False,
+    max_bandwidth_kbps: int = None,
+    max_cpu_percent: float = None,
+    event_driven: bool = False,
+    max_buf_size_kb: int = None,
+    catch_up: bool = True,
+    migrate_relay: bool = True,
+    frame_bus: bool = False,
+    record_on_motion: bool = False,
+    activity_gate: bool = False,
+    catalog_path: str = None
 ) -> None:
     devices: list[TutkDevice] = proxy.scan_local_subnet(timeout_ms=timeout_ms)
 
@@ -191,15 +800,68 @@ def action_stream(
     target_device.device_settings = TutkDeviceSettings(
         username=username,
         password=password,
-        timeout_s=int(timeout_ms / 1000)
+        timeout_s=int(timeout_ms / 1000),
+        stream_channel=StreamChannel[stream_channel.upper()],
+        stream_quality=(
+            AvIOCtrlQuality[f'AVIOCTRL_QUALITY_{quality.upper()}']
+            if quality else None
+        ),
+        event_driven=event_driven,
+        max_buf_size_kb=max_buf_size_kb,
+        catch_up=catch_up,
+        migrate_relay=migrate_relay
     )
+
+    governor = None
+    if auto_quality:
+        governor = StreamQualityGovernor(
+            max_bandwidth_kbps=max_bandwidth_kbps,
+            max_cpu_percent=max_cpu_percent
+        )
     
-    target_device.connect()
+    sinks = list()
+    if frame_bus:
+        sinks.append(FrameBusWriter.create(frame_bus_name(uid)))
 
-    target_device.stream_to(
-        dest_file=dest_file,
-        blocking=True
-    )
+    catalog = None
+    recording = FileSink(dest_file)
+    if catalog_path:
+        catalog = RecordingCatalog(catalog_path)
+        recording = RecordingSink(
+            catalog,
+            uid,
+            dest_file,
+            clock=target_device.frame_clock
+        )
+
+    monitor = None
+    if record_on_motion:
+        monitor = MotionMonitor()
+        decode_stage = monitor.decode_stage(uid, min_interval_s=1)
+
+        if activity_gate:
+            sinks.append(ActivityDetector(gated=[decode_stage]))
+
+        sinks.append(decode_stage)
+        recording = MotionGate(uid, monitor, recording)
+
+    sinks.append(recording)
+
+    with target_device:
+        shutdown_handlers.append(target_device.stop_stream)
+        target_device.connect()
+
+        target_device.stream_to(
+            blocking=True,
+            governor=governor,
+            sinks=sinks
+        )
+
+    if monitor:
+        monitor.stop()
+
+    if catalog:
+        catalog.close()
 
 
 def action_sync(
@@ -221,14 +883,296 @@ def action_sync(
     
     log.info(f'found device with uid={uid}')
 
-    target_device.device_settings = TutkDeviceSettings(
+    pool = TutkSessionPool(TutkDeviceSettings(
         username=username,
         password=password,
         timeout_s=int(timeout_ms / 1000)
+    ))
+    pool.add(target_device)
+
+    try:
+        with pool.lease(uid) as device:
+            device.sync_time()
+    except ConnectionError as e:
+        log.fatal(f'unable to sync time: {e}')
+    finally:
+        pool.close()
+
+
+def action_sync_daemon(
+    uids: list[str],
+    username: str,
+    password: str,
+    timeout_ms: int,
+    interval_s: int,
+    drift_threshold_s: float,
+    workers: int,
+    connect_deadline_s: float,
+    hedge_after_s: float
+) -> None:
+    devices: list[TutkDevice] = proxy.scan_local_subnet(timeout_ms=timeout_ms)
+
+    if uids:
+        for uid in uids:
+            if not find_device(devices=devices, uid=uid):
+                log.warn(f'unable to find device with uid={uid}')
+
+        devices = [d for d in devices if d.uid in uids]
+
+    if not devices:
+        log.fatal(f'no devices to sync')
+        return
+
+    # sessions outlive the gap between rounds
+    pool = TutkSessionPool(
+        device_settings=TutkDeviceSettings(
+            username=username,
+            password=password,
+            timeout_s=int(timeout_ms / 1000)
+        ),
+        idle_timeout_s=max(POOL_IDLE_TIMEOUT, 2 * interval_s),
+        connect_deadline_s=connect_deadline_s,
+        hedge_after_s=hedge_after_s or None
     )
 
-    target_device.connect()
-    target_device.sync_time()
+    for d in devices:
+        pool.add(d)
+
+    log.info(f'syncing {len(devices)} devices every {interval_s}s')
+
+    daemon = TimeSyncDaemon(
+        pool=pool,
+        interval_s=interval_s,
+        drift_threshold_s=drift_threshold_s,
+        max_workers=workers
+    )
+    shutdown_handlers.append(daemon.stop)
+
+    try:
+        daemon.run()
+    finally:
+        pool.close()
+
+
+def action_snapshot(
+    uid: str,
+    username: str,
+    password: str,
+    timeout_ms: int,
+    dest_file: BinaryIO,
+    fmt: str
+) -> None:
+    try:
+        require_decoder()
+    except TutkDecoderUnavailableException as e:
+        log.fatal(f'unable to take snapshot: {e}')
+        dest_file.close()
+        return
+
+    devices: list[TutkDevice] = proxy.scan_local_subnet(timeout_ms=timeout_ms)
+
+    target_device = find_device(
+        devices=devices,
+        uid=uid
+    )
+
+    if not target_device:
+        log.fatal(f'unable to find device with uid={uid}')
+        dest_file.close()
+        return
+
+    log.info(f'found device with uid={uid}')
+
+    pool = TutkSessionPool(TutkDeviceSettings(
+        username=username,
+        password=password,
+        timeout_s=int(timeout_ms / 1000)
+    ))
+    pool.add(target_device)
+
+    try:
+        with pool.lease(uid) as device:
+            picture = device.snapshot(fmt=fmt)
+            dest_file.write(picture.result())
+    except Exception as e:
+        log.fatal(f'unable to take snapshot: {e}')
+    finally:
+        dest_file.close()
+        pool.close()
+
+
+def action_clip(
+    uid: str,
+    catalog_path: str,
+    start_ts: float,
+    end_ts: float,
+    dest_path: str,
+    fmt: str
+) -> None:
+    catalog = RecordingCatalog(catalog_path)
+
+    try:
+        if not export_clip(
+            catalog=catalog,
+            uid=uid,
+            start_ts=start_ts,
+            end_ts=end_ts,
+            dest_path=dest_path,
+            fmt=fmt
+        ):
+            log.fatal(f'nothing recorded for uid={uid} in that range')
+    except Exception as e:
+        log.fatal(f'unable to export clip: {e}')
+    finally:
+        catalog.close()
+
+
+def action_replay(
+    uid: str,
+    path: str,
+    catalog_path: str,
+    speed: float,
+    loop: bool
+) -> None:
+    catalog = RecordingCatalog(catalog_path) if catalog_path else None
+
+    try:
+        source = ReplaySource(
+            path=path,
+            catalog=catalog,
+            speed=speed or None,
+            loop=loop
+        )
+    finally:
+        if catalog:
+            catalog.close()
+
+    with source:
+        shutdown_handlers.append(source.stop_stream)
+        source.stream_to(
+            blocking=True,
+            sinks=[FrameBusWriter.create(frame_bus_name(uid))]
+        )
+
+
+def action_fleet(
+    uids: list[str],
+    username: str,
+    password: str,
+    timeout_ms: int,
+    workers: int,
+    record_dir: str,
+    lan_first: bool
+) -> None:
+    settings = TutkDeviceSettings(
+        username=username,
+        password=password,
+        timeout_s=int(timeout_ms / 1000)
+    )
+
+    supervisor = WorkerSupervisor(
+        workers=workers,
+        lan_first=lan_first,
+        max_devices=len(uids),
+        log_level=logging.getLogger().level
+    )
+    shutdown_handlers.append(supervisor.stop)
+    supervisor.scan(timeout_ms)
+    supervisor.start()
+
+    for uid in uids:
+        sinks = None
+        if record_dir:
+            path = os.path.join(record_dir, f'{uid}.h264')
+            sinks = [FileSink(open(path, 'ab'))]
+
+        supervisor.add(uid, settings, sinks)
+
+    log.info(
+        f'streaming {len(uids)} devices on {len(supervisor.workers)} workers'
+    )
+
+    try:
+        supervisor.wait()
+    finally:
+        supervisor.close()
+
+
+def action_coordinator(
+    uids: list[str],
+    listen: str
+) -> None:
+    host, port = parse_address(listen)
+    coordinator = ClusterCoordinator(uids=uids, host=host, port=port)
+    coordinator.start()
+    shutdown_handlers.append(coordinator.stopped.set)
+
+    try:
+        while not coordinator.stopped.wait(CLUSTER_NODE_TIMEOUT):
+            log.info(f'nodes: {coordinator.status()}')
+    finally:
+        coordinator.close()
+
+
+def action_node(
+    coordinator: str,
+    node_id: str,
+    username: str,
+    password: str,
+    timeout_ms: int,
+    workers: int,
+    record_dir: str,
+    lan_first: bool,
+    max_devices: int
+) -> None:
+    settings = TutkDeviceSettings(
+        username=username,
+        password=password,
+        timeout_s=int(timeout_ms / 1000)
+    )
+
+    supervisor = WorkerSupervisor(
+        workers=workers,
+        lan_first=lan_first,
+        max_devices=max_devices,
+        log_level=logging.getLogger().level
+    )
+    shutdown_handlers.append(supervisor.stop)
+    supervisor.scan(timeout_ms)
+    supervisor.start()
+
+    def start(uid: str) -> None:
+        sinks = None
+        if record_dir:
+            path = os.path.join(record_dir, f'{uid}.h264')
+            sinks = [FileSink(open(path, 'ab'))]
+
+        try:
+            supervisor.add(uid, settings, sinks)
+        except Exception:
+            for sink in sinks or ():
+                sink.close()
+            raise
+
+    def stream_infos() -> dict:
+        with supervisor.lock:
+            return dict(supervisor.stream_infos)
+
+    node = ClusterNode(
+        node_id=node_id or socket.gethostname(),
+        coordinator=parse_address(coordinator),
+        start=start,
+        stop=supervisor.remove,
+        stream_infos=stream_infos,
+        weight=len(supervisor.workers)
+    )
+    node.start()
+
+    try:
+        supervisor.wait()
+    finally:
+        node.close()
+        supervisor.close()
 
 
 def action_scan(timeout_ms: int = 5000) -> list[TutkDevice]:
@@ -253,9 +1197,14 @@ def action_scan(timeout_ms: int = 5000) -> list[TutkDevice]:
 if __name__ == "__main__":
     args: dict = get_args()
     
+    load_library = args.action not in OFFLINE_ACTIONS
+
     initialise(
         args.verbose,
-        args.quiet
+        args.quiet,
+        load_library,
+        args.lan_first,
+        args.max_devices
     )
 
     log.info(f'args: {args}')
@@ -268,6 +1217,78 @@ if __name__ == "__main__":
             timeout_ms=args.timeout
         )
 
+    if args.action == 'sync-daemon':
+        action_sync_daemon(
+            uids=args.deviceuid,
+            username=args.username,
+            password=args.password,
+            timeout_ms=args.timeout,
+            interval_s=args.interval,
+            drift_threshold_s=args.drift_threshold,
+            workers=args.workers,
+            connect_deadline_s=args.connect_deadline,
+            hedge_after_s=args.hedge_after
+        )
+
+    if args.action == 'snapshot':
+        action_snapshot(
+            uid=args.deviceuid,
+            username=args.username,
+            password=args.password,
+            timeout_ms=args.timeout,
+            dest_file=args.filename,
+            fmt=args.format
+        )
+
+    if args.action == 'clip':
+        action_clip(
+            uid=args.deviceuid,
+            catalog_path=args.catalog,
+            start_ts=args.start,
+            end_ts=args.end,
+            dest_path=args.filename,
+            fmt=args.format
+        )
+
+    if args.action == 'replay':
+        action_replay(
+            uid=args.deviceuid,
+            path=args.filename,
+            catalog_path=args.catalog,
+            speed=args.speed,
+            loop=args.loop
+        )
+
+    if args.action == 'fleet':
+        action_fleet(
+            uids=args.deviceuid,
+            username=args.username,
+            password=args.password,
+            timeout_ms=args.timeout,
+            workers=args.workers,
+            record_dir=args.record_dir,
+            lan_first=args.lan_first
+        )
+
+    if args.action == 'coordinator':
+        action_coordinator(
+            uids=args.deviceuid,
+            listen=args.listen
+        )
+
+    if args.action == 'node':
+        action_node(
+            coordinator=args.coordinator,
+            node_id=args.node_id,
+            username=args.username,
+            password=args.password,
+            timeout_ms=args.timeout,
+            workers=args.workers,
+            record_dir=args.record_dir,
+            lan_first=args.lan_first,
+            max_devices=args.max_devices
+        )
+
     if args.action == 'scan':
         action_scan(timeout_ms=args.timeout)
 
@@ -277,5 +1298,21 @@ if __name__ == "__main__":
             username=args.username,
             password=args.password,
             timeout_ms=args.timeout,
-            dest_file=args.filename
+            dest_file=args.filename,
+            stream_channel=args.stream_channel,
+            quality=args.quality,
+            auto_quality=args.auto_quality,
+            max_bandwidth_kbps=args.max_bandwidth_kbps,
+            max_cpu_percent=args.max_cpu_percent,
+            event_driven=args.event_driven,
+            max_buf_size_kb=args.max_buf_size_kb,
+            catch_up=not args.no_catch_up,
+            migrate_relay=not args.no_migrate_relay,
+            frame_bus=args.frame_bus,
+            record_on_motion=args.record_on_motion,
+            activity_gate=args.activity_gate,
+            catalog_path=args.catalog
         )
+
+    if load_library:
+        proxy.shutdown()
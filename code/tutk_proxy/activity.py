@@ -0,0 +1,89 @@
+from array import array
+import logging
+from .frames import TutkFrame
+from .sinks import FrameSink
+from .constants import (
+    ACTIVITY_GOP_BUCKETS,
+    ACTIVITY_BASELINE_ALPHA,
+    ACTIVITY_SCORE_ALPHA,
+    ACTIVITY_THRESHOLD,
+    ACTIVITY_WARMUP_FRAMES
+)
+
+log = logging.getLogger(__name__)
+
+
+class ActivityDetector(FrameSink):
+    """
+    Flags scene activity from compressed frame sizes alone.  Predicted frames
+    grow when the scene changes, so each P-frame's size is compared with a
+    rolling baseline for its position in the GOP (frames early in a GOP are
+    typically larger).  Costs O(1) per frame and never decodes.
+
+    While the smoothed ratio exceeds threshold the stream is active.  Sinks
+    in gated (e.g. a DecodeStage) have their enabled attribute follow the
+    active state, so expensive analytics only run when something happens;
+    place the detector before them in the sink list.  on_change(active,
+    score) is called from the receive loop on each transition.
+    """
+    def __init__(
+        self,
+        threshold: float = ACTIVITY_THRESHOLD,
+        gated: list = (),
+        on_change=None,
+        buckets: int = ACTIVITY_GOP_BUCKETS
+    ) -> None:
+        self.threshold = threshold
+        self.gated = list(gated)
+        self.on_change = on_change
+        self.buckets = buckets
+        self.baseline = array('f', bytes(4 * buckets))
+        self.samples = array('I', bytes(4 * buckets))
+        self.gop_position = 0
+        self.score = 1.0
+        self.active = False
+
+        for sink in self.gated:
+            sink.enabled = False
+
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        if frame.is_keyframe:
+            self.gop_position = 0
+            return
+
+        self.gop_position += 1
+        bucket = min(self.gop_position, self.buckets) - 1
+        baseline = self.baseline[bucket]
+
+        if self.samples[bucket] < ACTIVITY_WARMUP_FRAMES:
+            # plain running mean until the bucket has enough samples
+            self.samples[bucket] += 1
+            self.baseline[bucket] = \
+                baseline + (frame.size - baseline) / self.samples[bucket]
+            return
+
+        ratio = frame.size / baseline if baseline else 1.0
+        self.score += ACTIVITY_SCORE_ALPHA * (ratio - self.score)
+
+        # learn slowly while active so sustained motion isn't baselined away
+        alpha = ACTIVITY_BASELINE_ALPHA * (0.1 if self.active else 1)
+        self.baseline[bucket] = baseline + alpha * (frame.size - baseline)
+
+        active = self.score > self.threshold
+
+        if active != self.active:
+            self.active = active
+            log.info(
+                f'activity {"started" if active else "ended"}, '
+                f'score={self.score:.2f}'
+            )
+
+            for sink in self.gated:
+                sink.enabled = active
+
+            if self.on_change:
+                self.on_change(active, self.score)
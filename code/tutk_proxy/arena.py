@@ -0,0 +1,192 @@
+from array import array
+import ctypes as c
+import time
+import logging
+import tutk_wrapper.wrapper as tw
+import tutk_wrapper.models as tm
+import tutk_wrapper.constants as tc
+from .buffers import (
+    FrameBufferPool,
+    frame_buffer_pool
+)
+from .constants import (
+    FRAME_ARENA_SIZE,
+    FRAME_ARENA_MAX_FRAMES,
+    FRAME_BUFFER_SIZE,
+    FRAME_BUFFER_MIN_SIZE,
+    FRAME_BUFFER_MAX_SIZE,
+    FRAME_BUFFER_HEADROOM,
+    FRAME_BUFFER_SHRINK_AFTER
+)
+
+log = logging.getLogger(__name__)
+
+FRAMEINFO_SIZE = c.sizeof(tm.FRAMEINFO)
+
+
+class FrameArena():
+    """
+    One contiguous buffer that a burst of frames is received into back to
+    back, with each frame's FRAMEINFO, offset and size in parallel arrays.
+
+    Each receive is offered reserve bytes, which grows to fit the largest
+    frame the library reports and shrinks back after quiet periods.  If
+    reserve outgrows the buffer, the buffer is replaced before the next
+    burst.
+    """
+    def __init__(
+        self,
+        size: int = FRAME_ARENA_SIZE,
+        max_frames: int = FRAME_ARENA_MAX_FRAMES,
+        pool: FrameBufferPool = frame_buffer_pool
+    ) -> None:
+        self.pool = pool
+        self.max_frames = max_frames
+        self.buffer = pool.acquire(size)
+        self.size = c.sizeof(self.buffer)
+        self.reserve = min(FRAME_BUFFER_SIZE, self.size)
+        self.frame_infos = (tm.FRAMEINFO * max_frames)()
+        self.offsets = array('I', bytes(4 * max_frames))
+        self.sizes = array('I', bytes(4 * max_frames))
+        self.frame_numbers = array('i', bytes(4 * max_frames))
+        self.count = 0
+        self.position = 0
+        self.oversize_frames = 0
+        self.high_water = 0
+        self.window_start = time.monotonic()
+
+        # receive arguments are allocated once; the buffer pointer is moved
+        # through the arena by rewriting its address in place
+        self.pointer = c.POINTER(c.c_char)()
+        self.address = c.c_void_p.from_buffer(self.pointer)
+        self.size_received = c.c_int()
+        self.size_sent = c.c_int()
+        self.info_size_received = c.c_int()
+        self.frame_number = c.c_int()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def reset(self) -> None:
+        """
+        Empties the arena, first replacing the buffer if reserve outgrew it.
+        """
+        self.count = 0
+        self.position = 0
+
+        if self.reserve > self.size:
+            self.pool.release(self.buffer)
+            self.buffer = self.pool.acquire(self.reserve)
+            self.size = c.sizeof(self.buffer)
+            self.reserve = min(self.reserve, self.size)
+
+            log.debug(f'resized frame arena to {self.size} bytes')
+
+    def observe(self, frame_size: int) -> bool:
+        """
+        Records the size of a frame as reported by the library, growing
+        reserve if it didn't fit.  Returns True if reserve was grown.
+        """
+        if frame_size > self.high_water:
+            self.high_water = frame_size
+
+        if frame_size <= self.reserve or self.reserve >= FRAME_BUFFER_MAX_SIZE:
+            return False
+
+        self.reserve = min(
+            int(frame_size * FRAME_BUFFER_HEADROOM),
+            FRAME_BUFFER_MAX_SIZE
+        )
+
+        return True
+
+    def maybe_shrink(self, now: float = None) -> bool:
+        """
+        Lowers reserve if the frames seen during the last quiet period would
+        fit in a smaller one.  Returns True if reserve shrank.
+        """
+        now = time.monotonic() if now is None else now
+
+        if now - self.window_start < FRAME_BUFFER_SHRINK_AFTER:
+            return False
+
+        target = max(
+            FRAME_BUFFER_MIN_SIZE,
+            int(self.high_water * FRAME_BUFFER_HEADROOM)
+        )
+        self.high_water = 0
+        self.window_start = now
+
+        if target >= self.reserve:
+            return False
+
+        self.reserve = target
+
+        return True
+
+    def data(self, i: int) -> bytes:
+        offset = self.offsets[i]
+
+        return self.buffer[offset:offset + self.sizes[i]]
+
+    def release(self) -> None:
+        """
+        Returns the buffer to the pool.
+        """
+        if self.buffer is not None:
+            self.pool.release(self.buffer)
+            self.buffer = None
+            self.size = 0
+
+
+def recv_frames(
+    channel_id: int,
+    max_frames: int,
+    arena: FrameArena
+) -> int:
+    """
+    Receives every frame ready on an AV channel into arena, stopping at
+    max_frames, when the arena can't offer reserve bytes to another frame, or
+    when the library returns an error.  Returns the last status code, e.g.
+    AV_ER_DATA_NOREADY once drained; len(arena) frames were received.
+
+    Frames that don't fit are dropped by the library; they are counted in
+    arena.oversize_frames and reserve grows so the next one fits.
+    """
+    arena.reset()
+    limit = min(max_frames, arena.max_frames)
+    base = c.addressof(arena.buffer)
+    rc = 0
+
+    while arena.count < limit and arena.size - arena.position >= arena.reserve:
+        i = arena.count
+        arena.address.value = base + arena.position
+
+        rc = tw.avRecvFrameData2_rc(
+            channel_id,
+            arena.pointer,
+            arena.reserve,
+            arena.size_received,
+            arena.size_sent,
+            arena.frame_infos[i],
+            FRAMEINFO_SIZE,
+            arena.info_size_received,
+            arena.frame_number
+        )
+
+        if rc < 0:
+            if rc != tc.AVErrorCode.AV_ER_BUFPARA_MAXSIZE_INSUFF:
+                break
+
+            arena.oversize_frames += 1
+            arena.observe(arena.size_sent.value)
+            continue
+
+        arena.observe(arena.size_sent.value)
+        arena.offsets[i] = arena.position
+        arena.sizes[i] = rc
+        arena.frame_numbers[i] = arena.frame_number.value
+        arena.position += rc
+        arena.count += 1
+
+    return rc
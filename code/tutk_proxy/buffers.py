@@ -0,0 +1,109 @@
+import ctypes as c
+import threading
+import logging
+from .constants import (
+    FRAME_BUFFER_SIZE,
+    FRAME_BUFFER_MIN_SIZE,
+    FRAME_BUFFER_MAX_SIZE,
+    FRAME_BUFFER_HEADROOM,
+    FRAME_BUFFER_POOL_IDLE
+)
+
+log = logging.getLogger(__name__)
+
+
+def bucket_size(size: int) -> int:
+    """
+    Rounds a requested size up to the pool's bucket size (next power of two,
+    clamped to FRAME_BUFFER_MIN_SIZE and FRAME_BUFFER_MAX_SIZE).
+    """
+    bucket = FRAME_BUFFER_MIN_SIZE
+
+    while bucket < size and bucket < FRAME_BUFFER_MAX_SIZE:
+        bucket *= 2
+
+    return min(bucket, FRAME_BUFFER_MAX_SIZE)
+
+
+class FrameBufferPool():
+    """
+    Process-wide pool of frame buffers, bucketed by size, so that buffers
+    released by one stream are reused by the next instead of reallocated.
+    """
+    def __init__(self, max_idle: int = FRAME_BUFFER_POOL_IDLE) -> None:
+        self.max_idle = max_idle
+        self.idle: dict[int, list[c.Array]] = dict()
+        self.lock = threading.Lock()
+
+    def acquire(self, size: int) -> c.Array:
+        """
+        Returns a buffer of at least size bytes.
+        """
+        size = bucket_size(size)
+
+        with self.lock:
+            free = self.idle.get(size)
+            if free:
+                return free.pop()
+
+        return (c.c_char * size)()
+
+    def release(self, buffer: c.Array) -> None:
+        """
+        Returns a buffer to the pool; buffers beyond max_idle per bucket are
+        left to the garbage collector.
+        """
+        size = c.sizeof(buffer)
+
+        with self.lock:
+            free = self.idle.setdefault(size, list())
+            if len(free) < self.max_idle:
+                free.append(buffer)
+
+
+frame_buffer_pool = FrameBufferPool()
+
+
+class AdaptiveFrameBuffer():
+    """
+    Frame buffer that grows to fit the largest frame reported by the
+    library, for receiving one frame at a time (see TutkDevice._probe_frame).
+    """
+    def __init__(
+        self,
+        initial_size: int = FRAME_BUFFER_SIZE,
+        pool: FrameBufferPool = frame_buffer_pool
+    ) -> None:
+        self.pool = pool
+        self.buffer = pool.acquire(initial_size)
+        self.size = c.sizeof(self.buffer)
+        self.resizes = 0
+
+    def _resize(self, size: int) -> None:
+        self.pool.release(self.buffer)
+        self.buffer = self.pool.acquire(size)
+        self.size = c.sizeof(self.buffer)
+        self.resizes += 1
+
+        log.debug(f'resized frame buffer to {self.size} bytes')
+
+    def observe(self, frame_size: int) -> bool:
+        """
+        Records the size of a frame as reported by the library, growing the
+        buffer if it didn't fit.  Returns True if the buffer was grown.
+        """
+        if frame_size <= self.size or self.size >= FRAME_BUFFER_MAX_SIZE:
+            return False
+
+        self._resize(int(frame_size * FRAME_BUFFER_HEADROOM))
+
+        return True
+
+    def release(self) -> None:
+        """
+        Returns the buffer to the pool.
+        """
+        if self.buffer is not None:
+            self.pool.release(self.buffer)
+            self.buffer = None
+            self.size = 0
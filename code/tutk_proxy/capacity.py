@@ -0,0 +1,155 @@
+import math
+import threading
+import logging
+import tutk_wrapper.exceptions as te
+import tutk_wrapper.constants as tc
+from .constants import (
+    FLEET_HEADROOM,
+    FLEET_SPARE_SESSIONS
+)
+
+log = logging.getLogger(__name__)
+
+# errors meaning the process has run out of IOTC sessions or AV channels
+CAPACITY_CODES = frozenset((
+    tc.IOTCErrorCode.IOTC_ER_EXCEED_MAX_SESSION,
+    tc.AVErrorCode.AV_ER_EXCEED_MAX_CHANNEL
+))
+
+
+def fleet_limits(
+    devices: int,
+    headroom: float = FLEET_HEADROOM,
+    spare: int = FLEET_SPARE_SESSIONS
+) -> tuple[int, int]:
+    """
+    Returns (devices admitted at once, IOTC sessions and AV channels to
+    allocate) for a fleet of devices.  Each device holds one session and one
+    AV channel; headroom covers cameras beyond those configured, and spare
+    sessions cover hedged connects and relay standbys.
+    """
+    admitted = math.ceil(max(1, devices) * headroom)
+
+    return admitted, admitted + spare
+
+
+class SessionCapacity():
+    """
+    Admits connects up to the number of sessions the library was sized for
+    and queues the rest until a device disconnects, rather than letting them
+    fail with IOTC_ER_EXCEED_MAX_SESSION.  If the library reports running
+    out anyway, the limit is lowered to the sessions in use so later
+    connects queue too, and restored once sessions free up below it.
+    Unlimited until configured.
+
+    Sessions opened alongside a device's own, such as relay standbys, come
+    from a separate allowance of spare sessions and never queue: if none is
+    free the caller goes without.
+    """
+    def __init__(
+        self,
+        limit: int = None,
+        spare: int = None
+    ) -> None:
+        self.condition = threading.Condition()
+        self.limit = limit
+        self.configured = limit
+        self.spare = spare
+        self.in_use = 0
+        self.spare_in_use = 0
+        self.waiting = 0
+        self.exceeded_count = 0
+
+    def configure(
+        self,
+        limit: int,
+        spare: int = None
+    ) -> None:
+        with self.condition:
+            self.limit = limit
+            self.configured = limit
+            self.spare = spare
+            self.condition.notify_all()
+
+    def acquire(self, timeout_s: float = None) -> bool:
+        """
+        Takes a session slot, waiting up to timeout_s for one to free up.
+        Returns False if none did.
+        """
+        with self.condition:
+            if self.limit is not None and self.in_use >= self.limit:
+                log.info(
+                    f'all {self.limit} sessions in use, queueing connect, '
+                    f'waiting={self.waiting + 1}'
+                )
+
+            self.waiting += 1
+
+            try:
+                if not self.condition.wait_for(
+                    lambda: self.limit is None or self.in_use < self.limit,
+                    timeout_s
+                ):
+                    return False
+            finally:
+                self.waiting -= 1
+
+            self.in_use += 1
+
+            return True
+
+    def release(self) -> None:
+        with self.condition:
+            self.in_use = max(0, self.in_use - 1)
+
+            # whatever ran the library out has freed a session since
+            if self.limit != self.configured and self.in_use < self.limit:
+                self.limit = self.configured
+                log.info(f'restored session limit to {self.limit}')
+                self.condition.notify_all()
+            else:
+                self.condition.notify()
+
+    def acquire_spare(self) -> bool:
+        """
+        Takes a spare session slot if one is free, without waiting.
+        """
+        with self.condition:
+            if self.spare is not None and self.spare_in_use >= self.spare:
+                return False
+
+            self.spare_in_use += 1
+
+            return True
+
+    def release_spare(self) -> None:
+        with self.condition:
+            self.spare_in_use = max(0, self.spare_in_use - 1)
+
+    def exceeded(self, error: te.TutkLibraryException) -> None:
+        """
+        Records a capacity error from the library, hit by a caller holding
+        a slot.
+        """
+        with self.condition:
+            self.exceeded_count += 1
+            others = max(1, self.in_use - 1)
+
+            if self.limit is None or others < self.limit:
+                self.limit = others
+
+            log.error(
+                f'library capacity exhausted ({error}) with {others} other '
+                f'sessions in use; limiting to {self.limit}.  Raise '
+                f'--max-devices to serve more cameras at once'
+            )
+
+    def __repr__(self) -> str:
+        return (
+            f'SessionCapacity(limit={self.limit}, in_use={self.in_use}, '
+            f'spare={self.spare}, spare_in_use={self.spare_in_use}, '
+            f'waiting={self.waiting}, exceeded={self.exceeded_count})'
+        )
+
+
+session_capacity = SessionCapacity()
@@ -0,0 +1,470 @@
+from concurrent.futures import (
+    Future,
+    TimeoutError
+)
+from typing import BinaryIO
+import errno
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from .frames import TutkFrame
+from .sinks import FrameSink
+from .timesync import (
+    FrameClock,
+    frame_time
+)
+from .constants import (
+    CATALOG_BATCH_SIZE,
+    CATALOG_BATCH_INTERVAL,
+    CATALOG_WRITE_TIMEOUT
+)
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL,
+    path TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_uid_ts ON segments (uid, start_ts, end_ts);
+CREATE TABLE IF NOT EXISTS keyframes (
+    segment_id INTEGER NOT NULL REFERENCES segments (id),
+    ts REAL NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS keyframes_segment_ts ON keyframes (segment_id, ts);
+"""
+
+
+class ClipRange():
+    """
+    Byte range of a recording covering part of a requested clip.  end_offset
+    is exclusive; segment_offset is the segment's first keyframe.
+    """
+    __slots__ = (
+        'path',
+        'start_ts',
+        'end_ts',
+        'start_offset',
+        'end_offset',
+        'segment_offset'
+    )
+
+    def __init__(
+        self,
+        path: str,
+        start_ts: float,
+        end_ts: float,
+        start_offset: int,
+        end_offset: int,
+        segment_offset: int
+    ) -> None:
+        self.path = path
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.segment_offset = segment_offset
+
+    def __repr__(self) -> str:
+        return (
+            f'ClipRange(path={self.path}, start_ts={self.start_ts}, '
+            f'end_ts={self.end_ts}, start_offset={self.start_offset}, '
+            f'end_offset={self.end_offset})'
+        )
+
+
+class RecordingCatalog():
+    """
+    SQLite (WAL) index of recordings: one row per recorded segment and one
+    per keyframe, with its capture time and byte offset.  Writes are queued
+    and committed in batches on a background thread, so recording never
+    waits on the database.  Rows are committed at least every
+    CATALOG_BATCH_INTERVAL seconds; a crash loses at most that much index,
+    never the recording itself.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.writes = queue.SimpleQueue()
+        self.read_lock = threading.Lock()
+        self.reader = self._connect()
+        self.thread = threading.Thread(
+            target=self._run,
+            name='recording-catalog',
+            daemon=True
+        )
+        self.thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+
+        return connection
+
+    def open_segment(
+        self,
+        uid: str,
+        path: str,
+        start_ts: float,
+        start_offset: int,
+        timeout_s: float = CATALOG_WRITE_TIMEOUT
+    ) -> int:
+        """
+        Records the start of a segment and returns its id once committed.
+        Raises sqlite3.Error if the write failed, or TimeoutError if it
+        wasn't committed within timeout_s.
+        """
+        future = Future()
+        self.writes.put(('open', (uid, path, start_ts, start_offset), future))
+
+        return future.result(timeout=timeout_s)
+
+    def add_keyframe(
+        self,
+        segment_id: int,
+        ts: float,
+        offset: int
+    ) -> None:
+        self.writes.put(('keyframe', (segment_id, ts, offset), None))
+
+    def extend_segment(
+        self,
+        segment_id: int,
+        end_ts: float,
+        end_offset: int
+    ) -> None:
+        self.writes.put(('extend', (end_ts, end_offset, segment_id), None))
+
+    def _apply(
+        self,
+        connection: sqlite3.Connection,
+        op: str,
+        args: tuple
+    ):
+        """
+        Executes one queued write and returns its result, if it has one.
+        """
+        if op == 'keyframe':
+            connection.execute(
+                'INSERT INTO keyframes (segment_id, ts, offset) '
+                'VALUES (?, ?, ?)',
+                args
+            )
+        elif op == 'extend':
+            connection.execute(
+                'UPDATE segments SET end_ts = ?, end_offset = ? '
+                'WHERE id = ?',
+                args
+            )
+        elif op == 'open':
+            uid, path, start_ts, start_offset = args
+            cursor = connection.execute(
+                'INSERT INTO segments (uid, path, start_ts, end_ts, '
+                'start_offset, end_offset) VALUES (?, ?, ?, ?, ?, ?)',
+                (uid, path, start_ts, start_ts, start_offset, start_offset)
+            )
+            return cursor.lastrowid
+
+    def _run(self) -> None:
+        connection = self._connect()
+        running = True
+
+        while running:
+            batch = list()
+            deadline = time.monotonic() + CATALOG_BATCH_INTERVAL
+
+            # collect until the batch is full, the interval passes, or a
+            # caller is waiting on a result
+            while len(batch) < CATALOG_BATCH_SIZE:
+                try:
+                    item = self.writes.get(
+                        timeout=max(0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    running = False
+                    break
+
+                batch.append(item)
+
+                if item[2] is not None:
+                    break
+
+            if not batch:
+                continue
+
+            try:
+                with connection:
+                    results = [
+                        self._apply(connection, op, args)
+                        for op, args, _ in batch
+                    ]
+            except sqlite3.Error as e:
+                log.warn(f'unable to write catalog batch: {e}')
+                for _, _, future in batch:
+                    if future:
+                        future.set_exception(e)
+                continue
+
+            # only report results once they are committed
+            for (_, _, future), result in zip(batch, results):
+                if future:
+                    future.set_result(result)
+
+        connection.close()
+
+    def find_clip(
+        self,
+        uid: str,
+        start_ts: float,
+        end_ts: float
+    ) -> list[ClipRange]:
+        """
+        Returns the byte ranges covering uid's recordings between start_ts
+        and end_ts, oldest first.  Each range starts at the keyframe at or
+        before start_ts so that it is decodable.
+        """
+        with self.read_lock:
+            segments = self.reader.execute(
+                'SELECT id, path, end_ts, start_offset, end_offset '
+                'FROM segments WHERE uid = ? AND start_ts <= ? '
+                'AND end_ts >= ? ORDER BY start_ts',
+                (uid, end_ts, start_ts)
+            ).fetchall()
+
+            ranges = list()
+
+            for segment_id, path, segment_end_ts, segment_start, segment_end \
+                in segments:
+                start = self.reader.execute(
+                    'SELECT ts, offset FROM keyframes WHERE segment_id = ? '
+                    'AND ts <= ? ORDER BY ts DESC, offset DESC LIMIT 1',
+                    (segment_id, start_ts)
+                ).fetchone() or self.reader.execute(
+                    'SELECT ts, offset FROM keyframes WHERE segment_id = ? '
+                    'ORDER BY ts, offset LIMIT 1',
+                    (segment_id,)
+                ).fetchone()
+
+                if start is None:
+                    continue
+
+                end = self.reader.execute(
+                    'SELECT ts, offset FROM keyframes WHERE segment_id = ? '
+                    'AND ts > ? ORDER BY ts, offset LIMIT 1',
+                    (segment_id, end_ts)
+                ).fetchone()
+
+                end = end or (segment_end_ts, segment_end)
+
+                ranges.append(ClipRange(
+                    path=path,
+                    start_ts=start[0],
+                    end_ts=end[0],
+                    start_offset=start[1],
+                    end_offset=end[1],
+                    segment_offset=segment_start
+                ))
+
+        return ranges
+
+    def keyframes(self, path: str) -> list[tuple[float, int]]:
+        """
+        Returns (ts, offset) for every keyframe recorded to path, in file
+        order.
+        """
+        with self.read_lock:
+            return self.reader.execute(
+                'SELECT keyframes.ts, keyframes.offset FROM keyframes '
+                'JOIN segments ON segments.id = keyframes.segment_id '
+                'WHERE segments.path = ? ORDER BY keyframes.offset',
+                (os.path.abspath(path),)
+            ).fetchall()
+
+    def extract_clip(
+        self,
+        uid: str,
+        start_ts: float,
+        end_ts: float,
+        dest_file: BinaryIO
+    ) -> int:
+        """
+        Copies uid's recording between start_ts and end_ts to dest_file in
+        the kernel, without reading it through Python.  Returns the number of
+        bytes copied.
+        """
+        copied = 0
+        dest_file.flush()
+        dest_fd = dest_file.fileno()
+
+        for clip in self.find_clip(uid, start_ts, end_ts):
+            with open(clip.path, 'rb') as source:
+                copied += copy_range(
+                    source.fileno(),
+                    dest_fd,
+                    clip.start_offset,
+                    clip.end_offset - clip.start_offset
+                )
+
+        return copied
+
+    def close(self) -> None:
+        """
+        Commits queued writes and closes the catalog.
+        """
+        self.writes.put(None)
+        self.thread.join()
+
+        with self.read_lock:
+            self.reader.close()
+
+
+# copy_file_range can't copy between these fds; anything else is an I/O error
+COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP
+}
+
+
+def copy_range(
+    source_fd: int,
+    dest_fd: int,
+    offset: int,
+    count: int
+) -> int:
+    """
+    Copies count bytes from offset in source_fd to dest_fd's current position
+    with copy_file_range, falling back to sendfile where it isn't supported
+    (e.g. for pipes, or across filesystems on older kernels).
+    """
+    copied = 0
+    fallback = not hasattr(os, 'copy_file_range')
+
+    while copied < count:
+        if not fallback:
+            try:
+                n = os.copy_file_range(
+                    source_fd,
+                    dest_fd,
+                    count - copied,
+                    offset + copied
+                )
+            except OSError as e:
+                if e.errno not in COPY_FALLBACK_ERRNOS:
+                    raise
+
+                fallback = True
+
+        if fallback:
+            n = os.sendfile(
+                dest_fd,
+                source_fd,
+                offset + copied,
+                count - copied
+            )
+
+        if n == 0:
+            break
+
+        copied += n
+
+    return copied
+
+
+class RecordingSink(FrameSink):
+    """
+    Writes frames to a recording file and indexes it in a RecordingCatalog:
+    one segment per stream, one row per keyframe.  Frames are timed by the
+    device clock where clock (the device's frame_clock) knows timestamps to
+    be one, otherwise by when they were received.  dest_file must be a
+    seekable file, since the index records byte offsets into it.  If the
+    segment can't be recorded in the catalog, recording carries on without
+    an index.
+    """
+    def __init__(
+        self,
+        catalog: RecordingCatalog,
+        uid: str,
+        dest_file: BinaryIO,
+        clock: FrameClock = None
+    ) -> None:
+        if not dest_file.seekable():
+            raise ValueError('catalogued recordings must be seekable files')
+
+        self.catalog = catalog
+        self.uid = uid
+        self.dest_file = dest_file
+        self.clock = clock
+        self.path = os.path.abspath(dest_file.name)
+        self.offset = dest_file.seek(0, os.SEEK_END)
+        self.segment_id: int = None
+        self.started = False
+        self.last_ts: float = None
+
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        ts = frame_time(frame.timestamp, self.clock)
+
+        if frame.is_keyframe:
+            self.started = True
+
+            if self.segment_id is None and self.catalog:
+                try:
+                    self.segment_id = self.catalog.open_segment(
+                        self.uid,
+                        self.path,
+                        ts,
+                        self.offset
+                    )
+                except (sqlite3.Error, TimeoutError) as e:
+                    log.warn(
+                        f'unable to catalog recording of {self.uid}, '
+                        f'recording without an index: {e!r}'
+                    )
+                    self.catalog = None
+
+            if self.segment_id is not None:
+                self.catalog.add_keyframe(self.segment_id, ts, self.offset)
+                self.catalog.extend_segment(
+                    self.segment_id,
+                    ts,
+                    self.offset
+                )
+
+        # recordings start at a keyframe so every segment is decodable
+        if not self.started:
+            return
+
+        self.dest_file.write(data)
+        self.offset += len(data)
+        self.last_ts = ts
+
+    def flush(self) -> None:
+        self.dest_file.flush()
+
+        if self.segment_id is not None and self.catalog:
+            self.catalog.extend_segment(
+                self.segment_id,
+                self.last_ts,
+                self.offset
+            )
+
+    def close(self) -> None:
+        self.dest_file.close()
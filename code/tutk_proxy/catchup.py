@@ -0,0 +1,78 @@
+import time
+import logging
+import tutk_wrapper.wrapper as tw
+import tutk_wrapper.exceptions as te
+from .constants import (
+    CATCHUP_INTERVAL,
+    CATCHUP_THRESHOLD,
+    CATCHUP_HOLD
+)
+
+log = logging.getLogger(__name__)
+
+
+class CatchUpPolicy():
+    """
+    Samples an AV channel's resend buffer usage every interval_s and, once it
+    has stayed above threshold for hold_s, discards the library's queued
+    video with avClientCleanVideoBuf so the stream jumps back to live rather
+    than lagging further behind over hours.  The frames that follow a flush
+    reference discarded ones, so the caller skips to the next keyframe.
+    """
+    def __init__(
+        self,
+        threshold: float = CATCHUP_THRESHOLD,
+        hold_s: float = CATCHUP_HOLD,
+        interval_s: float = CATCHUP_INTERVAL
+    ) -> None:
+        self.threshold = threshold
+        self.hold_s = hold_s
+        self.interval_s = interval_s
+        self.usage = 0.0
+        self.flushes = 0
+        self.next_sample = 0.0
+        self.above_since: float = None
+
+    def check(
+        self,
+        channel_id: int,
+        now: float = None
+    ) -> bool:
+        """
+        Samples usage if due and flushes the channel's video buffer if it has
+        been high for too long.  Returns True if it flushed.
+        """
+        now = time.monotonic() if now is None else now
+
+        if now < self.next_sample:
+            return False
+
+        self.next_sample = now + self.interval_s
+
+        self.usage = max(0.0, tw.avResendBufUsageRate(channel_id))
+
+        if self.usage <= self.threshold:
+            self.above_since = None
+            return False
+
+        if self.above_since is None:
+            self.above_since = now
+
+        if now - self.above_since < self.hold_s:
+            return False
+
+        log.warn(
+            f'resend buffer at {self.usage:.0%} for {self.hold_s}s, '
+            f'flushing video to catch up'
+        )
+
+        try:
+            tw.avClientCleanVideoBuf(channel_id)
+        except te.TutkLibraryException as e:
+            log.warn(f'unable to flush video buffer: {e}')
+            return False
+
+        self.above_since = None
+        self.flushes += 1
+
+        return True
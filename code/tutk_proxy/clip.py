@@ -0,0 +1,225 @@
+from typing import BinaryIO
+import mmap
+import os
+import shutil
+import subprocess
+import tempfile
+import logging
+from .exceptions import TutkDecoderUnavailableException
+from .catalog import (
+    ClipRange,
+    RecordingCatalog
+)
+from .h264 import (
+    NalType,
+    iter_nal_units,
+    parameter_sets
+)
+from .constants import CLIP_FRAME_RATE
+
+log = logging.getLogger(__name__)
+
+CLIP_FORMATS = ['h264', 'mp4']
+
+
+class ClipWriter():
+    """
+    Copies keyframe-aligned byte ranges of recordings into a clip.  Each
+    recording is memory-mapped once, so only the pages a clip covers are
+    read, and nothing is decoded or re-encoded.
+    """
+    def __init__(self) -> None:
+        self.maps: dict[str, mmap.mmap] = dict()
+
+    def _map(self, path: str) -> mmap.mmap:
+        if path not in self.maps:
+            with open(path, 'rb') as f:
+                self.maps[path] = mmap.mmap(
+                    f.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ
+                )
+
+        return self.maps[path]
+
+    def write(
+        self,
+        clip: ClipRange,
+        dest_file: BinaryIO
+    ) -> int:
+        """
+        Writes one range to dest_file and returns the number of bytes written.
+        If the range's keyframe doesn't carry SPS/PPS they are copied from
+        the segment's first keyframe, so the clip decodes on its own.
+        """
+        data = self._map(clip.path)
+        end = min(clip.end_offset, len(data))
+        written = 0
+
+        sps, pps = parameter_sets(data, clip.start_offset, end)
+
+        if sps is None or pps is None:
+            segment_sps, segment_pps = parameter_sets(
+                data,
+                clip.segment_offset,
+                end
+            )
+
+            for unit in (sps or segment_sps, pps or segment_pps):
+                if unit:
+                    written += dest_file.write(unit)
+
+        view = memoryview(data)[clip.start_offset:end]
+
+        try:
+            written += dest_file.write(view)
+        finally:
+            view.release()
+
+        return written
+
+    def frame_count(self, clip: ClipRange) -> int:
+        """
+        Counts the pictures in a range (assumes one slice per picture).
+        """
+        return sum(
+            1 for nal_type, _, _ in iter_nal_units(
+                self._map(clip.path),
+                clip.start_offset,
+                clip.end_offset
+            )
+            if nal_type in (NalType.SLICE, NalType.SLICE_IDR)
+        )
+
+    def close(self) -> None:
+        for data in self.maps.values():
+            data.close()
+
+        self.maps.clear()
+
+
+def write_clip(
+    ranges: list[ClipRange],
+    dest_file: BinaryIO
+) -> int:
+    """
+    Writes ranges to dest_file as one H.264 Annex B stream and returns the
+    number of bytes written.
+    """
+    writer = ClipWriter()
+
+    try:
+        return sum(writer.write(clip, dest_file) for clip in ranges)
+    finally:
+        writer.close()
+
+
+def export_clip(
+    catalog: RecordingCatalog,
+    uid: str,
+    start_ts: float,
+    end_ts: float,
+    dest_path: str,
+    fmt: str = 'h264'
+) -> int:
+    """
+    Exports uid's recording between start_ts and end_ts to dest_path,
+    starting at the keyframe before start_ts.  fmt is h264 (the raw stream)
+    or mp4, which remuxes with ffmpeg -c copy.  Returns the number of bytes
+    of video exported; 0 if nothing was recorded in that range.
+    """
+    if fmt not in CLIP_FORMATS:
+        raise ValueError(f'unsupported clip format {fmt}')
+
+    ranges = catalog.find_clip(uid, start_ts, end_ts)
+
+    if not ranges:
+        log.warn(f'no recording of {uid} between {start_ts} and {end_ts}')
+        return 0
+
+    if fmt == 'h264':
+        with open(dest_path, 'wb') as dest_file:
+            written = write_clip(ranges, dest_file)
+    else:
+        written = remux_mp4(ranges, dest_path)
+
+    log.info(f'exported {written} bytes of {uid} to {dest_path}')
+
+    return written
+
+
+def remux_mp4(
+    ranges: list[ClipRange],
+    dest_path: str
+) -> int:
+    """
+    Pipes ranges through ffmpeg into an mp4 container without re-encoding.
+    Raw H.264 has no timestamps, so frames are spaced evenly at the clip's
+    average rate.  Returns the number of bytes of video piped.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+
+    if ffmpeg == None:
+        raise TutkDecoderUnavailableException(
+            'mp4 clips require ffmpeg on the PATH'
+        )
+
+    writer = ClipWriter()
+
+    try:
+        duration = ranges[-1].end_ts - ranges[0].start_ts
+        frames = sum(writer.frame_count(clip) for clip in ranges)
+        frame_rate = round(frames / duration, 3) \
+            if frames and duration > 0 else CLIP_FRAME_RATE
+
+        with tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(
+                [
+                    ffmpeg,
+                    '-loglevel', 'error',
+                    '-y',
+                    '-f', 'h264',
+                    '-framerate', str(frame_rate),
+                    '-i', 'pipe:0',
+                    '-c', 'copy',
+                    '-movflags', '+faststart',
+                    dest_path
+                ],
+                stdin=subprocess.PIPE,
+                stderr=errors
+            )
+
+            try:
+                written = sum(
+                    writer.write(clip, process.stdin) for clip in ranges
+                )
+                process.stdin.close()
+                process.wait()
+            except BrokenPipeError:
+                # ffmpeg exited early; its status and output say why
+                written = 0
+            finally:
+                # don't leave ffmpeg running, or unreaped, if writing failed
+                if process.poll() == None:
+                    process.kill()
+                    process.wait()
+
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+            errors.seek(0)
+            message = errors.read().decode(errors='replace').strip()
+    finally:
+        writer.close()
+
+    if process.returncode != 0:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+
+        raise RuntimeError(
+            f'ffmpeg exited with status {process.returncode}: {message}'
+        )
+
+    return written
@@ -0,0 +1,413 @@
+from bisect import bisect
+from dataclasses import (
+    asdict,
+    replace
+)
+import hashlib
+import json
+import socket
+import socketserver
+import threading
+import time
+import logging
+from .models import TutkDeviceStreamInfo
+from .constants import (
+    CLUSTER_HEARTBEAT_INTERVAL,
+    CLUSTER_NODE_TIMEOUT,
+    CLUSTER_VNODES
+)
+
+log = logging.getLogger(__name__)
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(),
+        'big'
+    )
+
+
+class HashRing():
+    """
+    Consistent hashing of camera UIDs onto nodes.  Each node is placed at
+    vnodes points per unit of weight, so when a node joins or leaves only
+    the cameras on its arcs move, roughly 1/n of them.
+    """
+    def __init__(self, vnodes: int = CLUSTER_VNODES) -> None:
+        self.vnodes = vnodes
+        self.points: list[int] = list()
+        self.owners: list[str] = list()
+        self.weights: dict[str, int] = dict()
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.weights
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def _rebuild(self) -> None:
+        ring = sorted(
+            (ring_hash(f'{node}#{i}'), node)
+            for node, weight in self.weights.items()
+            for i in range(self.vnodes * weight)
+        )
+        self.points = [point for point, _ in ring]
+        self.owners = [node for _, node in ring]
+
+    def add(
+        self,
+        node: str,
+        weight: int = 1
+    ) -> None:
+        self.weights[node] = max(1, weight)
+        self._rebuild()
+
+    def remove(self, node: str) -> None:
+        if self.weights.pop(node, None) is not None:
+            self._rebuild()
+
+    def owner(self, uid: str) -> str:
+        """
+        Returns the node a camera belongs to, or None if there are no nodes.
+        """
+        if not self.points:
+            return None
+
+        i = bisect(self.points, ring_hash(uid)) % len(self.points)
+
+        return self.owners[i]
+
+
+class NodeStatus():
+    __slots__ = (
+        'node_id',
+        'weight',
+        'last_seen',
+        'streams'
+    )
+
+    def __init__(
+        self,
+        node_id: str,
+        weight: int
+    ) -> None:
+        self.node_id = node_id
+        self.weight = weight
+        self.last_seen = time.monotonic()
+        self.streams: dict[str, TutkDeviceStreamInfo] = dict()
+
+    def load(self) -> dict:
+        """
+        Returns the node's streaming cameras and their total fps.
+        """
+        return {
+            'cameras': len(self.streams),
+            'fps': sum(s.fps for s in self.streams.values()),
+            'dropped_frames': sum(
+                s.dropped_frames for s in self.streams.values()
+            )
+        }
+
+
+class _HeartbeatHandler(socketserver.StreamRequestHandler):
+    """
+    Reads newline-delimited JSON heartbeats from one node and answers each
+    with the node's assigned cameras.
+    """
+    def handle(self) -> None:
+        coordinator = self.server.coordinator
+
+        for line in self.rfile:
+            # a closed coordinator drops its nodes' connections
+            if coordinator.stopped.is_set():
+                return
+
+            try:
+                reply = coordinator.handle_message(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                log.warn(f'bad message from {self.client_address}: {e!r}')
+                return
+
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class ClusterCoordinator():
+    """
+    Assigns cameras to proxy nodes by consistent hashing.  Nodes join by
+    sending a heartbeat, carrying their weight (e.g. worker count) and the
+    stream_info of their cameras, and are answered with the cameras they
+    should run.  A node that leaves, or misses heartbeats for timeout_s,
+    is dropped from the ring and its cameras move to the remaining nodes.
+    Listens on host:port; port 0 picks a free one (see address).
+    """
+    def __init__(
+        self,
+        uids: list[str] = (),
+        host: str = '127.0.0.1',
+        port: int = 0,
+        timeout_s: float = CLUSTER_NODE_TIMEOUT
+    ) -> None:
+        self.uids: set[str] = set(uids)
+        self.timeout_s = timeout_s
+        self.ring = HashRing()
+        self.nodes: dict[str, NodeStatus] = dict()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.server = socketserver.ThreadingTCPServer(
+            (host, port),
+            _HeartbeatHandler,
+            bind_and_activate=False
+        )
+        self.server.allow_reuse_address = True
+        self.server.daemon_threads = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.server.coordinator = self
+        self.threads = [
+            threading.Thread(
+                target=self.server.serve_forever,
+                name='coordinator',
+                daemon=True
+            ),
+            threading.Thread(
+                target=self._reap,
+                name='coordinator-reaper',
+                daemon=True
+            )
+        ]
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server.server_address
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+        log.info(
+            f'coordinating {len(self.uids)} cameras on '
+            f'{self.address[0]}:{self.address[1]}'
+        )
+
+    def add_camera(self, uid: str) -> None:
+        with self.lock:
+            self.uids.add(uid)
+
+    def remove_camera(self, uid: str) -> None:
+        with self.lock:
+            self.uids.discard(uid)
+
+    def _cameras_for(self, node_id: str) -> list[str]:
+        return sorted(u for u in self.uids if self.ring.owner(u) == node_id)
+
+    def assignments(self) -> dict[str, list[str]]:
+        """
+        Returns {node_id: [uid]} for every live node.
+        """
+        with self.lock:
+            return {n: self._cameras_for(n) for n in self.nodes}
+
+    def status(self) -> dict[str, dict]:
+        """
+        Returns each live node's weight and reported load.
+        """
+        with self.lock:
+            return {
+                n: {'weight': s.weight, **s.load()}
+                for n, s in self.nodes.items()
+            }
+
+    def handle_message(self, message: dict) -> dict:
+        node_id = message['node']
+
+        with self.lock:
+            if message['type'] == 'leave':
+                self._drop(node_id, 'left')
+                return {'cameras': []}
+
+            status = self.nodes.get(node_id)
+            weight = int(message.get('weight', 1))
+
+            if status is None or status.weight != weight:
+                if status is None:
+                    status = NodeStatus(node_id, weight)
+                    self.nodes[node_id] = status
+                    log.info(f'node {node_id} joined, weight={weight}')
+
+                status.weight = weight
+                self.ring.add(node_id, weight)
+
+            status.last_seen = time.monotonic()
+            status.streams = {
+                uid: TutkDeviceStreamInfo(**info)
+                for uid, info in message.get('streams', {}).items()
+            }
+
+            return {'cameras': self._cameras_for(node_id)}
+
+    def _drop(
+        self,
+        node_id: str,
+        reason: str
+    ) -> None:
+        if self.nodes.pop(node_id, None) is None:
+            return
+
+        moved = self._cameras_for(node_id)
+        self.ring.remove(node_id)
+
+        log.warn(
+            f'node {node_id} {reason}, moving {len(moved)} cameras to '
+            f'{len(self.ring)} nodes'
+        )
+
+    def _reap(self) -> None:
+        while not self.stopped.wait(self.timeout_s / 4):
+            now = time.monotonic()
+
+            with self.lock:
+                for node_id, status in list(self.nodes.items()):
+                    if now - status.last_seen > self.timeout_s:
+                        self._drop(node_id, 'timed out')
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ClusterNode():
+    """
+    Runs the cameras a ClusterCoordinator assigns to this node.  Every
+    interval_s it sends a heartbeat with the node's weight and the
+    stream_info of its cameras, then calls start(uid) and stop(uid) for
+    cameras added to or removed from its assignment.
+
+    Each assignment is a lease of timeout_s, counted from when the heartbeat
+    it answered was sent.  If the coordinator can't be reached, the node
+    keeps running its cameras and retries until the lease runs out.  Then
+    it stops them, since by then the coordinator has dropped the node and
+    moved its cameras elsewhere.
+    """
+    def __init__(
+        self,
+        node_id: str,
+        coordinator: tuple[str, int],
+        start,
+        stop,
+        stream_infos,
+        weight: int = 1,
+        interval_s: float = CLUSTER_HEARTBEAT_INTERVAL,
+        timeout_s: float = CLUSTER_NODE_TIMEOUT
+    ) -> None:
+        self.node_id = node_id
+        self.coordinator = coordinator
+        self.start_camera = start
+        self.stop_camera = stop
+        self.stream_infos = stream_infos
+        self.weight = weight
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self.lease_until = 0.0
+        self.cameras: set[str] = set()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run,
+            name=f'node-{node_id}',
+            daemon=True
+        )
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def _heartbeat(self) -> dict:
+        streams = {
+            uid: asdict(replace(info, last_frame_jpg=None))
+            for uid, info in dict(self.stream_infos()).items()
+            if uid in self.cameras
+        }
+
+        return {
+            'type': 'heartbeat',
+            'node': self.node_id,
+            'weight': self.weight,
+            'streams': streams
+        }
+
+    def _apply(self, cameras: set[str]) -> None:
+        """
+        Starts and stops cameras to match an assignment.  A camera that
+        fails to start is tried again at the next heartbeat.
+        """
+        for uid in sorted(self.cameras - cameras):
+            log.info(f'releasing {uid}')
+            self.cameras.discard(uid)
+
+            try:
+                self.stop_camera(uid)
+            except Exception as e:
+                log.warn(f'unable to stop {uid}: {e!r}')
+
+        for uid in sorted(cameras - self.cameras):
+            log.info(f'taking {uid}')
+
+            try:
+                self.start_camera(uid)
+            except Exception as e:
+                log.warn(f'unable to start {uid}: {e!r}')
+                continue
+
+            self.cameras.add(uid)
+
+    def _exchange(
+        self,
+        stream,
+        message: dict
+    ) -> dict:
+        stream.write(json.dumps(message).encode() + b'\n')
+        stream.flush()
+        line = stream.readline()
+
+        if not line:
+            raise ConnectionError('coordinator closed the connection')
+
+        return json.loads(line)
+
+    def _run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                with socket.create_connection(
+                    self.coordinator,
+                    timeout=self.interval_s * 2
+                ) as sock, sock.makefile('rwb') as stream:
+                    while not self.stopped.is_set():
+                        sent = time.monotonic()
+                        reply = self._exchange(stream, self._heartbeat())
+                        self.lease_until = sent + self.timeout_s
+                        self._apply(set(reply['cameras']))
+                        self.stopped.wait(self.interval_s)
+
+                    self._exchange(
+                        stream,
+                        {'type': 'leave', 'node': self.node_id}
+                    )
+            except (OSError, ValueError, KeyError) as e:
+                log.warn(f'unable to reach coordinator: {e!r}')
+
+                if self.cameras and time.monotonic() >= self.lease_until:
+                    log.warn(
+                        f'assignment expired, releasing '
+                        f'{len(self.cameras)} cameras'
+                    )
+                    self._apply(set())
+
+                self.stopped.wait(self.interval_s)
+
+    def close(self) -> None:
+        """
+        Leaves the cluster, so the coordinator moves this node's cameras
+        straight away, and stops them here.
+        """
+        self.stopped.set()
+        self.thread.join()
+        self._apply(set())
@@ -0,0 +1,447 @@
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ThreadPoolExecutor
+)
+import asyncio
+import queue
+import statistics
+import threading
+import time
+import logging
+import tutk_wrapper.wrapper as tw
+import tutk_wrapper.exceptions as te
+import tutk_wrapper.constants as tc
+from utils.annotations import log_args
+from .constants import (
+    IOTCSessionMode,
+    CONNECT_LAN_TIMEOUT,
+    CONNECT_P2P_TIMEOUT,
+    CONNECT_DETECT_NETWORK_TIMEOUT,
+    CONNECT_LATENCY_SAMPLES,
+    CONNECT_MAX_ATTEMPTS,
+    CONNECT_WORKERS
+)
+from .capacity import session_capacity
+
+log = logging.getLogger(__name__)
+
+# connect errors another attempt won't get past
+CONNECT_FATAL_CODES = frozenset((
+    tc.IOTCErrorCode.IOTC_ER_DEVICE_OFFLINE,
+    tc.IOTCErrorCode.IOTC_ER_DEVICE_IS_SLEEP
+))
+
+# set by configure_lan_first; the library's timeouts are process-wide
+lan_first = False
+
+# shared by open_async callers that don't bring their own executor
+open_executor: ThreadPoolExecutor = None
+open_executor_lock = threading.Lock()
+
+
+@log_args
+def configure_lan_first(
+    lan_timeout_ms: int = CONNECT_LAN_TIMEOUT,
+    p2p_timeout_ms: int = CONNECT_P2P_TIMEOUT,
+    detect_network_timeout_ms: int = CONNECT_DETECT_NETWORK_TIMEOUT
+) -> bool:
+    """
+    Shortens the library's connect timeouts for cameras on a network without
+    internet access, so connects find the camera by LAN search straight away
+    rather than waiting on master servers and P2P paths that can't succeed.
+    Returns True if every timeout was applied.
+    """
+    global lan_first
+
+    try:
+        tw.IOTC_Setup_DetectNetwork_Timeout(detect_network_timeout_ms)
+        tw.IOTC_Setup_LANConnection_Timeout(lan_timeout_ms)
+        tw.IOTC_Setup_P2PConnection_Timeout(p2p_timeout_ms)
+    except (te.TutkLibraryException, AttributeError) as e:
+        log.warn(f'unable to configure lan-first connects: {e!r}')
+        return False
+
+    lan_first = True
+
+    log.info(
+        f'configured lan-first connects, '
+        f'lan_timeout_ms={lan_timeout_ms}, '
+        f'p2p_timeout_ms={p2p_timeout_ms}, '
+        f'detect_network_timeout_ms={detect_network_timeout_ms}'
+    )
+
+    return True
+
+
+def lan_first_enabled() -> bool:
+    return lan_first
+
+
+class ConnectLatency():
+    """
+    Connect times by the session mode each connect ended up in, so LAN
+    connects can be told apart from ones that fell back to P2P or relay.
+    Keeps the last CONNECT_LATENCY_SAMPLES per mode.
+    """
+    def __init__(self, samples: int = CONNECT_LATENCY_SAMPLES) -> None:
+        self.lock = threading.Lock()
+        self.samples: dict[IOTCSessionMode, deque] = {
+            mode: deque(maxlen=samples) for mode in IOTCSessionMode
+        }
+        self.counts: dict[IOTCSessionMode, int] = dict.fromkeys(
+            IOTCSessionMode,
+            0
+        )
+
+    def record(
+        self,
+        mode: IOTCSessionMode,
+        seconds: float
+    ) -> None:
+        with self.lock:
+            self.samples[mode].append(seconds)
+            self.counts[mode] += 1
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Returns count, median and max connect time in ms for each mode seen.
+        """
+        with self.lock:
+            samples = {
+                mode: sorted(s) for mode, s in self.samples.items() if s
+            }
+            counts = dict(self.counts)
+
+        return {
+            mode.name: {
+                'count': counts[mode],
+                'median_ms': round(statistics.median(s) * 1000),
+                'max_ms': round(s[-1] * 1000)
+            } for mode, s in samples.items()
+        }
+
+    def __repr__(self) -> str:
+        return f'ConnectLatency({self.summary()})'
+
+
+connect_latency = ConnectLatency()
+
+
+class ConnectAttempt():
+    """
+    One IOTC_Connect_ByUID_Parallel call on its own session ID, run on a
+    thread so it can be stopped with IOTC_Connect_Stop_BySID.
+    """
+    def __init__(
+        self,
+        uid: bytes,
+        results: queue.SimpleQueue
+    ) -> None:
+        self.lock = threading.Lock()
+        self.client_sid = tw.IOTC_Get_SessionID()
+        self.device_sid: int = None
+        self.error: te.TutkLibraryException = None
+        self.finished = False
+        self.discarded = False
+        self.thread = threading.Thread(
+            target=self._run,
+            args=(uid, results),
+            name=f'connect-{self.client_sid}',
+            daemon=True
+        )
+        self.thread.start()
+
+    def _run(
+        self,
+        uid: bytes,
+        results: queue.SimpleQueue
+    ) -> None:
+        try:
+            self.device_sid = tw.IOTC_Connect_ByUID_Parallel(
+                uid,
+                self.client_sid
+            )
+        except te.TutkLibraryException as e:
+            self.error = e
+
+        with self.lock:
+            self.finished = True
+            discarded = self.discarded
+
+        if discarded:
+            self._release()
+
+        results.put(self)
+
+    def _release(self) -> None:
+        tw.IOTC_Session_Close(self.client_sid)
+
+    def discard(self) -> None:
+        """
+        Stops the attempt if it's still connecting and releases its session,
+        now or once the connect returns.
+        """
+        with self.lock:
+            self.discarded = True
+            finished = self.finished
+
+        if finished:
+            self._release()
+            return
+
+        try:
+            tw.IOTC_Connect_Stop_BySID(self.client_sid)
+        except te.TutkLibraryException as e:
+            log.debug(f'unable to stop connect: {e}')
+
+
+class ConnectOperation():
+    """
+    Connects to a device by UID within deadline_s.  If hedge_after_s passes
+    without a session, another attempt is started alongside the first, up to
+    max_attempts, and attempts that fail are retried while time remains.
+    The first session wins and the rest are stopped.  abort() stops every
+    attempt from another thread.
+
+    Offline and sleeping devices fail straight away rather than being
+    retried, so they don't hold a worker for the whole deadline.  Attempts
+    beyond the first each take one of session_capacity's spare slots for
+    the rest of the operation, and aren't made if none is free.
+    """
+    def __init__(
+        self,
+        uid: str,
+        deadline_s: float = None,
+        hedge_after_s: float = None,
+        max_attempts: int = CONNECT_MAX_ATTEMPTS
+    ) -> None:
+        self.uid = uid.encode()
+        self.deadline_s = deadline_s
+        self.hedge_after_s = hedge_after_s
+        self.max_attempts = max_attempts if hedge_after_s else 1
+        self.results = queue.SimpleQueue()
+        self.aborted = False
+        self.spares = 0
+
+    def abort(self) -> None:
+        self.aborted = True
+        self.results.put(None)
+
+    def _start(self, attempts: list[ConnectAttempt]) -> bool:
+        if not session_capacity.acquire_spare():
+            log.info(
+                f'no spare session for another connect attempt, '
+                f'{session_capacity}'
+            )
+            return False
+
+        try:
+            attempts.append(ConnectAttempt(self.uid, self.results))
+        except te.TutkLibraryException as e:
+            log.warn(f'unable to start connect attempt: {e}')
+            session_capacity.release_spare()
+            return False
+
+        self.spares += 1
+
+        return True
+
+    def run(self) -> tuple[int, int]:
+        """
+        Returns (client_sid, device_sid), or raises TutkLibraryException with
+        IOTC_ER_TIMEOUT, IOTC_ER_ABORTED or the last attempt's error.
+        """
+        if self.aborted:
+            raise te.TutkLibraryException(tc.IOTCErrorCode.IOTC_ER_ABORTED)
+
+        now = time.monotonic()
+        deadline = None if self.deadline_s is None else now + self.deadline_s
+        next_hedge = None if not self.hedge_after_s \
+            else now + self.hedge_after_s
+        attempts: list[ConnectAttempt] = list()
+        pending = 0
+        winner: ConnectAttempt = None
+        error = None
+
+        # the first attempt's errors, e.g. no free session, are the caller's
+        attempts.append(ConnectAttempt(self.uid, self.results))
+        pending += 1
+
+        while pending and winner is None and error is None:
+            waits = [
+                t - now for t in (deadline, next_hedge) if t is not None
+            ]
+
+            try:
+                attempt = self.results.get(
+                    timeout=max(0, min(waits)) if waits else None
+                )
+            except queue.Empty:
+                attempt = False
+
+            now = time.monotonic()
+
+            if attempt is None:
+                error = te.TutkLibraryException(
+                    tc.IOTCErrorCode.IOTC_ER_ABORTED
+                )
+            elif attempt:
+                pending -= 1
+
+                if attempt.error is None:
+                    winner = attempt
+                elif attempt.error.args[0] in CONNECT_FATAL_CODES:
+                    error = attempt.error
+                elif not pending:
+                    if len(attempts) < self.max_attempts \
+                        and self._start(attempts):
+                        pending += 1
+                    else:
+                        error = attempt.error
+            elif deadline is not None and now >= deadline:
+                error = te.TutkLibraryException(
+                    tc.IOTCErrorCode.IOTC_ER_TIMEOUT
+                )
+            elif next_hedge is not None and now >= next_hedge:
+                next_hedge += self.hedge_after_s
+
+                if len(attempts) < self.max_attempts:
+                    log.info(
+                        f'no session after {self.hedge_after_s}s, starting '
+                        f'another connect attempt'
+                    )
+                    if self._start(attempts):
+                        pending += 1
+
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.discard()
+
+        # the winner, whichever it was, uses the caller's session slot
+        for _ in range(self.spares):
+            session_capacity.release_spare()
+
+        self.spares = 0
+
+        if winner is None:
+            raise error
+
+        return winner.client_sid, winner.device_sid
+
+
+class AbortableFuture(Future):
+    """
+    A Future whose cancel() aborts the operation if it's already running,
+    which then resolves to False; otherwise it's cancelled as usual.
+    asyncio.wrap_future passes task cancellation through to it.
+    """
+    def __init__(self, abort) -> None:
+        super().__init__()
+        self.abort = abort
+
+    def cancel(self) -> bool:
+        if super().cancel():
+            return True
+
+        if self.running():
+            self.abort()
+
+        return False
+
+
+def submit_open(
+    executor: Executor,
+    device,
+    deadline_s: float,
+    hedge_after_s: float = None
+) -> AbortableFuture:
+    """
+    Connects and logs in to a device on executor, returning a future that
+    resolves to whether it's ready.  deadline_s counts from submission, so
+    time spent queued for a worker comes out of it.  Cancelling the future
+    aborts the library calls in progress.
+    """
+    future = AbortableFuture(device.abort)
+    deadline = time.monotonic() + deadline_s
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+
+        remaining_s = deadline - time.monotonic()
+
+        if remaining_s <= 0:
+            log.warn(f'deadline passed before opening {device.uid}')
+            future.set_result(False)
+            return
+
+        try:
+            future.set_result(device.open(remaining_s, hedge_after_s))
+        except Exception as e:
+            future.set_exception(e)
+
+    executor.submit(run)
+
+    return future
+
+
+async def open_async(
+    device,
+    deadline_s: float,
+    hedge_after_s: float = None,
+    executor: Executor = None
+) -> bool:
+    """
+    As submit_open, for asyncio callers; cancelling the awaiting task aborts
+    the connect or login.  Runs on a shared pool of CONNECT_WORKERS threads
+    unless an executor is given.
+    """
+    return await asyncio.wrap_future(submit_open(
+        executor or get_open_executor(),
+        device,
+        deadline_s,
+        hedge_after_s
+    ))
+
+
+def get_open_executor() -> ThreadPoolExecutor:
+    global open_executor
+
+    with open_executor_lock:
+        if open_executor is None:
+            open_executor = ThreadPoolExecutor(
+                max_workers=CONNECT_WORKERS,
+                thread_name_prefix='open'
+            )
+
+    return open_executor
+
+
+def open_all(
+    devices: list,
+    deadline_s: float,
+    hedge_after_s: float = None,
+    max_workers: int = CONNECT_WORKERS
+) -> dict[str, bool]:
+    """
+    Connects and logs in to every device in parallel and returns {uid:
+    ready}.  Every device shares one deadline, counted from the call, so
+    the whole call takes about deadline_s at most however many cameras are
+    offline or asleep, and however many wait for a worker.
+    """
+    if not devices:
+        return dict()
+
+    workers = min(max_workers, len(devices))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            submit_open(executor, d, deadline_s, hedge_after_s)
+            for d in devices
+        ]
+
+        return {
+            d.uid: f.result() for d, f in zip(devices, futures)
+        }
@@ -1,7 +1,89 @@
 from enum import IntEnum
 
-FRAME_BUFFER_SIZE = 128000
+FRAME_BUFFER_SIZE = 128000 # initial size; grows/shrinks with observed frames
+FRAME_BUFFER_MIN_SIZE = 16384
+FRAME_BUFFER_MAX_SIZE = 4194304
+FRAME_BUFFER_HEADROOM = 1.25 # multiplier applied to observed frame sizes
+FRAME_BUFFER_SHRINK_AFTER = 60 # seconds without large frames before shrinking
+FRAME_BUFFER_POOL_IDLE = 4 # idle buffers kept per size bucket
+FRAME_ARENA_SIZE = 1048576 # bytes a burst of frames is received into
+FRAME_ARENA_MAX_FRAMES = 64 # frames received per burst at most
+FRAME_INDEX_SIZE = 4096 # frame descriptors retained per stream
 STREAM_LOG_INTERVAL = 30 # seconds
+STREAM_POLL_INTERVAL = 0.01 # seconds between polls when no frame is ready
+WAKEUP_TIMEOUT = 1 # seconds an event-driven stream waits before polling anyway
+STREAM_STOP_TIMEOUT = 10 # seconds leaving a device's context waits for its stream to drain
+IOTC_AV_CHANNEL = 0 # IOTC channel the AV client runs over
+STREAM_CAMERA_INDEX = 0 # camera requested by start/stop video; substreams are selected by SETSTREAMCTRL
+CATCHUP_INTERVAL = 1 # seconds between resend buffer usage samples
+CATCHUP_THRESHOLD = 0.8 # resend buffer usage above which a stream lags
+CATCHUP_HOLD = 10 # seconds usage must stay above threshold before flushing
+CONNECT_LAN_TIMEOUT = 300 # ms a lan-first connect searches the local network
+CONNECT_P2P_TIMEOUT = 500 # ms a lan-first connect tries a P2P path
+CONNECT_DETECT_NETWORK_TIMEOUT = 100 # ms a lan-first connect waits on master servers
+CONNECT_LAN_SEARCH_TIMEOUT = 500 # ms lan-first scans wait for cameras to reply
+CONNECT_LATENCY_SAMPLES = 100 # connect times kept per session mode
+CONNECT_DEADLINE = 10 # seconds a fleet connect and login may take per device
+CONNECT_HEDGE_AFTER = 2 # seconds before a second connect attempt is started
+CONNECT_MAX_ATTEMPTS = 2 # connect attempts per device, hedged or retried
+CONNECT_WORKERS = 16 # devices connected in parallel
+PATH_SAMPLE_INTERVAL = 5 # seconds between session mode samples while streaming
+PATH_MIGRATE_DEADLINE = 5 # seconds to set up a session to move a relayed stream to
+PATH_MIGRATE_BACKOFF = 60 # seconds before retrying a relayed stream's move
+PATH_DELAY_SAMPLES = 100 # frame delays kept per session mode
+FLEET_DEFAULT_DEVICES = 16 # cameras the library is sized for unless told otherwise
+FLEET_HEADROOM = 1.25 # ratio of sessions admitted to cameras configured
+FLEET_SPARE_SESSIONS = 4 # sessions kept for hedged connects and relay standbys
+FLEET_QUEUE_TIMEOUT = 30 # seconds a connect without a deadline waits for a session
+WORKER_STATUS_INTERVAL = 5 # seconds between worker stream_info reports
+WORKER_RECONNECT_INTERVAL = 5 # seconds before a worker reconnects a dropped camera
+WORKER_RESTART_BACKOFF = 1 # seconds before restarting a crashed worker, doubling per crash
+WORKER_RESTART_MAX_BACKOFF = 60 # longest wait before restarting a crashed worker
+WORKER_EXIT_TIMEOUT = 10 # seconds a worker gets to stop before it's killed
+CLUSTER_PORT = 7878 # port the cluster coordinator listens on
+CLUSTER_HEARTBEAT_INTERVAL = 2 # seconds between node heartbeats
+CLUSTER_NODE_TIMEOUT = 10 # seconds without a heartbeat before a node's cameras move
+CLUSTER_VNODES = 64 # hash ring points per unit of node weight
+IOCTRL_MIN_PAYLOAD_SIZE = 8 # bytes; shorter ioctrl payloads are zero-padded
+IOCTRL_MAX_PAYLOAD_SIZE = 1024 # bytes; AV_MAX_IOCTRL_DATA_SIZE
+IOCTRL_POLL_TIMEOUT = 500 # ms to block in avRecvIOCtrl per poll
+IOCTRL_RESPONSE_TIMEOUT = 5 # seconds to wait for an ioctrl response
+SNAPSHOT_TIMEOUT = 5 # seconds to wait for a keyframe when not streaming
+DECODE_WORKERS = 2 # processes in the decode pool
+DECODE_SLOTS = 4 # shared memory slots per decode stage; frames beyond are skipped
+DECODE_SLOT_SIZE = 1048576 # bytes; largest keyframe a decode stage accepts
+DECODE_FLUSH_TIMEOUT = 10 # seconds a decode stage waits for pending frames
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_HEIGHT = 180
+FRAME_BUS_SLOTS = 256 # frames indexed per frame bus
+FRAME_BUS_DATA_SIZE = 16777216 # bytes of frame data per frame bus
+FRAME_BUS_POLL_INTERVAL = 0.005 # seconds between reader polls
+MOTION_INTERVAL = 1 # seconds between batched motion evaluations
+MOTION_BACKGROUND_ALPHA = 0.05 # background model learning rate
+MOTION_PIXEL_THRESHOLD = 25 # grey levels a pixel must change by
+MOTION_AREA_THRESHOLD = 0.01 # fraction of watched pixels that must change
+MOTION_HOLD = 10 # seconds recording continues after motion stops
+MOTION_PREROLL_MAX_SIZE = 8388608 # bytes of the current GOP held while idle
+ACTIVITY_GOP_BUCKETS = 32 # GOP positions with their own size baseline
+ACTIVITY_BASELINE_ALPHA = 0.01 # baseline learning rate per P-frame
+ACTIVITY_SCORE_ALPHA = 0.2 # smoothing of the size/baseline ratio
+ACTIVITY_THRESHOLD = 1.5 # smoothed ratio above which the scene is active
+ACTIVITY_WARMUP_FRAMES = 8 # samples per GOP position before scoring
+CATALOG_BATCH_SIZE = 256 # catalog rows written per transaction at most
+CATALOG_BATCH_INTERVAL = 1 # seconds between catalog commits
+CATALOG_WRITE_TIMEOUT = 5 # seconds to wait for a catalog segment to be committed
+REPLAY_FRAME_RATE = 15 # fps used to pace recordings without a catalog
+REPLAY_MAX_FRAME_GAP = 1 # seconds; longer gaps are breaks in the recording
+CLIP_FRAME_RATE = 15 # fps assumed when a clip's rate can't be measured
+POOL_IDLE_TIMEOUT = 300 # seconds before an unused pooled session is closed
+POOL_HEALTH_INTERVAL = 30 # seconds between IOTC_Session_Check probes
+SYNC_INTERVAL = 3600 # seconds between sync-daemon rounds
+SYNC_DRIFT_THRESHOLD = 5 # seconds of drift before the clock is corrected
+SYNC_WORKERS = 8 # devices synced in parallel
+DEVICE_EPOCH_MIN = 1262304000 # 2010-01-01; smaller frame timestamps aren't clocks
+CLOCK_DETECT_WINDOW = 2 # seconds of frames compared to tell a clock from a counter
+GOVERNOR_INTERVAL = 5 # seconds between bandwidth/cpu budget checks
+GOVERNOR_RESTORE_RATIO = 0.5 # budget fraction below which streams are restored
 
 class StreamFormat(IntEnum):
     MEDIA_CODEC_UNKNOWN = 0x00
@@ -19,6 +101,18 @@ class StreamFormat(IntEnum):
     MEDIA_CODEC_AUDIO_G726 = 0x8F
 
 
+class StreamChannel(IntEnum):
+    MAIN = 0
+    SUB = 1
+
+
+class FrameFlag(IntEnum):
+    IPC_FRAME_FLAG_PBFRAME = 0x00
+    IPC_FRAME_FLAG_IFRAME = 0x01
+    IPC_FRAME_FLAG_MD = 0x02
+    IPC_FRAME_FLAG_IO = 0x03
+
+
 class IOTCSessionMode(IntEnum):
     P2P = 0
     RLY = 1
@@ -0,0 +1,323 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from fractions import Fraction
+import queue
+import threading
+import time
+import logging
+from .exceptions import TutkDecoderUnavailableException
+from .frames import TutkFrame
+from .sinks import FrameSink
+from .h264 import parameter_sets
+from .constants import (
+    DECODE_WORKERS,
+    DECODE_SLOTS,
+    DECODE_SLOT_SIZE,
+    DECODE_FLUSH_TIMEOUT,
+    THUMBNAIL_WIDTH,
+    THUMBNAIL_HEIGHT
+)
+
+# decoding is optional and needs PyAV (and NumPy for DecodeStage)
+try:
+    import av
+except ImportError:
+    av = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = logging.getLogger(__name__)
+
+IMAGE_CODECS = {
+    'jpeg': ('mjpeg', 'yuvj420p'),
+    'png': ('png', 'rgb24')
+}
+
+_pool: ProcessPoolExecutor = None
+_pool_lock = threading.Lock()
+
+
+def require_decoder() -> None:
+    if av is None:
+        raise TutkDecoderUnavailableException(
+            'decoding requires PyAV; install it with pip install av'
+        )
+
+
+def get_decode_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process pool decode jobs run in, starting it on first use.
+    """
+    global _pool
+
+    require_decoder()
+
+    with _pool_lock:
+        if _pool is None:
+            log.info(f'starting decode pool, workers={DECODE_WORKERS}')
+            _pool = ProcessPoolExecutor(max_workers=DECODE_WORKERS)
+
+    return _pool
+
+
+def shutdown_decode_pool() -> None:
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def decode_keyframe(data: bytes):
+    """
+    Decodes a self-contained H.264 keyframe (SPS, PPS and IDR) and returns
+    the picture as an av.VideoFrame.
+    """
+    require_decoder()
+
+    codec = av.CodecContext.create('h264', 'r')
+    frames = list()
+
+    for packet in codec.parse(data) + codec.parse(None):
+        frames.extend(codec.decode(packet))
+    frames.extend(codec.decode(None))
+
+    if not frames:
+        raise ValueError('no picture decoded from keyframe')
+
+    return frames[0]
+
+
+def encode_image(
+    data: bytes,
+    fmt: str = 'jpeg'
+) -> bytes:
+    """
+    Decodes an H.264 keyframe and re-encodes it as a JPEG or PNG image.  Runs
+    in the decode pool.
+    """
+    codec_name, pix_fmt = IMAGE_CODECS[fmt]
+    picture = decode_keyframe(data)
+
+    encoder = av.CodecContext.create(codec_name, 'w')
+    encoder.width = picture.width
+    encoder.height = picture.height
+    encoder.pix_fmt = pix_fmt
+    encoder.time_base = Fraction(1, 1)
+
+    packets = encoder.encode(picture.reformat(format=pix_fmt))
+    packets += encoder.encode(None)
+
+    return bytes(packets[0])
+
+
+def decode_thumbnail(
+    input_name: str,
+    length: int,
+    output_name: str,
+    width: int,
+    height: int,
+    grayscale: bool
+) -> tuple:
+    """
+    Decodes the keyframe in shared memory block input_name, scales it to
+    width x height and writes the pixels to block output_name.  Runs in the
+    decode pool; returns the shape of the pixel array written.
+    """
+    # pool workers share the parent's resource tracker, so attaching here
+    # doesn't hand ownership of the blocks to the worker
+    source = SharedMemory(name=input_name)
+    dest = SharedMemory(name=output_name)
+
+    try:
+        picture = decode_keyframe(bytes(source.buf[:length]))
+        pixels = picture.reformat(
+            width=width,
+            height=height,
+            format='gray' if grayscale else 'rgb24'
+        ).to_ndarray()
+
+        np.ndarray(pixels.shape, np.uint8, dest.buf)[:] = pixels
+
+        return pixels.shape
+    finally:
+        source.close()
+        dest.close()
+
+
+class DecodeStage(FrameSink):
+    """
+    Decodes keyframes to downscaled NumPy arrays in the decode pool.  Frames
+    travel to workers through shared memory slots rather than being pickled.
+    If every slot is busy the frame is skipped, so a slow pool never stalls
+    the receive loop.
+
+    Only keyframes are decoded: predicted frames can't be decoded on their
+    own, so every_n counts keyframes and min_interval_s limits the rate.
+    callback(frame, pixels) is called from a pool management thread.
+    Clearing enabled pauses decoding; on_resume() is called from the
+    receive loop at the first keyframe after it is set again.
+    """
+    def __init__(
+        self,
+        callback,
+        width: int = THUMBNAIL_WIDTH,
+        height: int = THUMBNAIL_HEIGHT,
+        grayscale: bool = True,
+        every_n: int = 1,
+        min_interval_s: float = 0,
+        slots: int = DECODE_SLOTS,
+        slot_size: int = DECODE_SLOT_SIZE,
+        on_resume=None
+    ) -> None:
+        require_decoder()
+
+        if np is None:
+            raise TutkDecoderUnavailableException(
+                'decode stages require NumPy; install it with pip install numpy'
+            )
+
+        self.callback = callback
+        self.width = width
+        self.height = height
+        self.grayscale = grayscale
+        self.every_n = every_n
+        self.min_interval_s = min_interval_s
+        self.slot_size = slot_size
+        self.keyframes = 0
+        self.last_submit = 0
+        self.skipped = 0
+        self.sps: bytes = None
+        self.pps: bytes = None
+        self.enabled = True
+        self.paused = False
+        self.on_resume = on_resume
+        self.pool = get_decode_pool()
+        self.inputs = [
+            SharedMemory(create=True, size=slot_size) for _ in range(slots)
+        ]
+        self.outputs = [
+            SharedMemory(
+                create=True,
+                size=width * height * (1 if grayscale else 3)
+            ) for _ in range(slots)
+        ]
+        self.free = queue.SimpleQueue()
+        self.pending = 0
+        self.idle = threading.Condition()
+
+        for slot in range(slots):
+            self.free.put(slot)
+
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        if not frame.is_keyframe:
+            return
+
+        if not self.enabled:
+            self.paused = True
+            return
+
+        if self.paused:
+            self.paused = False
+            if self.on_resume:
+                self.on_resume()
+
+        sps, pps = parameter_sets(data)
+        self.sps = sps or self.sps
+        self.pps = pps or self.pps
+        self.keyframes += 1
+
+        if self.keyframes % self.every_n:
+            return
+
+        now = time.monotonic()
+        if now - self.last_submit < self.min_interval_s:
+            return
+
+        prefix = (b'' if sps else self.sps or b'') \
+            + (b'' if pps else self.pps or b'')
+        length = len(prefix) + len(data)
+
+        if length > self.slot_size:
+            log.warn(f'keyframe of {length} bytes exceeds decode slot size')
+            return
+
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.skipped += 1
+            return
+
+        buf = self.inputs[slot].buf
+        buf[:len(prefix)] = prefix
+        buf[len(prefix):length] = data
+        self.last_submit = now
+
+        with self.idle:
+            self.pending += 1
+
+        future = self.pool.submit(
+            decode_thumbnail,
+            self.inputs[slot].name,
+            length,
+            self.outputs[slot].name,
+            self.width,
+            self.height,
+            self.grayscale
+        )
+        future.add_done_callback(
+            lambda f: self._done(f, frame, slot)
+        )
+
+    def _done(
+        self,
+        future,
+        frame: TutkFrame,
+        slot: int
+    ) -> None:
+        try:
+            shape = future.result()
+            pixels = np.ndarray(shape, np.uint8, self.outputs[slot].buf).copy()
+        except Exception as e:
+            log.warn(f'unable to decode keyframe: {e!r}')
+            pixels = None
+        finally:
+            self.free.put(slot)
+
+            with self.idle:
+                self.pending -= 1
+                self.idle.notify_all()
+
+        if pixels is not None:
+            try:
+                self.callback(frame, pixels)
+            except Exception as e:
+                log.warn(f'decode callback raised: {e!r}')
+
+    def flush(self, timeout_s: float = DECODE_FLUSH_TIMEOUT) -> bool:
+        """
+        Waits up to timeout_s for submitted frames to finish decoding.
+        Returns False if some are still pending.
+        """
+        with self.idle:
+            if self.idle.wait_for(lambda: not self.pending, timeout_s):
+                return True
+
+        log.warn(f'{self.pending} frames still decoding after {timeout_s}s')
+
+        return False
+
+    def close(self) -> None:
+        self.flush()
+
+        for shm in self.inputs + self.outputs:
+            shm.close()
+            shm.unlink()
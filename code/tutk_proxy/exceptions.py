@@ -0,0 +1,2 @@
+class TutkDecoderUnavailableException(Exception):
+    pass
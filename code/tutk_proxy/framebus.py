@@ -0,0 +1,309 @@
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import struct
+import time
+import logging
+from .frames import TutkFrame
+from .sinks import FrameSink
+from .constants import (
+    FRAME_BUS_SLOTS,
+    FRAME_BUS_DATA_SIZE,
+    FRAME_BUS_POLL_INTERVAL
+)
+
+log = logging.getLogger(__name__)
+
+"""
+Shared memory layout:
+
+    header:  magic (4s), version (I), slots (I), data_size (I),
+             write_seq (Q), write_pos (Q)
+    index:   slots entries of seq (Q), offset (Q), length (I),
+             timestamp (I), codec_id (H), flags (B), padding (5x)
+    data:    data_size bytes, frames stored contiguously
+
+offset and write_pos are absolute byte positions in the stream of frames;
+the position in the data region is offset % data_size.  The writer advances
+write_pos before overwriting data, so a frame is intact as long as
+write_pos - offset <= data_size once it has been read.
+"""
+MAGIC = b'TFB1'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQQ')
+ENTRY = struct.Struct('<QQIIHB5x')
+WRITE_SEQ_OFFSET = 16
+WRITE_POS_OFFSET = 24
+COUNTER = struct.Struct('<Q')
+SEQ_WRITING = 2 ** 64 - 1
+
+
+def frame_bus_name(uid: str) -> str:
+    """
+    Returns the shared memory name of a device's frame bus.
+    """
+    return f'tutk-{uid}'
+
+
+def attach_shared_memory(name: str) -> SharedMemory:
+    """
+    Attaches to an existing shared memory block without registering it with
+    this process's resource tracker, which would otherwise unlink it when
+    the process exits.
+    """
+    shm = SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+
+    return shm
+
+
+class FrameBusWriter(FrameSink):
+    """
+    Publishes a stream's frames to a shared memory ring that any number of
+    local processes can read with FrameBusReader.  The writer never waits
+    for readers; slow readers skip ahead.
+    """
+    def __init__(
+        self,
+        name: str,
+        slots: int = FRAME_BUS_SLOTS,
+        data_size: int = FRAME_BUS_DATA_SIZE
+    ) -> None:
+        self.name = name
+        self.slots = slots
+        self.data_size = data_size
+        self.data_start = HEADER.size + ENTRY.size * slots
+        self.shm = SharedMemory(
+            name=name,
+            create=True,
+            size=self.data_start + data_size
+        )
+        self.seq = 0
+        self.pos = 0
+        self.owner = True
+
+        HEADER.pack_into(
+            self.shm.buf,
+            0,
+            MAGIC,
+            VERSION,
+            slots,
+            data_size,
+            0,
+            0
+        )
+
+        log.info(f'created frame bus {name}, slots={slots}, '
+                 f'data_size={data_size}')
+
+    @classmethod
+    def create(cls, name: str) -> 'FrameBusWriter':
+        """
+        Creates a frame bus, replacing one left behind under the same name
+        by a process that didn't shut down.
+        """
+        try:
+            return cls(name)
+        except FileExistsError:
+            log.warn(f'replacing stale frame bus {name}')
+            attach_shared_memory(name).unlink()
+            return cls(name)
+
+    @classmethod
+    def attach(cls, name: str) -> 'FrameBusWriter':
+        """
+        Takes over writing to an existing frame bus, e.g. one created by
+        another process, carrying on after the last frame written to it.
+        Closing an attached writer leaves the bus in place.
+        """
+        writer = cls.__new__(cls)
+        writer.name = name
+        writer.shm = attach_shared_memory(name)
+        writer.owner = False
+
+        magic, version, writer.slots, writer.data_size, writer.seq, \
+            writer.pos = HEADER.unpack_from(writer.shm.buf, 0)
+
+        if magic != MAGIC or version != VERSION:
+            writer.shm.close()
+            raise ValueError(f'{name} is not a version {VERSION} frame bus')
+
+        # pos may be past a frame whose writer died mid-write; that region
+        # is skipped
+        writer.data_start = HEADER.size + ENTRY.size * writer.slots
+
+        log.info(f'attached to frame bus {name}, seq={writer.seq}')
+
+        return writer
+
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        length = len(data)
+
+        if length > self.data_size:
+            log.warn(f'frame of {length} bytes exceeds frame bus size')
+            return
+
+        # frames are stored contiguously; wrap early rather than split one
+        start = self.pos % self.data_size
+        if start + length > self.data_size:
+            self.pos += self.data_size - start
+            start = 0
+
+        buf = self.shm.buf
+        entry = HEADER.size + ENTRY.size * (self.seq % self.slots)
+
+        # reserve the region first so readers can detect the overwrite
+        COUNTER.pack_into(buf, WRITE_POS_OFFSET, self.pos + length)
+        COUNTER.pack_into(buf, entry, SEQ_WRITING)
+
+        buf[self.data_start + start:self.data_start + start + length] = data
+
+        ENTRY.pack_into(
+            buf,
+            entry,
+            self.seq,
+            self.pos,
+            length,
+            frame.timestamp,
+            frame.codec_id,
+            frame.flags
+        )
+
+        self.pos += length
+        self.seq += 1
+        COUNTER.pack_into(buf, WRITE_SEQ_OFFSET, self.seq)
+
+    def close(self) -> None:
+        self.shm.close()
+
+        if self.owner:
+            # a child process attaching through a shared resource tracker
+            # unregisters the bus; register it again for unlink to remove
+            resource_tracker.register(self.shm._name, 'shared_memory')
+            self.shm.unlink()
+
+
+class FrameBusReader():
+    """
+    Reads frames from a FrameBusWriter in another process.  Reads never take
+    a lock: entries and data are checked against the writer's counters, and
+    frames overwritten before they could be read are skipped and counted in
+    dropped.
+    """
+    def __init__(
+        self,
+        name: str,
+        from_start: bool = False
+    ) -> None:
+        self.shm = attach_shared_memory(name)
+        magic, version, self.slots, self.data_size, write_seq, _ = \
+            HEADER.unpack_from(self.shm.buf, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f'{name} is not a version {VERSION} frame bus')
+
+        self.data_start = HEADER.size + ENTRY.size * self.slots
+        self.next_seq = max(0, write_seq - self.slots) if from_start \
+            else write_seq
+        self.dropped = 0
+
+    def _write_seq(self) -> int:
+        return COUNTER.unpack_from(self.shm.buf, WRITE_SEQ_OFFSET)[0]
+
+    def is_valid(self, frame: TutkFrame) -> bool:
+        """
+        Returns True if a frame returned by read(copy=False) hasn't been
+        overwritten.  Check after consuming its data.
+        """
+        write_pos = COUNTER.unpack_from(self.shm.buf, WRITE_POS_OFFSET)[0]
+
+        return write_pos - frame.offset <= self.data_size and \
+            self._entry(frame.frame_number)[:2] == \
+            (frame.frame_number, frame.offset)
+
+    def _entry(self, seq: int) -> tuple:
+        return ENTRY.unpack_from(
+            self.shm.buf,
+            HEADER.size + ENTRY.size * (seq % self.slots)
+        )
+
+    def read(
+        self,
+        copy: bool = True
+    ) -> tuple[TutkFrame, bytes]:
+        """
+        Returns the next (frame, data), or (None, None) if no new frame has
+        been written.  frame.frame_number is the bus sequence number.  With
+        copy=False, data is a memoryview into shared memory, which is only
+        valid while is_valid(frame) holds.
+        """
+        while True:
+            write_seq = self._write_seq()
+
+            if self.next_seq >= write_seq:
+                return None, None
+
+            # skip frames the writer has lapped
+            if write_seq - self.next_seq > self.slots:
+                self.dropped += write_seq - self.slots - self.next_seq
+                self.next_seq = write_seq - self.slots
+
+            entry = self._entry(self.next_seq)
+            seq, offset, length, timestamp, codec_id, flags = entry
+
+            if seq != self.next_seq:
+                self.dropped += 1
+                self.next_seq += 1
+                continue
+
+            start = self.data_start + offset % self.data_size
+            data = self.shm.buf[start:start + length]
+
+            frame = TutkFrame(
+                codec_id=codec_id,
+                flags=flags,
+                timestamp=timestamp,
+                size=length,
+                frame_number=seq,
+                offset=offset
+            )
+
+            if copy:
+                data = bytes(data)
+
+                # the entry may have been read while the writer was packing
+                # it; read it again and retry if it changed
+                if self._entry(seq) != entry:
+                    continue
+
+                if not self.is_valid(frame):
+                    self.dropped += 1
+                    self.next_seq += 1
+                    continue
+
+            self.next_seq += 1
+
+            return frame, data
+
+    def frames(
+        self,
+        poll_interval_s: float = FRAME_BUS_POLL_INTERVAL
+    ):
+        """
+        Yields (frame, data) copies as they are written, forever.
+        """
+        while True:
+            frame, data = self.read()
+
+            if frame is None:
+                time.sleep(poll_interval_s)
+                continue
+
+            yield frame, data
+
+    def close(self) -> None:
+        self.shm.close()
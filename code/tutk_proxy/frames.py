@@ -0,0 +1,162 @@
+from array import array
+import tutk_wrapper.models as tm
+from .constants import (
+    FrameFlag,
+    FRAME_INDEX_SIZE
+)
+
+
+class TutkFrame():
+    """
+    Compact descriptor for a single received frame.  Uses __slots__ so that
+    holding many descriptors doesn't cost a dict per frame.
+    """
+    __slots__ = (
+        'codec_id',
+        'flags',
+        'timestamp',
+        'size',
+        'frame_number',
+        'offset'
+    )
+
+    def __init__(
+        self,
+        codec_id: int = 0,
+        flags: int = 0,
+        timestamp: int = 0,
+        size: int = 0,
+        frame_number: int = 0,
+        offset: int = 0
+    ) -> None:
+        self.codec_id = codec_id
+        self.flags = flags
+        self.timestamp = timestamp
+        self.size = size
+        self.frame_number = frame_number
+        self.offset = offset
+
+    @property
+    def is_keyframe(self) -> bool:
+        return self.flags == FrameFlag.IPC_FRAME_FLAG_IFRAME
+
+    def __repr__(self) -> str:
+        return (
+            f'TutkFrame('
+            f'codec_id={self.codec_id}, '
+            f'flags={self.flags}, '
+            f'timestamp={self.timestamp}, '
+            f'size={self.size}, '
+            f'frame_number={self.frame_number}, '
+            f'offset={self.offset})'
+        )
+
+
+class FrameIndex():
+    """
+    Fixed-size ring of frame descriptors, stored as a struct of arrays so
+    that each retained frame costs 23 bytes rather than a python object.
+    """
+    def __init__(self, size: int = FRAME_INDEX_SIZE) -> None:
+        self.size = size
+        self.codec_id = array('H', bytes(2 * size))
+        self.flags = array('B', bytes(size))
+        self.timestamp = array('I', bytes(4 * size))
+        self.frame_size = array('I', bytes(4 * size))
+        self.frame_number = array('i', bytes(4 * size))
+        self.offset = array('Q', bytes(8 * size))
+        self.count = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.size)
+
+    def append(
+        self,
+        frame_info: tm.FRAMEINFO,
+        size: int,
+        frame_number: int,
+        offset: int
+    ) -> int:
+        """
+        Records a frame from a filled FRAMEINFO and returns its sequence
+        number.
+        """
+        i = self.count % self.size
+        self.codec_id[i] = frame_info.codec_id
+        self.flags[i] = frame_info.flags
+        self.timestamp[i] = frame_info.timestamp
+        self.frame_size[i] = size
+        self.frame_number[i] = frame_number
+        self.offset[i] = offset
+        self.count += 1
+
+        return self.count - 1
+
+    def __getitem__(self, sequence: int) -> TutkFrame:
+        """
+        Returns the descriptor for a frame sequence number, as returned by
+        append().  Negative values index back from the newest frame.
+        """
+        if sequence < 0:
+            sequence += self.count
+
+        if not self.count - len(self) <= sequence < self.count:
+            raise IndexError(f'frame {sequence} is not retained')
+
+        i = sequence % self.size
+
+        return TutkFrame(
+            codec_id=self.codec_id[i],
+            flags=self.flags[i],
+            timestamp=self.timestamp[i],
+            size=self.frame_size[i],
+            frame_number=self.frame_number[i],
+            offset=self.offset[i]
+        )
+
+    def last(self) -> TutkFrame:
+        """
+        Returns the descriptor for the most recently appended frame.
+        """
+        return self[-1] if self.count else None
+
+
+class FrameLossCounter():
+    """
+    Counts frames the library numbered but never handed over, from gaps in
+    the frame numbers it returns.  Numbering starts afresh on each session,
+    so rebase() when a stream moves to a new one.
+    """
+    __slots__ = (
+        'first',
+        'last',
+        'received',
+        'dropped_before'
+    )
+
+    def __init__(self) -> None:
+        self.first: int = None
+        self.last: int = None
+        self.received = 0
+        self.dropped_before = 0
+
+    def record(self, frame_number: int) -> None:
+        if self.first is None:
+            self.first = frame_number
+
+        self.last = frame_number
+        self.received += 1
+
+    def rebase(self) -> None:
+        self.dropped_before = self.dropped
+        self.first = None
+        self.last = None
+        self.received = 0
+
+    @property
+    def dropped(self) -> int:
+        if self.first is None:
+            return self.dropped_before
+
+        return self.dropped_before + \
+            max(0, self.last - self.first + 1 - self.received)
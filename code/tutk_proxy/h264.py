@@ -0,0 +1,88 @@
+from enum import IntEnum
+
+START_CODE = b'\x00\x00\x01'
+
+
+class NalType(IntEnum):
+    SLICE = 1
+    SLICE_IDR = 5
+    SEI = 6
+    SPS = 7
+    PPS = 8
+    AUD = 9
+
+
+def iter_nal_units(
+    data: bytes,
+    start: int = 0,
+    end: int = None
+):
+    """
+    Yields (nal_type, offset, length) for each NAL unit in an Annex B byte
+    stream.  offset and length include the unit's start code.
+    """
+    end = len(data) if end is None else end
+    position = data.find(START_CODE, start, end)
+
+    while position != -1:
+        # 4-byte start codes carry an extra leading zero
+        unit_start = position - 1 \
+            if position > start and data[position - 1] == 0 else position
+        header = position + len(START_CODE)
+
+        if header >= end:
+            return
+
+        position = data.find(START_CODE, header, end)
+        unit_end = end if position == -1 else (
+            position - 1 if data[position - 1] == 0 else position
+        )
+
+        yield data[header] & 0x1F, unit_start, unit_end - unit_start
+
+
+def parameter_sets(
+    data: bytes,
+    start: int = 0,
+    end: int = None
+) -> tuple[bytes, bytes]:
+    """
+    Returns the (SPS, PPS) NAL units, with start codes, found in data before
+    its first slice.  Either is None if not present.
+    """
+    sps, pps = None, None
+
+    for nal_type, offset, length in iter_nal_units(data, start, end):
+        if nal_type == NalType.SPS:
+            sps = bytes(data[offset:offset + length])
+        elif nal_type == NalType.PPS:
+            pps = bytes(data[offset:offset + length])
+        elif nal_type in (NalType.SLICE, NalType.SLICE_IDR):
+            break
+
+    return sps, pps
+
+
+def iter_access_units(
+    data: bytes,
+    start: int = 0,
+    end: int = None
+):
+    """
+    Yields (offset, length, is_idr) for each picture in an Annex B byte
+    stream, including the parameter sets, SEI or delimiters before it.
+    Assumes one slice per picture, as these cameras send.
+    """
+    unit_start = None
+
+    for nal_type, offset, length in iter_nal_units(data, start, end):
+        if unit_start is None:
+            unit_start = offset
+
+        if nal_type in (NalType.SLICE, NalType.SLICE_IDR):
+            yield (
+                unit_start,
+                offset + length - unit_start,
+                nal_type == NalType.SLICE_IDR
+            )
+            unit_start = None
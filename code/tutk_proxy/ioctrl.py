@@ -0,0 +1,201 @@
+from collections import deque
+from concurrent.futures import (
+    Future,
+    TimeoutError
+)
+import ctypes as c
+import threading
+import time
+import logging
+import tutk_wrapper.wrapper as tw
+import tutk_wrapper.exceptions as te
+import tutk_wrapper.constants as tc
+from .constants import (
+    IOCTRL_MAX_PAYLOAD_SIZE,
+    IOCTRL_POLL_TIMEOUT,
+    IOCTRL_RESPONSE_TIMEOUT
+)
+
+log = logging.getLogger(__name__)
+
+
+def response_type_for(message_type: int) -> tc.AvIOCtrlMsgType:
+    """
+    Returns the response type a device replies to message_type with, or None
+    if the message has no known response.
+    """
+    try:
+        name = tc.AvIOCtrlMsgType(message_type).name
+        response = tc.AvIOCtrlMsgType(message_type + 1)
+    except ValueError:
+        return None
+
+    if response.name == name.removesuffix('_REQ') + '_RESP':
+        return response
+
+    return None
+
+
+class IOCtrlDispatcher():
+    """
+    Reads ioctrl messages from an AV channel on a background thread and
+    resolves the futures of requests waiting on them.  Requests for the same
+    response type are resolved in the order they were made.  Messages nobody
+    is waiting on are passed to subscribers, if any.
+    """
+    def __init__(
+        self,
+        channel_id: int,
+        poll_timeout_ms: int = IOCTRL_POLL_TIMEOUT
+    ) -> None:
+        self.channel_id = channel_id
+        self.poll_timeout_ms = poll_timeout_ms
+        self.pending: dict[int, deque] = dict()
+        self.subscribers: dict[int, list] = dict()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: threading.Thread = None
+
+    def start(self) -> None:
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self._run,
+            name=f'ioctrl-{self.channel_id}',
+            daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the dispatcher and fails any requests still waiting.
+        """
+        self.stopped.set()
+
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+
+        self._fail_all(
+            te.TutkLibraryException(tc.AVErrorCode.AV_ER_CLIENT_EXIT)
+        )
+
+    def expect(
+        self,
+        response_type: int,
+        timeout_s: float = IOCTRL_RESPONSE_TIMEOUT
+    ) -> Future:
+        """
+        Registers interest in the next response_type message and returns a
+        future resolved with its payload bytes.  Call this before sending the
+        request so a fast response can't be missed.
+        """
+        future = Future()
+        future.deadline = time.monotonic() + timeout_s
+        future.set_running_or_notify_cancel()
+
+        if self.stopped.is_set():
+            future.set_exception(
+                te.TutkLibraryException(tc.AVErrorCode.AV_ER_CLIENT_EXIT)
+            )
+            return future
+
+        with self.lock:
+            self.pending.setdefault(response_type, deque()).append(future)
+
+        return future
+
+    def discard(self, future: Future) -> None:
+        """
+        Withdraws a future returned by expect(), e.g. if its request failed
+        to send.
+        """
+        with self.lock:
+            for waiting in self.pending.values():
+                if future in waiting:
+                    waiting.remove(future)
+
+    def subscribe(
+        self,
+        message_type: int,
+        callback
+    ) -> None:
+        """
+        Calls callback(message_type, payload) for unsolicited message_type
+        messages, e.g. IOTYPE_USER_IPCAM_EVENT_REPORT.
+        """
+        with self.lock:
+            self.subscribers.setdefault(message_type, list()).append(callback)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+
+        with self.lock:
+            for message_type, waiting in self.pending.items():
+                while waiting and waiting[0].deadline <= now:
+                    waiting.popleft().set_exception(TimeoutError(
+                        f'no ioctrl response type={hex(message_type)}'
+                    ))
+
+    def _fail_all(self, exception: Exception) -> None:
+        with self.lock:
+            pending = self.pending
+            self.pending = dict()
+
+        for waiting in pending.values():
+            for future in waiting:
+                future.set_exception(exception)
+
+    def _dispatch(
+        self,
+        message_type: int,
+        payload: bytes
+    ) -> None:
+        with self.lock:
+            waiting = self.pending.get(message_type)
+            future = waiting.popleft() if waiting else None
+            callbacks = list(self.subscribers.get(message_type, ()))
+
+        if future:
+            future.set_result(payload)
+            return
+
+        if not callbacks:
+            log.debug(f'unhandled ioctrl type={hex(message_type)}')
+
+        for callback in callbacks:
+            try:
+                callback(message_type, payload)
+            except Exception as e:
+                log.warn(f'ioctrl subscriber raised: {e}')
+
+    def _run(self) -> None:
+        message_type = c.c_uint()
+        buffer = (c.c_char * IOCTRL_MAX_PAYLOAD_SIZE)()
+
+        log.info(f'started ioctrl dispatcher, channel_id={self.channel_id}')
+
+        while not self.stopped.is_set():
+            try:
+                size = tw.avRecvIOCtrl(
+                    self.channel_id,
+                    message_type,
+                    buffer,
+                    IOCTRL_MAX_PAYLOAD_SIZE,
+                    self.poll_timeout_ms
+                )
+            except te.TutkLibraryException as e:
+                if e.args[0] == tc.AVErrorCode.AV_ER_TIMEOUT:
+                    self._expire()
+                    continue
+
+                log.warn(f'got tutk library exception: {e}')
+                self.stopped.set()
+                self._fail_all(e)
+                break
+
+            self._dispatch(message_type.value, buffer[:size])
+            self._expire()
+
+        log.info(f'stopped ioctrl dispatcher, channel_id={self.channel_id}')
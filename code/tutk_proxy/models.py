@@ -1,6 +1,7 @@
 from dataclasses import dataclass
+import math
 import time
-import datetime
+import threading
 import tutk_wrapper.wrapper as tw
 import tutk_wrapper.models as tm
 import tutk_wrapper.exceptions as te
@@ -8,20 +9,100 @@ import tutk_wrapper.constants as tc
 import ctypes as c
 from utils.annotations import log_args
 from .constants import (
+    FrameFlag,
     IOTCSessionMode,
+    StreamChannel,
     StreamFormat,
-    FRAME_BUFFER_SIZE,
-    STREAM_LOG_INTERVAL
+    IOCTRL_MIN_PAYLOAD_SIZE,
+    IOCTRL_RESPONSE_TIMEOUT,
+    SNAPSHOT_TIMEOUT,
+    STREAM_LOG_INTERVAL,
+    STREAM_POLL_INTERVAL,
+    WAKEUP_TIMEOUT,
+    STREAM_STOP_TIMEOUT,
+    IOTC_AV_CHANNEL,
+    STREAM_CAMERA_INDEX,
+    FRAME_ARENA_MAX_FRAMES,
+    FLEET_QUEUE_TIMEOUT
+)
+from .buffers import AdaptiveFrameBuffer
+from .arena import (
+    FrameArena,
+    recv_frames
+)
+from .wakeup import ChannelWakeup
+from .catchup import CatchUpPolicy
+from .sessionpath import (
+    SessionPathMonitor,
+    StandbySession
+)
+from .connect import (
+    ConnectOperation,
+    connect_latency,
+    lan_first_enabled
+)
+from .capacity import (
+    CAPACITY_CODES,
+    session_capacity
+)
+from .quality import StreamQualityGovernor
+from .ioctrl import (
+    IOCtrlDispatcher,
+    response_type_for
+)
+from concurrent.futures import (
+    Future,
+    TimeoutError
+)
+from .utils import (
+    utc_offset,
+    local_epoch
+)
+from .sinks import (
+    FrameSink,
+    FileSink
+)
+from .frames import (
+    TutkFrame,
+    FrameIndex,
+    FrameLossCounter
+)
+from .timesync import FrameClock
+from .snapshot import KeyframeCache
+from .decode import (
+    get_decode_pool,
+    require_decoder,
+    encode_image
 )
 from typing import BinaryIO
 import logging
 
+# avClientSetMaxBufSize is process-wide: it applies to every avClientStart2
+# after it, until set again, and the library can't be asked for its default.
+# Once a size has been set, clients start under the lock so none starts
+# between another device's set and start.
+av_client_start_lock = threading.Lock()
+av_client_max_buf_size_kb: int = None
+
+# avRecvFrameData2 codes that only mean no complete frame is ready yet
+RECV_RETRY_CODES = frozenset((
+    tc.AVErrorCode.AV_ER_DATA_NOREADY,
+    tc.AVErrorCode.AV_ER_LOSED_THIS_FRAME,
+    tc.AVErrorCode.AV_ER_INCOMPLETE_FRAME
+))
+
 
 @dataclass
 class TutkDeviceSettings():
     username: str = None
     password: str = None
     timeout_s: int = 5
+    stream_channel: StreamChannel = StreamChannel.MAIN
+    stream_quality: tc.AvIOCtrlQuality = None
+    event_driven: bool = False
+    max_buf_size_kb: int = None
+    catch_up: bool = True
+    migrate_relay: bool = True
 
 
 @dataclass
@@ -31,7 +112,14 @@ class TutkDeviceStreamInfo():
     last_frame_jpg: bytes = None
     last_frame_received_time: int = 0
     last_frame_size: int = 0
+    last_frame_timestamp: int = 0
     dropped_frames: int = 0
+    oversize_frames: int = 0
+    frame_buffer_size: int = 0
+    resend_buffer_usage: float = 0.0
+    catch_ups: int = 0
+    skipped_frames: int = 0
+    migrations: int = 0
     video_format: StreamFormat = StreamFormat.MEDIA_CODEC_UNKNOWN
 
 
@@ -46,6 +134,7 @@ class TutkDeviceState():
     packets_rx: int = 0
     resend_on: bool = False
     streaming: bool = False
+    connect_time_s: float = None
 
 
 class TutkDevice():
@@ -66,21 +155,99 @@ class TutkDevice():
         self.device_settings = device_settings
         self.device_state: TutkDeviceState = TutkDeviceState()
         self.stream_info: TutkDeviceStreamInfo = TutkDeviceStreamInfo()
+        self.frame_index: FrameIndex = FrameIndex()
+        self.frame_clock: FrameClock = FrameClock()
+        self.ioctrl: IOCtrlDispatcher = None
+        self.stop_requested = threading.Event()
+        self.stream_stopped = threading.Event()
+        self.stream_stopped.set()
+        self.wakeup: ChannelWakeup = None
+        self.keyframe_cache: KeyframeCache = KeyframeCache()
+        self.pending_connect: ConnectOperation = None
+        self.login_lock = threading.Lock()
+        self.login_sid: int = None
+        self.capacity_held = False
+
+    def __enter__(self) -> 'TutkDevice':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # let a stream_to() on another thread drain to its sinks first
+        if not self.stream_stopped.is_set():
+            self.stop_stream()
+
+            if not self.stream_stopped.wait(STREAM_STOP_TIMEOUT):
+                self.log.warn(f'stream didn\'t stop, disconnecting anyway')
+
+        self.disconnect()
     
     @log_args
     def _reset_state(self) -> None:
+        if self.ioctrl:
+            self.ioctrl.stop()
+            self.ioctrl = None
+
         self.device_state = TutkDeviceState()
     
     @log_args
     def _reset_stream_info(self) -> None:
-        self.device_state.stream_info = TutkDeviceStreamInfo()
+        self.stream_info = TutkDeviceStreamInfo()
+        self.frame_index = FrameIndex()
+
+    def _update_stream_info(
+        self,
+        frame_count: int,
+        dropped_frames: int,
+        cur_time: int
+    ) -> None:
+        """
+        Refreshes stream_info from the most recent frame descriptor.
+        """
+        frame = self.frame_index.last()
+
+        if frame is None:
+            return
+
+        self.stream_info.frames_received = frame_count
+        self.stream_info.last_frame_received_time = cur_time
+        self.stream_info.last_frame_size = frame.size
+        self.stream_info.last_frame_timestamp = frame.timestamp
+        self.stream_info.dropped_frames = dropped_frames
+        self.stream_info.video_format = StreamFormat(frame.codec_id)
 
     @log_args
-    def disconnect(self):
+    def disconnect(self) -> None:
         """
         Disconnects from a device and frees device-side Session (SID).
         """
-        raise NotImplementedError()
+        self.log.info(f'disconnecting from device, uid={self.uid}')
+
+        channel = self.device_state.channel_id_control
+        device_sid = self.device_state.device_sid
+
+        # stop reading ioctrl before the channel goes away
+        if self.ioctrl:
+            self.ioctrl.stop()
+            self.ioctrl = None
+
+        if channel != None:
+            try:
+                tw.avClientStop(channel)
+            except te.TutkLibraryException as e:
+                self.log.warn(f'got tutk library exception: {e}')
+
+        if device_sid != None:
+            try:
+                tw.IOTC_Session_Close(device_sid)
+            except te.TutkLibraryException as e:
+                self.log.warn(f'got tutk library exception: {e}')
+
+        if self.capacity_held:
+            session_capacity.release()
+            self.capacity_held = False
+
+        self._reset_state()
+        self.log.info(f'disconnected from device, uid={self.uid}')
 
     @log_args
     def _check_session(self) -> bool:
@@ -102,8 +269,8 @@ class TutkDevice():
                 ses_info
             )
         except te.TutkLibraryException as e:
-            self._reset_state()
             self.log.warn(f'got tutk library exception: {e}')
+            self.disconnect()
             return False
         
         self.log.info(f'session is valid')
@@ -122,19 +289,25 @@ class TutkDevice():
         message_type: tc.AvIOCtrlMsgType,
         message_bytes: bytes
     ) -> bool:
+        """
+        Sends an ioctrl message on the control channel.  Payloads shorter than
+        IOCTRL_MIN_PAYLOAD_SIZE are zero-padded; longer ones are sent whole.
+        """
         self.log.info(f'attempting to send ioctrlmsg')
-        message_padded = message_bytes + bytes(8 - len(message_bytes))
+        message_padded = message_bytes + bytes(
+            max(0, IOCTRL_MIN_PAYLOAD_SIZE - len(message_bytes))
+        )
 
         try:
             tw.avSendIOCtrl(
                 self.device_state.channel_id_control,
                 message_type,
                 message_padded,
-                8
+                len(message_padded)
             )
         except te.TutkLibraryException as e:
             self.log.warn(f'got tutk library exception: {e}')
-            self._reset_state()
+            self.disconnect()
             return False
         
         self.log.info(f'sent ioctrlmsg')
@@ -142,26 +315,86 @@ class TutkDevice():
         return True
     
     @log_args
-    def _get_av_channel(self) -> int:
+    def _start_av_client(
+        self,
+        session_id: int,
+        resend: c.c_int,
+        timeout_s: int
+    ) -> int:
         """
-        Gets an AV channel from the current device
+        Logs in to an AV channel on session_id, applying max_buf_size_kb.
+        The buffer size is process-wide: a device without one gets the size
+        last set for another device, if any.  Raises TutkLibraryException on
+        failure.
+        """
+        global av_client_max_buf_size_kb
+
+        max_buf_size_kb = self.device_settings.max_buf_size_kb
+
+        with self.login_lock:
+            self.login_sid = session_id
+
+        try:
+            if max_buf_size_kb == None and av_client_max_buf_size_kb == None:
+                return tw.avClientStart2(
+                    session_id,
+                    self.device_settings.username.encode(),
+                    self.device_settings.password.encode(),
+                    timeout_s,
+                    None,
+                    IOTC_AV_CHANNEL,
+                    resend
+                )
+
+            with av_client_start_lock:
+                if max_buf_size_kb != None and \
+                    max_buf_size_kb != av_client_max_buf_size_kb:
+                    tw.avClientSetMaxBufSize(max_buf_size_kb)
+                    av_client_max_buf_size_kb = max_buf_size_kb
+
+                return tw.avClientStart2(
+                    session_id,
+                    self.device_settings.username.encode(),
+                    self.device_settings.password.encode(),
+                    timeout_s,
+                    None,
+                    IOTC_AV_CHANNEL,
+                    resend
+                )
+        finally:
+            with self.login_lock:
+                self.login_sid = None
+
+    def _get_av_channel(self, deadline: float = None) -> int:
+        """
+        Gets an AV channel from the current device, giving up at deadline
+        (time.monotonic()) if one is given.
         """
         self.log.info(f'attempting to get an av channel')
         resend = c.c_int()
 
+        timeout_s = self.device_settings.timeout_s
+
+        if deadline != None:
+            # avClientStart2 counts whole seconds
+            timeout_s = max(
+                1,
+                min(timeout_s, math.ceil(deadline - time.monotonic()))
+            )
+
         try:
-            channel_id: int = tw.avClientStart2(
+            channel_id: int = self._start_av_client(
                 self.device_state.device_sid,
-                self.device_settings.username.encode(),
-                self.device_settings.password.encode(),
-                self.device_settings.timeout_s,
-                None,
-                0,
-                resend
+                resend,
+                timeout_s
             )
         except te.TutkLibraryException as e:
             self.log.warn(f'got tutk library exception: {e}')
-            self._reset_state()
+
+            if e.args[0] in CAPACITY_CODES:
+                session_capacity.exceeded(e)
+
+            self.disconnect()
             return
 
         self.device_state.resend_on = resend.value == 1
@@ -170,9 +403,78 @@ class TutkDevice():
         return channel_id
 
     @log_args
-    def connect(self) -> bool:
+    def _ensure_av_channel(self, deadline: float = None) -> int:
+        """
+        Returns the device's AV channel, logging in if there isn't one yet.
+        Video and ioctrl messages share the channel, as the device only
+        accepts one avClientStart2 per IOTC channel.
+        """
+        if self.device_state.channel_id_control != None:
+            return self.device_state.channel_id_control
+
+        channel = self._get_av_channel(deadline)
+        if channel == None:
+            return
+
+        self.device_state.channel_id_control = channel
+        self.device_state.channel_id_video = channel
+        self.ioctrl = IOCtrlDispatcher(channel)
+        self.ioctrl.start()
+
+        return channel
+
+    @log_args
+    def request_ioctrl(
+        self,
+        message_type: tc.AvIOCtrlMsgType,
+        message_bytes: bytes,
+        response_type: tc.AvIOCtrlMsgType = None,
+        timeout_s: float = IOCTRL_RESPONSE_TIMEOUT
+    ) -> Future:
+        """
+        Sends an ioctrl request and returns a future resolved with the
+        response payload.  Requests to many devices can be issued before
+        waiting on any of them.  The response type defaults to the _RESP
+        counterpart of message_type.
+        """
+        response_type = response_type or response_type_for(message_type)
+
+        if response_type == None:
+            raise ValueError(f'no known response for {message_type}')
+
+        if self._ensure_av_channel() == None:
+            future = Future()
+            future.set_exception(
+                te.TutkLibraryException(tc.AVErrorCode.AV_ER_INVALID_SID)
+            )
+            return future
+
+        future = self.ioctrl.expect(response_type, timeout_s)
+
+        if not self._send_ioctrl_msg(message_type, message_bytes):
+            if self.ioctrl:
+                self.ioctrl.discard(future)
+
+            # the disconnect that follows a failed send fails pending
+            # requests itself
+            if not future.done():
+                future.set_exception(te.TutkLibraryException(
+                    tc.AVErrorCode.AV_ER_SENDIOCTRL_EXIT
+                ))
+
+        return future
+
+    @log_args
+    def connect(
+        self,
+        deadline_s: float = None,
+        hedge_after_s: float = None
+    ) -> bool:
         """
         Connects to a device and gets a client- and device-side session (SID).
+        Gives up after deadline_s if given; with hedge_after_s, a second
+        attempt is started if the first hasn't connected by then (see
+        ConnectOperation).
         """
         self.log.info(
             f'attempting to connect device '
@@ -181,63 +483,144 @@ class TutkDevice():
             f'friendly_name={self.friendly_name}'
         )
 
-        try:
-            # get a client-side session
-            self.log.debug(f'getting client-side session')
-            client_sid = tw.IOTC_Get_SessionID()
-            self.log.debug(
-                f'got client-side session, '
-                f'client_sid={str(client_sid)}'
+        if lan_first_enabled() and self.ip_address == None:
+            self.log.warn(
+                f'device was not found by LAN search; a lan-first connect '
+                f'may not reach it'
             )
 
-            # get a device-side session
-            self.log.debug(f'getting device-side session')
-            device_sid = tw.IOTC_Connect_ByUID_Parallel(
-                self.uid.encode(),
-                client_sid
-            )
+        started = time.monotonic()
+
+        # beyond the sessions the library was sized for, wait for one to
+        # free up rather than fail
+        if not self.capacity_held:
+            if not session_capacity.acquire(
+                FLEET_QUEUE_TIMEOUT if deadline_s == None else deadline_s
+            ):
+                self.log.warn(
+                    f'no free session to connect, uid={self.uid}, '
+                    f'{session_capacity}'
+                )
+                return False
+
+            self.capacity_held = True
+
+        queued_s = time.monotonic() - started
+        started += queued_s
+
+        if deadline_s != None:
+            deadline_s = max(0, deadline_s - queued_s)
+
+        self.pending_connect = ConnectOperation(
+            self.uid,
+            deadline_s=deadline_s,
+            hedge_after_s=hedge_after_s
+        )
+
+        try:
+            # get client- and device-side sessions
+            self.log.debug(f'getting session')
+            client_sid, device_sid = self.pending_connect.run()
             self.log.debug(
-                f'got device-side session, '
+                f'got session, '
+                f'client_sid={str(client_sid)}, '
                 f'device_sid={str(device_sid)}'
             )
         except te.TutkLibraryException as e:
             self.log.warn(f'got tutk library exception: {e}')
+
+            if e.args[0] in CAPACITY_CODES:
+                session_capacity.exceeded(e)
+
+            session_capacity.release()
+            self.capacity_held = False
             return False
+        finally:
+            self.pending_connect = None
         
         self.device_state.client_sid = client_sid
         self.device_state.device_sid = device_sid
+        self.device_state.connect_time_s = time.monotonic() - started
+
+        # a failed check disconnects, releasing the session slot
+        if not self._check_session():
+            self.log.warn(f'new session failed its check, uid={self.uid}')
+            return False
+
+        connect_latency.record(
+            self.device_state.session_mode,
+            self.device_state.connect_time_s
+        )
+
         self.log.info(
             f'connected to device, uid={self.uid}, '
-            f'device_sid={str(device_sid)}'
+            f'device_sid={str(device_sid)}, '
+            f'mode={self.device_state.session_mode}, '
+            f'connect_time_ms='
+            f'{round(self.device_state.connect_time_s * 1000)}'
         )
         return True
 
 
     @log_args
-    def sync_time(self) -> None:
+    def open(
+        self,
+        deadline_s: float,
+        hedge_after_s: float = None
+    ) -> bool:
+        """
+        Connects if need be and logs in to an AV channel, all within
+        deadline_s.  Returns True once the device is ready for ioctrl and
+        streaming.
+        """
+        deadline = time.monotonic() + deadline_s
+
+        if self.device_state.device_sid == None \
+            and not self.connect(deadline_s, hedge_after_s):
+            return False
+
+        return self._ensure_av_channel(deadline) != None
+
+    def abort(self) -> None:
+        """
+        Stops a connect or login in progress on another thread, which then
+        fails with IOTC_ER_ABORTED or AV_ER_CLIENT_EXIT.
+        """
+        operation = self.pending_connect
+
+        if operation:
+            self.log.info(f'aborting connect, uid={self.uid}')
+            operation.abort()
+
+        with self.login_lock:
+            if self.login_sid != None:
+                self.log.info(f'aborting login, uid={self.uid}')
+                tw.avClientExit(self.login_sid, IOTC_AV_CHANNEL)
+
+    @log_args
+    def sync_time(self) -> bool:
+        """
+        Sets the device clock to local time.  Devices don't acknowledge the
+        message, so True means it was sent, not that the clock was set.
+        """
         self.log.info('checking session validity')
 
         if not self._check_session():
-            self.log.warn('unable to stream; no valid session')
-            return
+            self.log.warn('unable to sync time; no valid session')
+            return False
         
         self.log.info('session is valid')
         self.log.info('attempting to get av channel')
 
-        channel = self._get_av_channel()
+        channel = self._ensure_av_channel()
         if channel == None:
             self.log.warn('unable to get av channel')
-            return
+            return False
 
-        self.device_state.channel_id_control = channel
         self.log.info('got av channel')
         
-        tz_diff = (
-            datetime.datetime.now() 
-            - datetime.datetime.utcnow()
-        ).total_seconds()
-
-        current_time_epoch = int(datetime.datetime.now().timestamp() + tz_diff)
+        tz_diff = utc_offset()
+        current_time_epoch = int(local_epoch())
         message_bytes = current_time_epoch.to_bytes(
                 length=4,
                 byteorder='little'
@@ -246,131 +629,635 @@ class TutkDevice():
         self.log.info(f'current timezone to gmt difference is {tz_diff}')
         self.log.info(f'attempting to send ioctrlmsg')
         
-        success = self._send_ioctrl_msg(
+        if not self._send_ioctrl_msg(
             message_type=tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_SET_TIME,
             message_bytes=message_bytes
+        ):
+            self.log.warn('unable to send time')
+            return False
+
+        # timestamps jump with the clock
+        self.frame_clock.reset()
+        self.log.info(f'synced time')
+
+        return True
+
+
+    @log_args
+    def set_stream_quality(
+        self,
+        stream_channel: StreamChannel = StreamChannel.MAIN,
+        quality: tc.AvIOCtrlQuality = tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_MAX,
+        wait: bool = True
+    ) -> bool:
+        """
+        Selects the main stream or substream and its quality level.  If wait
+        is set, blocks until the device acknowledges the change.
+        """
+        self.log.info(
+            f'attempting to set stream_channel={stream_channel.name}, '
+            f'quality={quality.name}'
+        )
+
+        if self._ensure_av_channel() == None:
+            self.log.warn('unable to get av channel')
+            return False
+
+        message = tm.SMsgAVIoctrlSetStreamCtrlReq(
+            channel=stream_channel,
+            quality=quality
+        )
+
+        response = self.request_ioctrl(
+            message_type=tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_SETSTREAMCTRL_REQ,
+            message_bytes=bytes(message)
+        )
+
+        if wait:
+            try:
+                payload = response.result()
+            except (TimeoutError, te.TutkLibraryException) as e:
+                self.log.warn(f'error setting stream quality: {e!r}')
+                return False
+
+            result = tm.SMsgAVIoctrlSetStreamCtrlResp.from_buffer_copy(
+                payload.ljust(c.sizeof(tm.SMsgAVIoctrlSetStreamCtrlResp), b'\0')
+            ).result
+
+            if result != 0:
+                self.log.warn(f'device rejected stream quality: {result}')
+                return False
+
+        elif response.done() and response.exception():
+            self.log.warn(f'error setting stream quality')
+            return False
+
+        self.device_settings.stream_channel = stream_channel
+        self.device_settings.stream_quality = quality
+        self.log.info('set stream quality')
+
+        return True
+
+    @log_args
+    def _send_stream_ctrl(
+        self,
+        message_type: tc.AvIOCtrlMsgType
+    ) -> bool:
+        """
+        Sends IOTYPE_USER_IPCAM_START/STOP.  The message's channel is the
+        camera index; the substream is selected by set_stream_quality().
+        """
+        return self._send_ioctrl_msg(
+            message_type=message_type,
+            message_bytes=bytes(tm.SMsgAVIoctrlAVStream(
+                channel=STREAM_CAMERA_INDEX
+            ))
         )
 
-        if success:
-            self.log.info(f'synced time')
+    @log_args
+    def _probe_frame(
+        self,
+        wait_for_keyframe: bool = False,
+        timeout_s: float = None
+    ) -> tuple[TutkFrame, bytes]:
+        """
+        Briefly starts video to receive a single frame (optionally the next
+        keyframe), then stops it.  Returns (None, None) on timeout or error.
+        """
+        timeout_s = timeout_s or self.device_settings.timeout_s
+
+        if self.device_state.streaming:
+            self.log.warn('unable to probe; device already streaming')
+            return None, None
+
+        if self._ensure_av_channel() == None:
+            self.log.warn('unable to get av channel')
+            return None, None
+
+        if not self._send_stream_ctrl(
+            tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_START
+        ):
+            return None, None
+
+        frame_buffer = AdaptiveFrameBuffer()
+        frame_buf_size_recvd = c.c_int()
+        frame_buf_size_sent = c.c_int()
+        frame_info = tm.FRAMEINFO()
+        frame_info_size_recvd = c.c_int()
+        frame_number = c.c_int()
+        deadline = time.monotonic() + timeout_s
+        frame, data = None, None
+
+        while time.monotonic() < deadline:
+            frame_data_size = tw.avRecvFrameData2_rc(
+                self.device_state.channel_id_video,
+                frame_buffer.buffer,
+                frame_buffer.size,
+                frame_buf_size_recvd,
+                frame_buf_size_sent,
+                frame_info,
+                c.sizeof(tm.FRAMEINFO),
+                frame_info_size_recvd,
+                frame_number
+            )
+
+            if frame_data_size < 0:
+                if frame_data_size in RECV_RETRY_CODES:
+                    time.sleep(0.01)
+                    continue
+
+                if frame_data_size == \
+                    tc.AVErrorCode.AV_ER_BUFPARA_MAXSIZE_INSUFF:
+                    frame_buffer.observe(frame_buf_size_sent.value)
+                    continue
+
+                self.log.warn(
+                    f'got tutk library error: '
+                    f'{tc.AVErrorCode(frame_data_size)!r}'
+                )
+                break
+
+            probed = TutkFrame(
+                codec_id=frame_info.codec_id,
+                flags=frame_info.flags,
+                timestamp=frame_info.timestamp,
+                size=frame_data_size,
+                frame_number=frame_number.value
+            )
+
+            if wait_for_keyframe and not probed.is_keyframe:
+                continue
+
+            frame = probed
+            data = frame_buffer.buffer[:frame_data_size]
+            break
+
+        frame_buffer.release()
+        self._send_stream_ctrl(tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_STOP)
+
+        if frame is None:
+            self.log.warn('no frame received before timeout')
+
+        return frame, data
+
+    @log_args
+    def measure_clock_drift(self) -> float:
+        """
+        Returns how many seconds the device clock is ahead of local time,
+        measured from frame timestamps, or None if the device doesn't stamp
+        frames with its clock (see FrameClock).  While streaming this uses
+        the latest frame; otherwise a frame is probed, twice if it isn't
+        known yet whether timestamps are the clock.
+        """
+        if self.device_state.streaming:
+            # the receive loop observes every frame, so the clock's receive
+            # time is the latest frame's
+            frame = self.frame_index.last()
+            received_time = self.frame_clock.last_received_time
         else:
-            self.log.warn(f'error syncing time')
-            return
+            probes = 1 if self.frame_clock.is_clock != None else 2
+
+            for i in range(probes):
+                if i:
+                    time.sleep(self.frame_clock.window_s)
+
+                frame, _ = self._probe_frame()
+                if frame is None:
+                    return None
+
+                received_time = time.time()
+                self.frame_clock.observe(frame.timestamp, received_time)
+
+        if frame is None:
+            return None
+
+        device_clock = self.frame_clock.seconds(frame.timestamp)
+        if device_clock is None:
+            self.log.info(
+                f'frame timestamp {frame.timestamp} is not known to be a '
+                f'clock'
+            )
+            return None
+
+        drift = device_clock - local_epoch(received_time)
+        self.log.info(f'device clock drift is {drift:.1f}s')
+
+        return drift
+
+    @log_args
+    def snapshot(
+        self,
+        fmt: str = 'jpeg',
+        timeout_s: float = SNAPSHOT_TIMEOUT
+    ) -> Future:
+        """
+        Returns a future resolved with the latest picture as JPEG or PNG
+        bytes.  While streaming this uses the cached keyframe and returns
+        immediately; otherwise video is started until a keyframe arrives,
+        which blocks for up to timeout_s.  Decoding happens in the decode
+        pool; raises TutkDecoderUnavailableException, before touching the
+        device, if PyAV isn't installed.
+        """
+        require_decoder()
+
+        if not self.device_state.streaming:
+            frame, data = self._probe_frame(
+                wait_for_keyframe=True,
+                timeout_s=timeout_s
+            )
+            if frame != None:
+                self.keyframe_cache.write(frame, data)
+
+        frame, data = self.keyframe_cache.keyframe()
+
+        if frame is None:
+            future = Future()
+            future.set_exception(TimeoutError('no keyframe available'))
+            return future
+
+        future = get_decode_pool().submit(encode_image, data, fmt)
+
+        if fmt == 'jpeg':
+            future.add_done_callback(self._store_last_frame_jpg)
+
+        return future
+
+    def _store_last_frame_jpg(self, future: Future) -> None:
+        if not future.cancelled() and not future.exception():
+            self.stream_info.last_frame_jpg = future.result()
+
+    @log_args
+    def stop_stream(self) -> None:
+        """
+        Asks a blocking stream_to() to stop.  Frames already queued by the
+        library are drained to the sinks before it returns; leaving the
+        device's context waits for that, up to STREAM_STOP_TIMEOUT.
+        """
+        self.log.info('stopping stream')
+        self.stop_requested.set()
+
+        wakeup = self.wakeup
+        if wakeup:
+            wakeup.signal()
+
+    def _switch_session(self, standby: StandbySession) -> bool:
+        """
+        Moves a stream onto a standby session, closing the current one, and
+        starts video on it.  Returns False if video couldn't be started.
+        """
+        self.log.info(
+            f'switching to {standby.session_mode.name} session, '
+            f'uid={self.uid}, device_sid={standby.device_sid}'
+        )
+
+        event_driven = self.wakeup != None
+        if event_driven:
+            self.wakeup.close()
+            self.wakeup = None
+
+        # the device's session slot moves to the standby, freeing the spare
+        # one the standby was opened with
+        capacity_held, self.capacity_held = self.capacity_held, False
+        self.disconnect()
+        self.capacity_held = capacity_held
+        session_capacity.release_spare()
+
+        state = self.device_state
+        state.client_sid = standby.client_sid
+        state.device_sid = standby.device_sid
+        state.channel_id_control = standby.channel_id
+        state.channel_id_video = standby.channel_id
+        state.resend_on = standby.resend_on
+        state.session_mode = standby.session_mode
+        state.streaming = True
+
+        self.ioctrl = IOCtrlDispatcher(standby.channel_id)
+        self.ioctrl.start()
+
+        if event_driven:
+            self.wakeup = self._open_wakeup()
+
+        if self.device_settings.stream_quality != None:
+            self.set_stream_quality(
+                stream_channel=self.device_settings.stream_channel,
+                quality=self.device_settings.stream_quality
+            )
+
+        return self._send_stream_ctrl(
+            tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_START
+        )
 
+    def _open_wakeup(self) -> ChannelWakeup:
+        """
+        Registers for channel callbacks, or returns None if the library can't
+        provide them, in which case the stream polls.
+        """
+        try:
+            return ChannelWakeup(self.device_state.device_sid)
+        except (AttributeError, te.TutkLibraryException) as e:
+            self.log.warn(f'unable to register channel callback, polling: {e}')
 
     @log_args
     def stream_to(
         self,
-        dest_file: BinaryIO,
-        blocking: bool = True
+        dest_file: BinaryIO = None,
+        blocking: bool = True,
+        governor: StreamQualityGovernor = None,
+        sinks: list[FrameSink] = None
     ) -> None:
+        """
+        Starts video and, if blocking, writes frames to dest_file and any
+        other sinks until stop_stream() is called or the session fails.
+        """
         if self.device_state.streaming:
             self.log.warn('device already streaming')
             return
-            
+
+        sinks = list(sinks or ())
+        if dest_file:
+            sinks.insert(0, FileSink(dest_file))
+        sinks.append(self.keyframe_cache)
+
         self._reset_stream_info()
-        self.device_state.streaming = True
+        self.stop_requested.clear()
         self.log.info('checking session validity')
 
         if not self._check_session():
             self.log.warn('unable to stream; no valid session')
+            self._close_sinks(sinks)
             return
         
         self.log.info('session is valid')
         self.log.info('attempting to get av channel')
 
-        channel = self._get_av_channel()
+        channel = self._ensure_av_channel()
         if channel == None:
             self.log.warn('unable to get av channel')
+            self._close_sinks(sinks)
             return
 
-        self.device_state.channel_id_video = channel
         self.log.info('got av channel')
-        
-        self.log.info(f'attempting to send ioctrlmsg to start video')
-        io_buffer = (c.c_char * 8)()
 
-        try:
-            tw.avSendIOCtrl(
-                self.device_state.channel_id_video,
-                tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_START,
-                io_buffer,
-                8
+        if self.device_settings.stream_channel != StreamChannel.MAIN \
+            and self.device_settings.stream_quality == None:
+            self.log.warn(
+                f'{self.device_settings.stream_channel.name} stream needs a '
+                f'stream_quality to be selected; streaming the main stream'
             )
-        except te.TutkLibraryException as e:
-            self.log.warn(f'got tutk library exception: {e}')
-            self._reset_state()
+
+        if self.device_settings.stream_quality != None:
+            self.set_stream_quality(
+                stream_channel=self.device_settings.stream_channel,
+                quality=self.device_settings.stream_quality
+            )
+
+        self.log.info(f'attempting to send ioctrlmsg to start video')
+
+        success = self._send_stream_ctrl(
+            tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_START
+        )
+
+        if not success:
+            self.log.warn('unable to start video')
+            self._close_sinks(sinks)
             return
         
         self.log.info(f'sent ioctrlmsg to start video')
 
+        if blocking:
+            self.stream_stopped.clear()
+
+        self.device_state.streaming = True
+
+        if governor:
+            governor.register(self)
+
         if blocking:
             self.log.info(f'attempting to start video streaming (blocking)')
 
-            frame_buf = (c.c_char * FRAME_BUFFER_SIZE)()
-            frame_buf_size_recvd = c.c_int()
-            frame_buf_size_sent = c.c_int()
-            frame_info = tm.FRAMEINFO()
-            frame_info_size_recvd = c.c_int()
-            frame_number = c.c_int()
+            arena = FrameArena()
+            channel_id = self.device_state.channel_id_video
+            timed_out = False
+            awaiting_keyframe = False
+
+            # without resend there's no resend buffer to fall behind in
+            catch_up = CatchUpPolicy() if self.device_settings.catch_up \
+                and self.device_state.resend_on else None
+
+            if self.device_settings.event_driven:
+                self.wakeup = self._open_wakeup()
+
+            path = SessionPathMonitor(
+                self,
+                migrate=self.device_settings.migrate_relay
+            )
+            switched = False
             
             frame_count = 0
+            losses = FrameLossCounter()
+            stream_offset = 0
             fps_frames = 0
             fps_time = int(time.time())
+            draining = False
             
-            while True:
-                try:
-                    frame_data_size = tw.avRecvFrameData2(
-                        self.device_state.channel_id_video,
-                        frame_buf,
-                        FRAME_BUFFER_SIZE,
-                        frame_buf_size_recvd,
-                        frame_buf_size_sent,
-                        frame_info,
-                        c.sizeof(tm.FRAMEINFO),
-                        frame_info_size_recvd,
-                        frame_number
-                    )
-                except te.TutkLibraryException as e:
-                    self.log.debug(
-                        f'got tutk library exception {e}'
-                    )
+            try:
+                while True:
+                    # once stopped, stop the device sending and drain what's
+                    # left
+                    if not draining and self.stop_requested.is_set():
+                        self._send_stream_ctrl(
+                            tc.AvIOCtrlMsgType.IOTYPE_USER_IPCAM_STOP
+                        )
+                        draining = True
+
+                    # take everything that's ready in one burst; status codes
+                    # rather than exceptions, as most polls of an idle camera
+                    # find no frame ready
+                    oversize_frames = arena.oversize_frames
+                    rc = recv_frames(channel_id, FRAME_ARENA_MAX_FRAMES, arena)
+
+                    # frames found after a timeout, with no callback ever made,
+                    # mean the library doesn't call back for this channel
+                    if timed_out and arena.count and not self.wakeup.callbacks:
+                        self.log.warn('no channel callbacks received, polling')
+                        self.wakeup.close()
+                        self.wakeup = None
+
+                    timed_out = False
+
+                    # the library drops frames that don't fit; the arena grows
+                    # so the next one does
+                    if arena.oversize_frames != oversize_frames:
+                        self.stream_info.oversize_frames += \
+                            arena.oversize_frames - oversize_frames
+                        self.log.warn(
+                            f'frame of {arena.size_sent.value} bytes exceeded '
+                            f'buffer, resized to {arena.reserve}'
+                        )
+
+                    received_time = time.time()
+
+                    for i in range(arena.count):
+                        keyframe = arena.frame_infos[i].flags == \
+                            FrameFlag.IPC_FRAME_FLAG_IFRAME
+                        losses.record(arena.frame_numbers[i])
+
+                        # after a flush, frames up to the next keyframe
+                        # reference discarded ones
+                        if awaiting_keyframe:
+                            if not keyframe:
+                                self.stream_info.skipped_frames += 1
+                                continue
+
+                            awaiting_keyframe = False
+
+                        # move off a relayed session where the output can
+                        # restart cleanly, at a keyframe from the new one
+                        if keyframe and path.standby and not draining:
+                            self.stream_info.skipped_frames += arena.count - i
+                            switched = True
+                            break
+
+                        self.frame_clock.observe(
+                            arena.frame_infos[i].timestamp,
+                            received_time
+                        )
+
+                        if keyframe:
+                            path.record_keyframe(
+                                arena.frame_infos[i].timestamp
+                            )
+
+                        frame_data_size = arena.sizes[i]
+                        sequence = self.frame_index.append(
+                            arena.frame_infos[i],
+                            frame_data_size,
+                            arena.frame_numbers[i],
+                            stream_offset
+                        )
+                        stream_offset += frame_data_size
+
+                        frame = self.frame_index[sequence]
+                        data = arena.data(i)
+
+                        for sink in sinks:
+                            sink.write(frame, data)
+
+                        if governor:
+                            governor.record(self, frame_data_size)
+
+                        path.record(frame_data_size)
+                        frame_count += 1
+
+                    # refreshed once per burst rather than once per frame
+                    if arena.count:
+                        self._update_stream_info(
+                            frame_count,
+                            losses.dropped,
+                            int(received_time)
+                        )
+
+                    if switched:
+                        switched = False
+                        losses.rebase()
+
+                        if not self._switch_session(path.take_standby()):
+                            self.log.warn(
+                                'unable to start video on new session'
+                            )
+                            self.disconnect()
+                            break
+
+                        channel_id = self.device_state.channel_id_video
+                        awaiting_keyframe = True
+                        timed_out = False
+                        catch_up = CatchUpPolicy() \
+                            if self.device_settings.catch_up \
+                            and self.device_state.resend_on else None
+                        path.reset()
+                        self.stream_info.migrations = path.migrations
+                        continue
+
+                    path.sample()
+                    cur_time = int(time.time())
+
+                    if catch_up and catch_up.check(channel_id):
+                        self.stream_info.catch_ups += 1
+                        awaiting_keyframe = True
+
+                    if catch_up:
+                        self.stream_info.resend_buffer_usage = catch_up.usage
+                    time_span = cur_time - fps_time
+
+                    # log stats every STREAM_LOG_INTERVAL seconds
+                    if cur_time != fps_time and \
+                        not time_span % STREAM_LOG_INTERVAL:
+                        fps = int(
+                            (frame_count - fps_frames) / STREAM_LOG_INTERVAL
+                        )
+                        self.stream_info.fps = fps
+                        arena.maybe_shrink()
+                        self.stream_info.frame_buffer_size = arena.reserve
+                        fps_frames = frame_count
+                        fps_time = cur_time
+
+                        self.log.info(f'status: {self.stream_info}')
+
+                    # stopped early (arena full or frame dropped); more is
+                    # ready
+                    if rc >= 0 or \
+                        rc == tc.AVErrorCode.AV_ER_BUFPARA_MAXSIZE_INSUFF:
+                        continue
 
                     # error codes we can probably safely ignore
-                    if e.args[0] in (
-                        tc.AVErrorCode.AV_ER_DATA_NOREADY,
-                        tc.AVErrorCode.AV_ER_LOSED_THIS_FRAME,
-                        tc.AVErrorCode.AV_ER_INCOMPLETE_FRAME
-                    ):
-                        time.sleep(0.01)
+                    if rc in RECV_RETRY_CODES:
+                        if draining and \
+                            rc == tc.AVErrorCode.AV_ER_DATA_NOREADY:
+                            break
+
+                        if arena.count:
+                            continue
+
+                        if self.wakeup:
+                            timed_out = not self.wakeup.wait(WAKEUP_TIMEOUT)
+                        else:
+                            time.sleep(STREAM_POLL_INTERVAL)
                         continue
 
                     # error codes we can't ignore
-                    else:
-                        self.log.warn(f'got tutk library exception: {e}')
-                        self._reset_state()
-                        break
-
-                frame_count += 1
-                cur_time = int(time.time())
-                time_span = cur_time - fps_time
-                dropped_frames = frame_count - frame_number.value
-
-                self.stream_info.frames_received = frame_count
-                self.stream_info.last_frame_received_time = cur_time
-                self.stream_info.last_frame_size = frame_data_size
-                self.stream_info.dropped_frames = dropped_frames
-                self.stream_info.video_format = StreamFormat(frame_info.codec_id)
-
-                dest_file.write(frame_buf[:frame_data_size])
-
-                # log stats every STREAM_LOG_INTERVAL seconds
-                if cur_time != fps_time and not time_span % STREAM_LOG_INTERVAL:
-                    fps = int((frame_count - fps_frames) / STREAM_LOG_INTERVAL)
-                    self.stream_info.fps = fps
-                    fps_frames = frame_count
-                    fps_time = cur_time
-
-                    self.log.info(f'status: {self.stream_info}')
-            
-            dest_file.close()
+                    self.log.warn(
+                        f'got tutk library error: {rc}'
+                    )
+                    self.disconnect()
+                    break
+            finally:
+                self._update_stream_info(
+                    frame_count,
+                    losses.dropped,
+                    int(time.time())
+                )
+                self.device_state.streaming = False
+                arena.release()
+                path.close()
+
+                if self.wakeup:
+                    self.wakeup.close()
+                    self.wakeup = None
+
+                self._close_sinks(sinks)
+
+                if governor:
+                    governor.unregister(self)
+
+                self.stream_stopped.set()
+                self.log.info(
+                    f'stopped streaming, frames_received={frame_count}'
+                )
+
+    def _close_sinks(self, sinks: list[FrameSink]) -> None:
+        for sink in sinks:
+            try:
+                sink.flush()
+                sink.close()
+            except Exception as e:
+                self.log.warn(f'unable to close sink {sink!r}: {e!r}')
@@ -0,0 +1,312 @@
+import threading
+import time
+import logging
+from .exceptions import TutkDecoderUnavailableException
+from .frames import TutkFrame
+from .sinks import FrameSink
+from .decode import DecodeStage
+from .constants import (
+    THUMBNAIL_WIDTH,
+    THUMBNAIL_HEIGHT,
+    MOTION_INTERVAL,
+    MOTION_BACKGROUND_ALPHA,
+    MOTION_PIXEL_THRESHOLD,
+    MOTION_AREA_THRESHOLD,
+    MOTION_HOLD,
+    MOTION_PREROLL_MAX_SIZE
+)
+
+# motion detection is optional and needs NumPy
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = logging.getLogger(__name__)
+
+
+class MotionDetector():
+    """
+    Frame-differencing motion detector over grayscale thumbnails.  Each
+    camera has a running-average background model and a mask of the pixels
+    that count; all cameras in a batch are scored in one vectorised pass.
+    """
+    def __init__(
+        self,
+        width: int = THUMBNAIL_WIDTH,
+        height: int = THUMBNAIL_HEIGHT,
+        alpha: float = MOTION_BACKGROUND_ALPHA,
+        pixel_threshold: int = MOTION_PIXEL_THRESHOLD
+    ) -> None:
+        if np is None:
+            raise TutkDecoderUnavailableException(
+                'motion detection requires NumPy; install it with '
+                'pip install numpy'
+            )
+
+        self.width = width
+        self.height = height
+        self.alpha = alpha
+        self.pixel_threshold = pixel_threshold
+        self.rows: dict[str, int] = dict()
+        self.background = np.zeros((0, height, width), np.float32)
+        self.masks = np.zeros((0, height, width), bool)
+        self.mask_area = np.zeros(0, np.float32)
+        self.initialised = np.zeros(0, bool)
+
+    def register(
+        self,
+        uid: str,
+        mask=None
+    ) -> None:
+        """
+        Adds a camera.  mask is a height x width boolean array of the pixels
+        to watch; by default the whole picture is watched.
+        """
+        if mask is None:
+            mask = np.ones((self.height, self.width), bool)
+
+        if uid in self.rows:
+            row = self.rows[uid]
+        else:
+            row = len(self.rows)
+            self.rows[uid] = row
+            self.background = np.concatenate(
+                (self.background, np.zeros((1, self.height, self.width),
+                                           np.float32))
+            )
+            self.masks = np.concatenate((self.masks, mask[None]))
+            self.mask_area = np.append(self.mask_area, 0)
+            self.initialised = np.append(self.initialised, False)
+
+        self.masks[row] = mask
+        self.mask_area[row] = max(1, mask.sum())
+
+    def reset(self, uid: str) -> None:
+        """
+        Forgets a camera's background; its next frame becomes the new one.
+        """
+        if uid in self.rows:
+            self.initialised[self.rows[uid]] = False
+
+    def update(self, thumbnails: dict) -> dict:
+        """
+        Scores a batch of {uid: thumbnail} and folds them into each camera's
+        background.  Returns {uid: fraction of watched pixels that changed}.
+        """
+        for uid in thumbnails:
+            if uid not in self.rows:
+                self.register(uid)
+
+        uids = list(thumbnails)
+        rows = np.array([self.rows[uid] for uid in uids])
+        frames = np.stack([thumbnails[uid] for uid in uids]) \
+            .astype(np.float32)
+
+        # a camera's first frame becomes its background
+        fresh = ~self.initialised[rows]
+        self.background[rows[fresh]] = frames[fresh]
+        self.initialised[rows] = True
+
+        background = self.background[rows]
+        changed = np.abs(frames - background) > self.pixel_threshold
+        changed &= self.masks[rows]
+        scores = changed.sum(axis=(1, 2)) / self.mask_area[rows]
+
+        background += self.alpha * (frames - background)
+        self.background[rows] = background
+
+        return dict(zip(uids, scores.tolist()))
+
+
+class MotionMonitor():
+    """
+    Collects thumbnails from many cameras' decode stages and scores them in
+    batches every interval_s.  A camera is in motion from the first score
+    above area_threshold until hold_s after the last one.  on_start(uid,
+    score) and on_end(uid) are called on the monitor's thread.
+    """
+    def __init__(
+        self,
+        detector: MotionDetector = None,
+        area_threshold: float = MOTION_AREA_THRESHOLD,
+        hold_s: float = MOTION_HOLD,
+        interval_s: float = MOTION_INTERVAL,
+        on_start=None,
+        on_end=None
+    ) -> None:
+        self.detector = detector or MotionDetector()
+        self.area_threshold = area_threshold
+        self.hold_s = hold_s
+        self.interval_s = interval_s
+        self.on_start = on_start
+        self.on_end = on_end
+        self.pending: dict = dict()
+        self.stale: set[str] = set()
+        self.last_motion: dict[str, float] = dict()
+        self.active: set[str] = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run,
+            name='motion-monitor',
+            daemon=True
+        )
+        self.thread.start()
+
+    def submit(
+        self,
+        uid: str,
+        thumbnail
+    ) -> None:
+        """
+        Queues a camera's latest thumbnail for the next batch.
+        """
+        with self.lock:
+            self.pending[uid] = thumbnail
+
+    def reset(self, uid: str) -> None:
+        """
+        Rebuilds a camera's background from its next thumbnail, e.g. after
+        decoding was paused and the old background has gone stale.
+        """
+        with self.lock:
+            self.pending.pop(uid, None)
+            self.stale.add(uid)
+
+    def decode_stage(
+        self,
+        uid: str,
+        **kwargs
+    ) -> DecodeStage:
+        """
+        Returns a DecodeStage that feeds this monitor with uid's thumbnails,
+        resetting uid's background whenever the stage resumes decoding.
+        """
+        return DecodeStage(
+            callback=lambda frame, pixels: self.submit(uid, pixels),
+            on_resume=lambda: self.reset(uid),
+            width=self.detector.width,
+            height=self.detector.height,
+            grayscale=True,
+            **kwargs
+        )
+
+    def is_active(self, uid: str) -> bool:
+        return uid in self.active
+
+    def evaluate(self) -> None:
+        """
+        Scores pending thumbnails and updates each camera's motion state.
+        """
+        with self.lock:
+            batch = self.pending
+            self.pending = dict()
+            stale = self.stale
+            self.stale = set()
+
+        for uid in stale:
+            self.detector.reset(uid)
+
+        now = time.monotonic()
+
+        if batch:
+            for uid, score in self.detector.update(batch).items():
+                if score < self.area_threshold:
+                    continue
+
+                self.last_motion[uid] = now
+
+                if uid not in self.active:
+                    self.active.add(uid)
+                    log.info(f'motion started on {uid}, score={score:.3f}')
+                    if self.on_start:
+                        self.on_start(uid, score)
+
+        for uid in list(self.active):
+            if now - self.last_motion[uid] > self.hold_s:
+                self.active.discard(uid)
+                log.info(f'motion ended on {uid}')
+                if self.on_end:
+                    self.on_end(uid)
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval_s):
+            try:
+                self.evaluate()
+            except Exception as e:
+                log.warn(f'motion evaluation failed: {e!r}')
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+class MotionGate(FrameSink):
+    """
+    Passes frames to another sink only while its camera is in motion.  The
+    current group of pictures is held back while idle, so recordings start
+    at the keyframe before the motion was seen and stay decodable.
+    """
+    def __init__(
+        self,
+        uid: str,
+        monitor: MotionMonitor,
+        sink: FrameSink,
+        preroll_max_size: int = MOTION_PREROLL_MAX_SIZE
+    ) -> None:
+        self.uid = uid
+        self.monitor = monitor
+        self.sink = sink
+        self.preroll_max_size = preroll_max_size
+        self.preroll: list = list()
+        self.preroll_size = 0
+        self.recording = False
+
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        active = self.monitor.is_active(self.uid)
+
+        if self.recording:
+            # only stop at a keyframe, so the next recording starts on one
+            if active or not frame.is_keyframe:
+                self.sink.write(frame, data)
+                return
+
+            self.recording = False
+            self.sink.flush()
+
+        if frame.is_keyframe:
+            self.preroll.clear()
+            self.preroll_size = 0
+
+        if active and (self.preroll or frame.is_keyframe):
+            for held_frame, held_data in self.preroll:
+                self.sink.write(held_frame, held_data)
+
+            self.preroll.clear()
+            self.preroll_size = 0
+            self.recording = True
+            self.sink.write(frame, data)
+            return
+
+        if not (self.preroll or frame.is_keyframe):
+            return
+
+        # a truncated group can't be decoded; wait for the next keyframe
+        if self.preroll_size + len(data) > self.preroll_max_size:
+            self.preroll.clear()
+            self.preroll_size = 0
+            return
+
+        self.preroll.append((frame, bytes(data)))
+        self.preroll_size += len(data)
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+    def close(self) -> None:
+        self.sink.close()
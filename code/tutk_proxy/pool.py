@@ -0,0 +1,176 @@
+from contextlib import contextmanager
+from dataclasses import replace
+import threading
+import time
+import logging
+from .models import (
+    TutkDevice,
+    TutkDeviceSettings
+)
+from .constants import (
+    POOL_IDLE_TIMEOUT,
+    POOL_HEALTH_INTERVAL,
+    CONNECT_DEADLINE,
+    CONNECT_HEDGE_AFTER
+)
+
+log = logging.getLogger(__name__)
+
+
+class TutkSessionPoolEntry():
+    __slots__ = (
+        'device',
+        'lock',
+        'leases',
+        'last_used'
+    )
+
+    def __init__(self, device: TutkDevice) -> None:
+        self.device = device
+        self.lock = threading.RLock()
+        self.leases = 0
+        self.last_used = time.monotonic()
+
+
+class TutkSessionPool():
+    """
+    Keeps IOTC sessions and AV channels open across operations, keyed by
+    device UID.  Operations take a lease on a logged-in device; idle sessions
+    are probed with IOTC_Session_Check and closed once unused for
+    idle_timeout_s.  Connecting and logging in for a lease gives up after
+    connect_deadline_s.
+    """
+    def __init__(
+        self,
+        device_settings: TutkDeviceSettings,
+        idle_timeout_s: float = POOL_IDLE_TIMEOUT,
+        health_interval_s: float = POOL_HEALTH_INTERVAL,
+        connect_deadline_s: float = CONNECT_DEADLINE,
+        hedge_after_s: float = CONNECT_HEDGE_AFTER
+    ) -> None:
+        self.device_settings = device_settings
+        self.idle_timeout_s = idle_timeout_s
+        self.health_interval_s = health_interval_s
+        self.connect_deadline_s = connect_deadline_s
+        self.hedge_after_s = hedge_after_s
+        self.entries: dict[str, TutkSessionPoolEntry] = dict()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run,
+            name='session-pool',
+            daemon=True
+        )
+        self.thread.start()
+
+    def add(self, device: TutkDevice) -> None:
+        """
+        Makes a device (e.g. from scan_local_subnet) available for leasing.
+        """
+        if device.device_settings is None:
+            device.device_settings = replace(self.device_settings)
+
+        with self.lock:
+            self.entries.setdefault(device.uid, TutkSessionPoolEntry(device))
+
+    def uids(self) -> list[str]:
+        with self.lock:
+            return list(self.entries)
+
+    @contextmanager
+    def lease(self, uid: str):
+        """
+        Yields the device with uid, connected and logged in to an AV channel,
+        reconnecting if its session has failed since it was last used.
+        Operations on the same device are serialised.  Raises
+        ConnectionError if the device can't be opened.
+        """
+        with self.lock:
+            entry = self.entries.get(uid)
+
+            if entry is None:
+                entry = TutkSessionPoolEntry(TutkDevice(
+                    uid=uid,
+                    device_settings=replace(self.device_settings)
+                ))
+                self.entries[uid] = entry
+
+        with entry.lock:
+            entry.leases += 1
+
+            try:
+                device = entry.device
+
+                # a failed check closes the session, and open() reconnects
+                if device.device_state.device_sid != None:
+                    device._check_session()
+
+                if not device.open(
+                    self.connect_deadline_s,
+                    self.hedge_after_s
+                ):
+                    raise ConnectionError(f'unable to open {uid}')
+
+                yield device
+            finally:
+                entry.leases -= 1
+                entry.last_used = time.monotonic()
+
+    def _evict(
+        self,
+        uid: str,
+        entry: TutkSessionPoolEntry
+    ) -> None:
+        log.info(f'evicting session for {uid}')
+        entry.device.disconnect()
+
+        with self.lock:
+            if self.entries.get(uid) is entry:
+                del self.entries[uid]
+
+    def _probe(self) -> None:
+        now = time.monotonic()
+
+        with self.lock:
+            entries = list(self.entries.items())
+
+        for uid, entry in entries:
+            # skip devices that are in use; they'll be probed next time
+            if not entry.lock.acquire(blocking=False):
+                continue
+
+            try:
+                device = entry.device
+
+                if entry.leases or device.device_state.streaming:
+                    continue
+
+                if device.device_state.device_sid == None:
+                    continue
+
+                if now - entry.last_used > self.idle_timeout_s:
+                    self._evict(uid, entry)
+
+                # a failed check closes the session; the next lease reconnects
+                elif not device._check_session():
+                    log.warn(f'session for {uid} failed health check')
+            finally:
+                entry.lock.release()
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.health_interval_s):
+            self._probe()
+
+    def close(self) -> None:
+        """
+        Stops health checks and closes every pooled session.
+        """
+        self.stopped.set()
+        self.thread.join()
+
+        with self.lock:
+            entries = list(self.entries.items())
+
+        for uid, entry in entries:
+            with entry.lock:
+                self._evict(uid, entry)
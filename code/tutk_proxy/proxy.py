@@ -8,22 +8,42 @@ from .models import (
     TutkDeviceSettings,
     TutkDeviceState
 )
+from .decode import shutdown_decode_pool
+from .connect import (
+    configure_lan_first,
+    connect_latency,
+    lan_first_enabled
+)
+from .sessionpath import path_stats
+from .capacity import (
+    fleet_limits,
+    session_capacity
+)
+from .constants import (
+    CONNECT_LAN_SEARCH_TIMEOUT,
+    FLEET_DEFAULT_DEVICES,
+    FLEET_SPARE_SESSIONS
+)
 import logging
 from textwrap import dedent
 
 log = logging.getLogger(__name__)
 
-# todo
-# stop recording
-# get single frame (png)
 
 @log_args
-def initialise(library_path: str='tutk_wrapper/lib/libIOTCAPIs_ALL.so') \
-    -> None:
+def initialise(
+    library_path: str='tutk_wrapper/lib/libIOTCAPIs_ALL.so',
+    lan_first: bool = False,
+    max_devices: int = FLEET_DEFAULT_DEVICES
+) -> None:
     """
     Initialise proxy dependencies e.g., tutk library, and prepare it to be 
-    called.
+    called.  IOTC sessions and AV channels are sized for max_devices cameras
+    (see fleet_limits).  With lan_first, connects and scans are tuned for
+    cameras on a network without internet access.
     """
+    admitted, sessions = fleet_limits(max_devices)
+
     log.info(f'attempting to load wrapper')
     try:
         tw.initialise(library_path)
@@ -32,6 +52,13 @@ def initialise(library_path: str='tutk_wrapper/lib/libIOTCAPIs_ALL.so') \
         raise e
     log.info(f'loaded wrapper')
 
+    # only applies before IOTC_Initialize2
+    try:
+        tw.IOTC_Set_Max_Session_Number(sessions)
+    except AttributeError as e:
+        log.warn(f'unable to set max session number: {e}')
+        sessions = None
+
     log.info(f'attempting to initialise IOTC library')
     try:
         tw.IOTC_Initialize2()
@@ -42,12 +69,62 @@ def initialise(library_path: str='tutk_wrapper/lib/libIOTCAPIs_ALL.so') \
 
     log.info(f'attempting to initialise av functions')
     try:
-        tw.avInitialize()
+        av_channels = tw.avInitialize(admitted + FLEET_SPARE_SESSIONS)
     except te.TutkLibraryLoadException as e:
         log.fatal(e)
         raise e
     log.info(f'initialised av functions')
 
+    # the library may allocate fewer channels than asked for
+    if av_channels < admitted + FLEET_SPARE_SESSIONS:
+        log.warn(f'library allocated only {av_channels} av channels')
+        admitted = max(1, av_channels - FLEET_SPARE_SESSIONS)
+
+    session_capacity.configure(admitted, FLEET_SPARE_SESSIONS)
+
+    log.info(
+        f'sized for {max_devices} devices: '
+        f'iotc_sessions={sessions or "library default"}, '
+        f'av_channels={av_channels}, '
+        f'devices_admitted_at_once={admitted}'
+    )
+
+    if lan_first:
+        configure_lan_first()
+
+
+@log_args
+def shutdown(devices: list[TutkDevice] = ()) -> None:
+    """
+    Releases devices' channels and sessions, then the AV and IOTC modules, in
+    that order.  The library's threads exit once IOTC is deinitialised.
+    """
+    for d in devices:
+        d.disconnect()
+
+    shutdown_decode_pool()
+
+    log.info(f'connect latency by session mode: {connect_latency.summary()}')
+    log.info(f'stream throughput by session mode: {path_stats.summary()}')
+    log.info(f'session capacity: {session_capacity}')
+
+    log.info(f'attempting to deinitialise av functions')
+    try:
+        tw.avDeInitialize()
+    except (
+        te.TutkLibraryException,
+        te.TutkAVLibraryNotInitializedException
+    ) as e:
+        log.warn(f'unable to deinitialise av functions: {e!r}')
+    log.info(f'deinitialised av functions')
+
+    log.info(f'attempting to deinitialise IOTC library')
+    try:
+        tw.IOTC_DeInitialize()
+    except te.TutkLibraryException as e:
+        log.warn(f'unable to deinitialise IOTC library: {e}')
+    log.info(f'deinitialised IOTC library')
+
 
 @log_args
 def scan_local_subnet(
@@ -55,8 +132,13 @@ def scan_local_subnet(
     max_devices_to_return: int=10
 ) -> list[TutkDevice]:
     """
-    Scans the local subnet and returns a list of devices found.
+    Scans the local subnet and returns a list of devices found.  In lan-first
+    mode the scan is capped at CONNECT_LAN_SEARCH_TIMEOUT, as cameras on the
+    local network reply within milliseconds.
     """
+    if lan_first_enabled():
+        timeout_ms = min(timeout_ms, CONNECT_LAN_SEARCH_TIMEOUT)
+
     log.info(f'attempting to scan local subnet for devices')
     device_array = (tm.st_LanSearchInfo2 * max_devices_to_return)()
     
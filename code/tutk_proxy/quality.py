@@ -0,0 +1,162 @@
+import threading
+import time
+import logging
+import tutk_wrapper.constants as tc
+from .constants import (
+    StreamChannel,
+    GOVERNOR_INTERVAL,
+    GOVERNOR_RESTORE_RATIO
+)
+
+log = logging.getLogger(__name__)
+
+
+class StreamQualityGovernor():
+    """
+    Keeps the aggregate bandwidth and CPU use of all streams in this process
+    within a budget.  When over budget, the busiest camera on its main stream
+    is dropped to its substream; when comfortably under budget again, the
+    most recently dropped camera is restored to the stream and quality it
+    was configured with (AVIOCTRL_QUALITY_MAX if it had none).
+
+    Budgets are checked from whichever receive loop records a frame, but a
+    change is only sent by the receive loop of the camera it's for, so a
+    failed send disconnects that camera on its own thread.
+    """
+    def __init__(
+        self,
+        max_bandwidth_kbps: int = None,
+        max_cpu_percent: float = None,
+        substream_quality: tc.AvIOCtrlQuality = \
+            tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_LOW,
+        interval_s: float = GOVERNOR_INTERVAL
+    ) -> None:
+        self.max_bandwidth_kbps = max_bandwidth_kbps
+        self.max_cpu_percent = max_cpu_percent
+        self.substream_quality = substream_quality
+        self.interval_s = interval_s
+        self.bytes_received: dict = dict()
+        # demoted device: (stream_channel, stream_quality) to restore
+        self.demoted: dict = dict()
+        # device: (stream_channel, stream_quality) for it to send
+        self.changes: dict = dict()
+        self.lock = threading.Lock()
+        self.last_check = time.monotonic()
+        self.last_cpu = time.process_time()
+        self.bandwidth_kbps: float = 0
+        self.cpu_percent: float = 0
+
+    def register(self, device) -> None:
+        with self.lock:
+            self.bytes_received.setdefault(device, 0)
+
+    def unregister(self, device) -> None:
+        with self.lock:
+            self.bytes_received.pop(device, None)
+            self.demoted.pop(device, None)
+            self.changes.pop(device, None)
+
+    def record(
+        self,
+        device,
+        frame_size: int
+    ) -> None:
+        """
+        Accounts for a received frame and sends any change queued for
+        device; called from each stream's receive loop.  Budgets are
+        evaluated at most once per interval_s.
+        """
+        with self.lock:
+            self.bytes_received[device] = \
+                self.bytes_received.get(device, 0) + frame_size
+            change = self.changes.pop(device, None)
+
+        if change:
+            self._apply(device, *change)
+
+        if time.monotonic() - self.last_check >= self.interval_s:
+            self.check()
+
+    def _apply(
+        self,
+        device,
+        stream_channel: StreamChannel,
+        quality: tc.AvIOCtrlQuality
+    ) -> None:
+        if device.set_stream_quality(
+            stream_channel=stream_channel,
+            quality=quality,
+            wait=False
+        ):
+            return
+
+        # a failed demotion leaves the camera on its configured stream
+        if stream_channel == StreamChannel.SUB:
+            with self.lock:
+                self.demoted.pop(device, None)
+
+    def _over_budget(self, ratio: float = 1) -> bool:
+        return (
+            self.max_bandwidth_kbps != None
+            and self.bandwidth_kbps > self.max_bandwidth_kbps * ratio
+        ) or (
+            self.max_cpu_percent != None
+            and self.cpu_percent > self.max_cpu_percent * ratio
+        )
+
+    def check(self) -> None:
+        """
+        Measures usage since the last check and demotes or restores a single
+        camera if required.
+        """
+        if not self.lock.acquire(blocking=False):
+            return
+
+        try:
+            now = time.monotonic()
+            cpu = time.process_time()
+            elapsed = now - self.last_check
+
+            if elapsed <= 0:
+                return
+
+            usage = self.bytes_received
+            self.bytes_received = dict.fromkeys(usage, 0)
+            self.bandwidth_kbps = sum(usage.values()) * 8 / 1000 / elapsed
+            self.cpu_percent = (cpu - self.last_cpu) * 100 / elapsed
+            self.last_check = now
+            self.last_cpu = cpu
+
+            log.debug(
+                f'bandwidth_kbps={self.bandwidth_kbps:.0f}, '
+                f'cpu_percent={self.cpu_percent:.0f}'
+            )
+
+            if self._over_budget():
+                candidates = [
+                    d for d in usage
+                    if d.device_settings.stream_channel == StreamChannel.MAIN
+                    and d not in self.changes
+                ]
+                if not candidates:
+                    log.warn('over budget with every stream on substream')
+                    return
+
+                device = max(candidates, key=lambda d: usage[d])
+                log.info(f'over budget, dropping {device.uid} to substream')
+                settings = device.device_settings
+                self.demoted[device] = \
+                    (settings.stream_channel, settings.stream_quality)
+                self.changes[device] = \
+                    (StreamChannel.SUB, self.substream_quality)
+
+            elif self.demoted and not self._over_budget(GOVERNOR_RESTORE_RATIO):
+                device, (stream_channel, quality) = self.demoted.popitem()
+                log.info(f'under budget, restoring {device.uid} main stream')
+
+                self.changes[device] = (
+                    stream_channel,
+                    quality or tc.AvIOCtrlQuality.AVIOCTRL_QUALITY_MAX
+                )
+        finally:
+            self.lock.release()
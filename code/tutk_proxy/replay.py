@@ -0,0 +1,235 @@
+from array import array
+from typing import BinaryIO
+import mmap
+import os
+import threading
+import time
+import logging
+from .catalog import RecordingCatalog
+from .frames import TutkFrame
+from .sinks import (
+    FrameSink,
+    FileSink
+)
+from .h264 import iter_access_units
+from .utils import utc_offset
+from .constants import (
+    FrameFlag,
+    StreamFormat,
+    REPLAY_FRAME_RATE,
+    REPLAY_MAX_FRAME_GAP
+)
+
+log = logging.getLogger(__name__)
+
+
+class ReplaySource():
+    """
+    Plays a recorded .h264 file back as if it were a live stream: frames()
+    yields the same (TutkFrame, data) pairs and stream_to() feeds the same
+    sinks as TutkDevice, without a camera or the vendor library.
+
+    The recording is memory-mapped and indexed once on open.  Frame times
+    come from the catalog's keyframe times where the recording was
+    catalogued, otherwise frames are spaced at frame_rate.  speed paces
+    playback relative to real time (2.0 is twice as fast); None plays as
+    fast as the sinks accept frames.
+    """
+    def __init__(
+        self,
+        path: str,
+        catalog: RecordingCatalog = None,
+        speed: float = 1.0,
+        loop: bool = False,
+        frame_rate: float = REPLAY_FRAME_RATE
+    ) -> None:
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.stop_requested = threading.Event()
+        self.thread: threading.Thread = None
+
+        if os.path.getsize(path) == 0:
+            raise ValueError(f'{path} is empty')
+
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.offsets = array('Q')
+        self.sizes = array('I')
+        self.flags = array('B')
+
+        for offset, length, is_idr in iter_access_units(self.data):
+            self.offsets.append(offset)
+            self.sizes.append(length)
+            self.flags.append(
+                FrameFlag.IPC_FRAME_FLAG_IFRAME if is_idr
+                else FrameFlag.IPC_FRAME_FLAG_PBFRAME
+            )
+
+        keyframe_times = dict()
+        if catalog:
+            keyframe_times = {
+                offset: ts for ts, offset in catalog.keyframes(path)
+            }
+
+        # catalogued times are unix times; frames carry the device's clock
+        self.clock_offset = utc_offset() if keyframe_times else 0
+        self.times = self._frame_times(keyframe_times, 1 / frame_rate)
+
+        self.log.info(
+            f'indexed {len(self)} frames in {path}, '
+            f'catalogued={bool(keyframe_times)}'
+        )
+
+    def __enter__(self) -> 'ReplaySource':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, i: int) -> TutkFrame:
+        return TutkFrame(
+            codec_id=StreamFormat.MEDIA_CODEC_VIDEO_H264,
+            flags=self.flags[i],
+            timestamp=int(self.times[i] + self.clock_offset),
+            size=self.sizes[i],
+            frame_number=i,
+            offset=self.offsets[i]
+        )
+
+    def _frame_times(
+        self,
+        keyframe_times: dict,
+        interval: float
+    ) -> array:
+        """
+        Interpolates each frame's time between the catalogued keyframes
+        around it.
+        """
+        count = len(self)
+        times = array('d', bytes(8 * count))
+        anchors = [
+            (i, keyframe_times[self.offsets[i]]) for i in range(count)
+            if self.flags[i] and self.offsets[i] in keyframe_times
+        ]
+
+        if not anchors:
+            anchors = [(0, 0.0)]
+
+        first, first_ts = anchors[0]
+        for i in range(first):
+            times[i] = first_ts - (first - i) * interval
+
+        for (a, ts_a), (b, ts_b) in zip(
+            anchors,
+            anchors[1:] + [(count, None)]
+        ):
+            gop_interval = interval if ts_b is None \
+                else (ts_b - ts_a) / (b - a)
+
+            # recordings appended to the same file leave gaps between them
+            if not 0 < gop_interval <= REPLAY_MAX_FRAME_GAP:
+                gop_interval = interval
+
+            for i in range(a, b):
+                times[i] = ts_a + (i - a) * gop_interval
+
+        return times
+
+    def frames(self):
+        """
+        Yields (frame, data) for each frame, paced by speed, until the
+        recording ends (or forever if looping) or stop_stream() is called.
+        """
+        while True:
+            started = time.monotonic()
+            position = 0.0
+
+            for i in range(len(self)):
+                if self.stop_requested.is_set():
+                    return
+
+                # skip the gaps between recordings rather than wait them out
+                step = self.times[i] - self.times[i - 1] if i else 0
+                if 0 < step <= REPLAY_MAX_FRAME_GAP:
+                    position += step
+
+                if self.speed:
+                    delay = position / self.speed \
+                        - (time.monotonic() - started)
+
+                    if delay > 0 and self.stop_requested.wait(delay):
+                        return
+
+                offset = self.offsets[i]
+
+                yield self[i], self.data[offset:offset + self.sizes[i]]
+
+            if not self.loop:
+                return
+
+    def stop_stream(self) -> None:
+        self.stop_requested.set()
+
+    def _play(self, sinks: list[FrameSink]) -> None:
+        frame_count = 0
+        started = time.monotonic()
+
+        try:
+            for frame, data in self.frames():
+                for sink in sinks:
+                    sink.write(frame, data)
+
+                frame_count += 1
+        finally:
+            for sink in sinks:
+                sink.flush()
+                sink.close()
+
+        elapsed = time.monotonic() - started
+        self.log.info(
+            f'stopped replay, frames_sent={frame_count}, '
+            f'fps={frame_count / elapsed if elapsed else 0:.1f}'
+        )
+
+    def stream_to(
+        self,
+        dest_file: BinaryIO = None,
+        blocking: bool = True,
+        sinks: list[FrameSink] = None
+    ) -> None:
+        """
+        Writes frames to dest_file and any other sinks until the recording
+        ends or stop_stream() is called.  If not blocking, plays on a
+        background thread.
+        """
+        sinks = list(sinks or ())
+        if dest_file:
+            sinks.insert(0, FileSink(dest_file))
+
+        self.stop_requested.clear()
+
+        if blocking:
+            self._play(sinks)
+            return
+
+        self.thread = threading.Thread(
+            target=self._play,
+            args=(sinks,),
+            name='replay',
+            daemon=True
+        )
+        self.thread.start()
+
+    def close(self) -> None:
+        self.stop_stream()
+
+        if self.thread:
+            self.thread.join()
+
+        self.data.close()
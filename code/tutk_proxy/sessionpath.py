@@ -0,0 +1,349 @@
+from collections import deque
+import ctypes as c
+import statistics
+import threading
+import time
+import logging
+import tutk_wrapper.wrapper as tw
+import tutk_wrapper.models as tm
+import tutk_wrapper.exceptions as te
+from .connect import ConnectOperation
+from .capacity import session_capacity
+from .utils import utc_offset
+from .constants import (
+    IOTCSessionMode,
+    IOTC_AV_CHANNEL,
+    PATH_SAMPLE_INTERVAL,
+    PATH_MIGRATE_DEADLINE,
+    PATH_MIGRATE_BACKOFF,
+    PATH_DELAY_SAMPLES
+)
+
+log = logging.getLogger(__name__)
+
+
+class SessionPathStats():
+    """
+    Throughput and frame delay by session mode, across every stream in the
+    process, so relayed sessions can be compared with LAN and P2P ones.
+    Delay is from capture, by the device clock, to receipt, and is only
+    measured on keyframes from devices that stamp frames with their clock.
+    """
+    def __init__(self, samples: int = PATH_DELAY_SAMPLES) -> None:
+        self.lock = threading.Lock()
+        self.seconds = dict.fromkeys(IOTCSessionMode, 0.0)
+        self.bytes = dict.fromkeys(IOTCSessionMode, 0)
+        self.frames = dict.fromkeys(IOTCSessionMode, 0)
+        self.packets_rx = dict.fromkeys(IOTCSessionMode, 0)
+        self.delays: dict[IOTCSessionMode, deque] = {
+            mode: deque(maxlen=samples) for mode in IOTCSessionMode
+        }
+
+    def record_interval(
+        self,
+        mode: IOTCSessionMode,
+        seconds: float,
+        size: int,
+        frames: int,
+        packets_rx: int
+    ) -> None:
+        with self.lock:
+            self.seconds[mode] += seconds
+            self.bytes[mode] += size
+            self.frames[mode] += frames
+            self.packets_rx[mode] += packets_rx
+
+    def record_delay(
+        self,
+        mode: IOTCSessionMode,
+        seconds: float
+    ) -> None:
+        with self.lock:
+            self.delays[mode].append(seconds)
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Returns kbps, fps, packets/s and median delay in ms for each mode
+        seen.
+        """
+        with self.lock:
+            modes = [m for m in IOTCSessionMode if self.seconds[m]]
+
+            return {
+                m.name: {
+                    'kbps': round(self.bytes[m] * 8 / 1000 / self.seconds[m]),
+                    'fps': round(self.frames[m] / self.seconds[m], 1),
+                    'packets_rx_per_s':
+                        round(self.packets_rx[m] / self.seconds[m]),
+                    'median_delay_ms': round(
+                        statistics.median(self.delays[m]) * 1000
+                    ) if self.delays[m] else None
+                } for m in modes
+            }
+
+    def __repr__(self) -> str:
+        return f'SessionPathStats({self.summary()})'
+
+
+path_stats = SessionPathStats()
+
+
+class StandbySession():
+    """
+    A session and AV channel opened alongside a streaming one, ready to be
+    switched to.  It holds one of session_capacity's spare slots until it's
+    discarded or switched to.
+    """
+    __slots__ = (
+        'client_sid',
+        'device_sid',
+        'channel_id',
+        'resend_on',
+        'session_mode'
+    )
+
+    def __init__(
+        self,
+        client_sid: int,
+        device_sid: int,
+        session_mode: IOTCSessionMode
+    ) -> None:
+        self.client_sid = client_sid
+        self.device_sid = device_sid
+        self.session_mode = session_mode
+        self.channel_id: int = None
+        self.resend_on = False
+
+    def close(self) -> None:
+        if self.channel_id != None:
+            try:
+                tw.avClientStop(self.channel_id)
+            except te.TutkLibraryException as e:
+                log.warn(f'unable to stop standby av client: {e}')
+
+        tw.IOTC_Session_Close(self.device_sid)
+
+
+def session_mode(session_id: int) -> tuple[IOTCSessionMode, int]:
+    """
+    Returns a session's mode and received packet count.  Raises
+    TutkLibraryException if the session has failed.
+    """
+    ses_info = tm.st_SInfo()
+    tw.IOTC_Session_Check(session_id, ses_info)
+
+    return IOTCSessionMode(ses_info.Mode), ses_info.RX_Packetcount
+
+
+class SessionPathMonitor():
+    """
+    Samples a streaming device's session mode and packet counters every
+    interval_s, adding each interval's throughput to path_stats under the
+    mode it ran in.
+
+    If the device was found by LAN search but its session is relayed, a
+    standby session is connected and logged in on a thread while the relayed
+    stream carries on.  Relayed standbys are discarded, and another try is
+    made after backoff_s.  The stream switches to a ready standby at its
+    next keyframe (see TutkDevice._switch_session), so the output stays
+    decodable.
+    """
+    def __init__(
+        self,
+        device,
+        migrate: bool = True,
+        interval_s: float = PATH_SAMPLE_INTERVAL,
+        backoff_s: float = PATH_MIGRATE_BACKOFF
+    ) -> None:
+        self.device = device
+        self.migrate = migrate and device.ip_address != None
+        self.interval_s = interval_s
+        self.backoff_s = backoff_s
+        self.lock = threading.Lock()
+        self.standby: StandbySession = None
+        self.operation: ConnectOperation = None
+        self.thread: threading.Thread = None
+        self.closed = False
+        self.retry_at = 0.0
+        self.migrations = 0
+        self.mode: IOTCSessionMode = device.device_state.session_mode
+        self.bytes = 0
+        self.frames = 0
+        self.packets_rx = device.device_state.packets_rx
+        self.interval_start = time.monotonic()
+        self.next_sample = self.interval_start + interval_s
+
+    def record(self, size: int) -> None:
+        self.bytes += size
+        self.frames += 1
+
+    def record_keyframe(self, timestamp: int) -> None:
+        device_clock = self.device.frame_clock.seconds(timestamp)
+
+        if device_clock is None or self.mode is None:
+            return
+
+        path_stats.record_delay(
+            self.mode,
+            time.time() - (device_clock - utc_offset())
+        )
+
+    def reset(self) -> None:
+        """
+        Starts a new interval after switching sessions.
+        """
+        self._end_interval(time.monotonic())
+        self.mode = self.device.device_state.session_mode
+        self.packets_rx = self.device.device_state.packets_rx
+
+    def _end_interval(
+        self,
+        now: float,
+        packets_rx: int = None
+    ) -> None:
+        if self.mode is not None:
+            path_stats.record_interval(
+                self.mode,
+                now - self.interval_start,
+                self.bytes,
+                self.frames,
+                0 if packets_rx is None else
+                max(0, packets_rx - self.packets_rx)
+            )
+
+        self.bytes = 0
+        self.frames = 0
+        self.interval_start = now
+
+        if packets_rx is not None:
+            self.packets_rx = packets_rx
+
+    def sample(self, now: float = None) -> None:
+        """
+        Samples the session if due, and starts preparing a standby if it's
+        relayed.
+        """
+        now = time.monotonic() if now is None else now
+
+        if now < self.next_sample:
+            return
+
+        self.next_sample = now + self.interval_s
+        state = self.device.device_state
+
+        try:
+            mode, packets_rx = session_mode(state.device_sid)
+        except te.TutkLibraryException as e:
+            # the receive loop sees the failure too and ends the stream
+            log.warn(f'session check failed: {e}')
+            return
+
+        self._end_interval(now, packets_rx)
+
+        if mode != self.mode:
+            log.info(f'session mode is {mode.name}, uid={self.device.uid}')
+
+        self.mode = mode
+        state.session_mode = mode
+        state.packets_rx = packets_rx
+
+        if self.migrate and mode == IOTCSessionMode.RLY \
+            and now >= self.retry_at and self.thread is None \
+            and self.standby is None:
+            self.retry_at = now + self.backoff_s
+
+            if not session_capacity.acquire_spare():
+                log.info(
+                    f'no spare session for a standby, uid={self.device.uid}, '
+                    f'{session_capacity}'
+                )
+                return
+
+            self.thread = threading.Thread(
+                target=self._prepare,
+                name=f'standby-{self.device.uid}',
+                daemon=True
+            )
+            self.thread.start()
+
+    def _prepare(self) -> None:
+        log.info(f'session is relayed, preparing a standby session')
+        self.operation = ConnectOperation(
+            self.device.uid,
+            deadline_s=PATH_MIGRATE_DEADLINE
+        )
+        standby = None
+
+        try:
+            client_sid, device_sid = self.operation.run()
+            # held before anything else can fail, so it's always closed
+            standby = StandbySession(client_sid, device_sid, None)
+            mode, _ = session_mode(device_sid)
+            standby.session_mode = mode
+
+            if mode == IOTCSessionMode.RLY:
+                log.info(f'standby session is relayed too; discarding')
+                standby.close()
+                standby = None
+            else:
+                resend = c.c_int()
+                standby.channel_id = self.device._start_av_client(
+                    device_sid,
+                    resend,
+                    max(1, int(PATH_MIGRATE_DEADLINE))
+                )
+                standby.resend_on = resend.value == 1
+        except (te.TutkLibraryException, ValueError) as e:
+            log.warn(f'unable to prepare standby session: {e!r}')
+
+            if standby:
+                standby.close()
+                standby = None
+
+        with self.lock:
+            self.thread = None
+            self.operation = None
+
+            if self.closed and standby:
+                standby.close()
+                standby = None
+
+            self.standby = standby
+
+        if standby:
+            log.info(
+                f'standby session ready, mode={standby.session_mode.name}'
+            )
+        else:
+            session_capacity.release_spare()
+
+    def take_standby(self) -> StandbySession:
+        """
+        Returns the ready standby, if any, handing it over to the caller.
+        """
+        with self.lock:
+            standby, self.standby = self.standby, None
+
+        if standby:
+            self.migrations += 1
+
+        return standby
+
+    def close(self) -> None:
+        """
+        Ends the last interval and discards any standby, stopping one that's
+        still being prepared.
+        """
+        self._end_interval(time.monotonic())
+
+        with self.lock:
+            self.closed = True
+            standby, self.standby = self.standby, None
+            operation = self.operation
+
+        if operation:
+            operation.abort()
+
+        if standby:
+            standby.close()
+            session_capacity.release_spare()
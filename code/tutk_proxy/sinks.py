@@ -0,0 +1,47 @@
+from abc import (
+    ABC,
+    abstractmethod
+)
+from typing import BinaryIO
+from .frames import TutkFrame
+
+
+class FrameSink(ABC):
+    """
+    Receives frames from a stream.  write() is called from the receive loop,
+    so sinks should hand anything slow off to another thread or process.
+    """
+    @abstractmethod
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink(FrameSink):
+    """
+    Writes raw frames to a file.
+    """
+    def __init__(self, dest_file: BinaryIO) -> None:
+        self.dest_file = dest_file
+
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        self.dest_file.write(data)
+
+    def flush(self) -> None:
+        self.dest_file.flush()
+
+    def close(self) -> None:
+        self.dest_file.close()
@@ -0,0 +1,54 @@
+import threading
+from .frames import TutkFrame
+from .sinks import FrameSink
+from .h264 import parameter_sets
+
+
+class KeyframeCache(FrameSink):
+    """
+    Keeps the most recent keyframe of a stream, together with the latest SPS
+    and PPS, so that a decodable picture is always available without
+    touching the stream.  Only keyframes are inspected.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.frame: TutkFrame = None
+        self.idr: bytes = None
+        self.sps: bytes = None
+        self.pps: bytes = None
+
+    def write(
+        self,
+        frame: TutkFrame,
+        data: bytes
+    ) -> None:
+        if not frame.is_keyframe:
+            return
+
+        sps, pps = parameter_sets(data)
+
+        with self.lock:
+            self.frame = frame
+            self.idr = bytes(data)
+            self.sps = sps or self.sps
+            self.pps = pps or self.pps
+
+    def keyframe(self) -> tuple[TutkFrame, bytes]:
+        """
+        Returns the cached keyframe as a self-contained byte stream, with
+        parameter sets prepended if the keyframe didn't carry them.  Returns
+        (None, None) if no keyframe has been seen.
+        """
+        with self.lock:
+            if self.idr is None:
+                return None, None
+
+            sps, pps = parameter_sets(self.idr)
+            prefix = b''.join(
+                p for p in (
+                    None if sps else self.sps,
+                    None if pps else self.pps
+                ) if p
+            )
+
+            return self.frame, prefix + self.idr
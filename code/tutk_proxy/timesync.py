@@ -0,0 +1,186 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import logging
+from .utils import utc_offset
+from .constants import (
+    SYNC_INTERVAL,
+    SYNC_DRIFT_THRESHOLD,
+    SYNC_WORKERS,
+    DEVICE_EPOCH_MIN,
+    CLOCK_DETECT_WINDOW
+)
+
+log = logging.getLogger(__name__)
+
+# timestamp increase per second of local time; a clock in seconds advances
+# about 1, a millisecond counter about 1000
+CLOCK_RATE = (0.25, 4)
+COUNTER_RATE = (250, 4000)
+
+
+class FrameClock():
+    """
+    Works out whether a device stamps frames with its clock.  FRAMEINFO
+    timestamps are documented as milliseconds, and firmwares that follow that
+    fill them from an uptime counter, which passes DEVICE_EPOCH_MIN after
+    about two weeks of uptime.  Others stamp frames with the clock, in
+    local-time epoch seconds.  The two are told apart by how fast timestamps
+    advance over window_s seconds of local time; until they have been, and
+    for counters, timestamps aren't read as a clock.
+    """
+    def __init__(self, window_s: float = CLOCK_DETECT_WINDOW) -> None:
+        self.window_s = window_s
+        self.is_clock: bool = None
+        self.reference: tuple[int, float] = None
+        self.last_received_time: float = None
+
+    def observe(
+        self,
+        timestamp: int,
+        received_time: float = None
+    ) -> None:
+        """
+        Records a frame's timestamp and the unix time it was received.
+        """
+        received_time = time.time() if received_time is None \
+            else received_time
+        self.last_received_time = received_time
+
+        if self.is_clock is not None:
+            return
+
+        # a counter that wrapped or restarted starts a new window
+        if self.reference is None or timestamp < self.reference[0] \
+            or received_time < self.reference[1]:
+            self.reference = (timestamp, received_time)
+            return
+
+        elapsed = received_time - self.reference[1]
+
+        if elapsed < self.window_s:
+            return
+
+        rate = (timestamp - self.reference[0]) / elapsed
+
+        if CLOCK_RATE[0] <= rate <= CLOCK_RATE[1]:
+            self.is_clock = True
+        elif COUNTER_RATE[0] <= rate <= COUNTER_RATE[1]:
+            self.is_clock = False
+
+        if self.is_clock is not None:
+            log.info(
+                f'frame timestamps are '
+                f'{"the device clock" if self.is_clock else "a counter"}'
+            )
+
+        self.reference = (timestamp, received_time)
+
+    def reset(self) -> None:
+        """
+        Restarts detection's window, e.g. after the device clock was set.
+        """
+        self.reference = None
+
+    def seconds(self, timestamp: int) -> int:
+        """
+        Returns a timestamp as the device clock in local-time epoch seconds,
+        or None if timestamps aren't known to be the clock or it isn't set.
+        """
+        if not self.is_clock or timestamp < DEVICE_EPOCH_MIN:
+            return None
+
+        return timestamp
+
+
+def frame_time(
+    timestamp: int,
+    clock: FrameClock = None,
+    received_time: float = None
+) -> float:
+    """
+    Returns the unix time a frame was captured: the device clock from its
+    FRAMEINFO timestamp where clock knows it to be one, otherwise when it was
+    received.
+    """
+    device_clock = clock.seconds(timestamp) if clock else None
+
+    if device_clock is None:
+        return time.time() if received_time is None else received_time
+
+    return device_clock - utc_offset()
+
+
+class TimeSyncDaemon():
+    """
+    Keeps the clocks of the devices in a TutkSessionPool in sync.  Sessions
+    are leased from the pool, so they stay open between rounds and are
+    health-checked before use; devices are synced in parallel, and clocks
+    that can be read from frame timestamps are only corrected once they
+    drift past drift_threshold_s.  The pool's connect deadline keeps offline
+    cameras from holding up a round.
+    """
+    def __init__(
+        self,
+        pool,
+        interval_s: float = SYNC_INTERVAL,
+        drift_threshold_s: float = SYNC_DRIFT_THRESHOLD,
+        max_workers: int = SYNC_WORKERS
+    ) -> None:
+        self.pool = pool
+        self.interval_s = interval_s
+        self.drift_threshold_s = drift_threshold_s
+        self.max_workers = max_workers
+        self.stopped = threading.Event()
+
+    def _sync_device(self, uid: str) -> bool:
+        try:
+            with self.pool.lease(uid) as device:
+                drift = device.measure_clock_drift()
+
+                if drift != None and abs(drift) <= self.drift_threshold_s:
+                    log.info(f'{uid} drift {drift:.1f}s is within threshold')
+                    return True
+
+                return device.sync_time()
+        except ConnectionError as e:
+            log.warn(f'unable to connect to {uid}: {e}')
+            return False
+        except Exception as e:
+            # e.g. TutkLibraryException; one device mustn't end the round
+            log.warn(f'unable to sync {uid}: {e!r}')
+            return False
+
+    def sync_all(self) -> dict:
+        """
+        Syncs every device once and returns {uid: success}.
+        """
+        uids = self.pool.uids()
+
+        if not uids:
+            return dict()
+
+        workers = min(self.max_workers, len(uids))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self._sync_device, uids)
+
+            return dict(zip(uids, results))
+
+    def run(self) -> None:
+        """
+        Syncs all devices every interval_s until stop() is called.
+        """
+        while not self.stopped.is_set():
+            results = self.sync_all()
+            failed = [uid for uid, success in results.items() if not success]
+
+            log.info(
+                f'synced {len(results) - len(failed)}/{len(results)} devices'
+                f'{", failed: " + ", ".join(failed) if failed else ""}'
+            )
+
+            self.stopped.wait(self.interval_s)
+
+    def stop(self) -> None:
+        self.stopped.set()
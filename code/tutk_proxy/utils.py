@@ -0,0 +1,22 @@
+import datetime
+import time
+
+
+def utc_offset() -> float:
+    """
+    Returns the number of seconds local time is ahead of UTC.
+    """
+    return (
+        datetime.datetime.now()
+        - datetime.datetime.utcnow()
+    ).total_seconds()
+
+
+def local_epoch(timestamp: float = None) -> float:
+    """
+    Returns a unix timestamp shifted to local time, which is how devices keep
+    their clocks.
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+
+    return timestamp + utc_offset()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import select
+import threading
+import logging
+import tutk_wrapper.wrapper as tw
+import tutk_wrapper.exceptions as te
+from tutk_wrapper.models import SESSION_CHANNEL_RECV_CB
+from .constants import IOTC_AV_CHANNEL
+
+log = logging.getLogger(__name__)
+
+
+class ChannelWakeup():
+    """
+    Wakes a receive loop when data arrives on an IOTC channel, rather than it
+    polling every 10ms.  A callback registered with
+    IOTC_Session_Set_Channel_RcvCb signals an eventfd (a pipe where eventfd
+    isn't available); wait() blocks on it, and fileno() can be added to an
+    asyncio loop or selector.
+
+    The callback only signals.  Frames are still read with avRecvFrameData2,
+    so the AV module's reassembly and resend handling are unchanged.
+
+    signal() may be called from any thread, racing close(); once closed it
+    does nothing, so it never writes to a descriptor number that has since
+    been reused.
+    """
+    def __init__(
+        self,
+        session_id: int,
+        channel_id: int = IOTC_AV_CHANNEL
+    ) -> None:
+        self.session_id = session_id
+        self.channel_id = channel_id
+        self.callbacks = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+        if hasattr(os, 'eventfd'):
+            self.read_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self.write_fd = self.read_fd
+        else:
+            self.read_fd, self.write_fd = os.pipe()
+            os.set_blocking(self.read_fd, False)
+            os.set_blocking(self.write_fd, False)
+
+        # referenced for as long as the library may call it
+        self.callback = SESSION_CHANNEL_RECV_CB(self._on_data)
+
+        try:
+            tw.IOTC_Session_Set_Channel_RcvCb(
+                session_id,
+                channel_id,
+                self.callback
+            )
+        except Exception:
+            self._close_fds()
+            raise
+
+    def _on_data(
+        self,
+        session_id: int,
+        channel_id: int,
+        data,
+        size: int,
+        user_data
+    ) -> None:
+        self.callbacks += 1
+        self.signal()
+
+    def fileno(self) -> int:
+        return self.read_fd
+
+    def signal(self) -> None:
+        """
+        Wakes the waiter, e.g. to stop a stream without waiting for data.
+        """
+        with self.lock:
+            if self.closed:
+                return
+
+            try:
+                if self.write_fd == self.read_fd:
+                    os.eventfd_write(self.write_fd, 1)
+                else:
+                    os.write(self.write_fd, b'\0')
+            except BlockingIOError:
+                # already signalled and not yet consumed
+                pass
+
+    def _consume(self) -> None:
+        try:
+            if self.write_fd == self.read_fd:
+                os.eventfd_read(self.read_fd)
+            else:
+                while os.read(self.read_fd, 4096):
+                    pass
+        except BlockingIOError:
+            pass
+
+    def wait(self, timeout_s: float = None) -> bool:
+        """
+        Blocks until data arrives or timeout_s passes.  Returns True if woken
+        by a signal.
+        """
+        ready, _, _ = select.select([self.read_fd], [], [], timeout_s)
+
+        if not ready:
+            return False
+
+        self._consume()
+
+        return True
+
+    async def wait_async(self, timeout_s: float = None) -> bool:
+        """
+        As wait(), without blocking the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        woken = loop.create_future()
+        loop.add_reader(
+            self.read_fd,
+            lambda: woken.done() or woken.set_result(True)
+        )
+
+        try:
+            await asyncio.wait_for(woken, timeout_s)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(self.read_fd)
+
+        self._consume()
+
+        return True
+
+    def _close_fds(self) -> None:
+        os.close(self.read_fd)
+
+        if self.write_fd != self.read_fd:
+            os.close(self.write_fd)
+
+    def close(self) -> None:
+        """
+        Unregisters the callback and closes the file descriptors.
+        """
+        # unregistered outside the lock, since a callback in progress may be
+        # waiting on it
+        try:
+            tw.IOTC_Session_Set_Channel_RcvCb(
+                self.session_id,
+                self.channel_id,
+                None
+            )
+        except (te.TutkLibraryException, te.TutkLibraryNotLoadedException) \
+            as e:
+            log.warn(f'unable to unregister channel callback: {e!r}')
+
+        with self.lock:
+            if self.closed:
+                return
+
+            self.closed = True
+            self._close_fds()
@@ -0,0 +1,651 @@
+from dataclasses import replace
+from multiprocessing.connection import (
+    Connection,
+    wait
+)
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import logging
+from . import proxy
+from .models import (
+    TutkDevice,
+    TutkDeviceSettings,
+    TutkDeviceStreamInfo
+)
+from .framebus import (
+    FrameBusWriter,
+    FrameBusReader,
+    frame_bus_name
+)
+from .sinks import FrameSink
+from .constants import (
+    CONNECT_DEADLINE,
+    FLEET_DEFAULT_DEVICES,
+    FRAME_BUS_POLL_INTERVAL,
+    WORKER_STATUS_INTERVAL,
+    WORKER_RECONNECT_INTERVAL,
+    WORKER_RESTART_BACKOFF,
+    WORKER_RESTART_MAX_BACKOFF,
+    WORKER_EXIT_TIMEOUT
+)
+
+log = logging.getLogger(__name__)
+
+
+def run_camera(
+    device: TutkDevice,
+    stopped: threading.Event,
+    after: threading.Thread = None
+) -> None:
+    """
+    Streams a camera into its frame bus until stopped, reconnecting after
+    the session fails.  If the camera is still being stopped by an earlier
+    run (after), waits for that first so the bus has one writer.
+    """
+    if after:
+        after.join()
+
+    while not stopped.is_set():
+        if device.open(CONNECT_DEADLINE) and not stopped.is_set():
+            device.stream_to(
+                blocking=True,
+                sinks=[FrameBusWriter.attach(frame_bus_name(device.uid))]
+            )
+
+        device.disconnect()
+        stopped.wait(WORKER_RECONNECT_INTERVAL)
+
+
+def worker_main(
+    worker_id: int,
+    conn: Connection,
+    library_path: str,
+    lan_first: bool,
+    max_devices: int,
+    log_level: int
+) -> None:
+    """
+    Entry point of a worker process.  Loads the vendor library, streams the
+    cameras the supervisor sends it into their frame buses, and reports
+    their stream_info every WORKER_STATUS_INTERVAL.
+    """
+    logging.basicConfig(
+        level=log_level,
+        format=f'%(asctime)s [%(levelname)s] [worker-{worker_id}] '
+        f'[%(name)s.%(funcName)s]: %(message)s'
+    )
+
+    # the supervisor stops workers; a terminal's ctrl-c reaches them too
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    proxy.initialise(
+        library_path=library_path,
+        lan_first=lan_first,
+        max_devices=max_devices
+    )
+
+    cameras: dict[str, tuple[TutkDevice, threading.Event, threading.Thread]] \
+        = dict()
+    # threads stopping cameras, which can take up to WORKER_EXIT_TIMEOUT
+    stopping: dict[str, threading.Thread] = dict()
+    send_lock = threading.Lock()
+    next_status = time.monotonic()
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def stop_camera(
+        device: TutkDevice,
+        stopped: threading.Event,
+        thread: threading.Thread
+    ) -> None:
+        stopped.set()
+        device.stop_stream()
+        device.abort()
+        thread.join(WORKER_EXIT_TIMEOUT)
+
+    def stop_and_report(uid: str, *camera) -> None:
+        stop_camera(*camera)
+
+        try:
+            # the camera may now start elsewhere, on the same bus
+            send(('stopped', uid))
+        except (EOFError, OSError):
+            pass
+
+    try:
+        while True:
+            if conn.poll(max(0, next_status - time.monotonic())):
+                command, *args = conn.recv()
+
+                if command == 'start':
+                    uid, settings, ip_address, port = args
+
+                    if uid in cameras:
+                        continue
+
+                    device = TutkDevice(
+                        uid=uid,
+                        ip_address=ip_address,
+                        port=port,
+                        device_settings=settings
+                    )
+                    stopped = threading.Event()
+                    thread = threading.Thread(
+                        target=run_camera,
+                        args=(device, stopped, stopping.get(uid)),
+                        name=f'camera-{uid}',
+                        daemon=True
+                    )
+                    cameras[uid] = (device, stopped, thread)
+                    thread.start()
+
+                elif command == 'stop':
+                    uid, = args
+
+                    for done in [u for u, t in stopping.items()
+                                 if not t.is_alive()]:
+                        del stopping[done]
+
+                    if uid not in cameras:
+                        send(('stopped', uid))
+                        continue
+
+                    # off this loop, so status and other commands carry on
+                    stopper = threading.Thread(
+                        target=stop_and_report,
+                        args=(uid, *cameras.pop(uid)),
+                        name=f'stop-{uid}',
+                        daemon=True
+                    )
+                    stopping[uid] = stopper
+                    stopper.start()
+
+                elif command == 'exit':
+                    break
+
+            if time.monotonic() >= next_status:
+                next_status = time.monotonic() + WORKER_STATUS_INTERVAL
+                send(('status', {
+                    uid: replace(device.stream_info, last_frame_jpg=None)
+                    for uid, (device, _, _) in cameras.items()
+                }))
+    except (EOFError, OSError):
+        log.warn(f'lost supervisor, stopping')
+    finally:
+        devices = [device for device, _, _ in cameras.values()]
+
+        for camera in cameras.values():
+            stop_camera(*camera)
+
+        for stopper in stopping.values():
+            stopper.join()
+
+        proxy.shutdown(devices)
+
+
+def scan_main(
+    conn: Connection,
+    library_path: str,
+    lan_first: bool,
+    timeout_ms: int,
+    max_devices: int,
+    log_level: int
+) -> None:
+    """
+    Entry point of the process a supervisor searches the LAN from, so the
+    vendor library is never loaded in the supervisor itself.  Sends back
+    {uid: (ip_address, port)} for the devices found.
+    """
+    logging.basicConfig(
+        level=log_level,
+        format='%(asctime)s [%(levelname)s] [scan] '
+        '[%(name)s.%(funcName)s]: %(message)s'
+    )
+
+    proxy.initialise(library_path=library_path, lan_first=lan_first)
+
+    try:
+        devices = proxy.scan_local_subnet(
+            timeout_ms=timeout_ms,
+            max_devices_to_return=max_devices
+        )
+        conn.send({d.uid: (d.ip_address, d.port) for d in devices})
+    finally:
+        proxy.shutdown()
+
+
+class WorkerHandle():
+    __slots__ = (
+        'worker_id',
+        'process',
+        'conn',
+        'uids',
+        'crashes',
+        'restart_at'
+    )
+
+    def __init__(self, worker_id: int) -> None:
+        self.worker_id = worker_id
+        self.process: multiprocessing.Process = None
+        self.conn: Connection = None
+        self.uids: set[str] = set()
+        self.crashes = 0
+        self.restart_at = 0.0
+
+    def alive(self) -> bool:
+        return self.process is not None
+
+
+class WorkerSupervisor():
+    """
+    Spreads cameras over worker processes, each loading its own copy of the
+    vendor library, so receiving scales past one interpreter's GIL and a
+    crash in the library only takes down one shard.
+
+    Each camera's frames come back over its frame bus (frame_bus_name), which
+    the supervisor creates and keeps across worker restarts; other local
+    processes can read it too.  A collector thread writes frames to any
+    sinks given to add().  When a worker dies, its cameras move to the
+    remaining workers and it is restarted after a backoff that doubles with
+    each crash; once it's back, cameras are moved onto it until the load is
+    even again.  A camera only starts on its new worker once the old one
+    has stopped it, so one bus never has two writers.  stream_infos holds
+    each camera's latest stream_info.
+
+    Workers connect to cameras with the addresses found by scan(), so LAN
+    connects and relay migration work as they do for a single device.
+    """
+    def __init__(
+        self,
+        workers: int = None,
+        library_path: str = 'tutk_wrapper/lib/libIOTCAPIs_ALL.so',
+        lan_first: bool = False,
+        max_devices: int = FLEET_DEFAULT_DEVICES,
+        log_level: int = logging.INFO
+    ) -> None:
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = [
+            WorkerHandle(i) for i in range(workers or os.cpu_count() or 1)
+        ]
+        self.library_path = library_path
+        self.lan_first = lan_first
+        self.max_devices = max_devices
+        self.log_level = log_level
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.settings: dict[str, TutkDeviceSettings] = dict()
+        self.buses: dict[str, FrameBusWriter] = dict()
+        self.readers: dict[str, tuple[FrameBusReader, list[FrameSink]]] = \
+            dict()
+        # readers removed while the collector may still be using them
+        self.retired: list[tuple[FrameBusReader, list[FrameSink]]] = list()
+        self.unassigned: list[str] = list()
+        self.moving: dict[str, WorkerHandle] = dict()
+        self.addresses: dict[str, tuple[str, int]] = dict()
+        self.stream_infos: dict[str, TutkDeviceStreamInfo] = dict()
+        self.threads = [
+            threading.Thread(target=self._supervise, name='supervisor'),
+            threading.Thread(target=self._collect, name='collector')
+        ]
+
+    def start(self) -> None:
+        with self.lock:
+            for worker in self.workers:
+                self._spawn(worker)
+
+        for thread in self.threads:
+            thread.start()
+
+    def scan(self, timeout_ms: int) -> dict[str, tuple[str, int]]:
+        """
+        Searches the LAN once, in a child process, and returns {uid:
+        (ip_address, port)} for the devices found.  Cameras added later
+        are started with their address.
+        """
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=scan_main,
+            args=(
+                child_conn,
+                self.library_path,
+                self.lan_first,
+                timeout_ms,
+                max(self.max_devices, 10),
+                self.log_level
+            ),
+            name='scan',
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        addresses = dict()
+
+        try:
+            if parent_conn.poll(timeout_ms / 1000 + WORKER_EXIT_TIMEOUT):
+                addresses = parent_conn.recv()
+        except (EOFError, OSError) as e:
+            log.warn(f'scan failed, connecting without addresses: {e!r}')
+        finally:
+            parent_conn.close()
+            process.join(WORKER_EXIT_TIMEOUT)
+
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+        log.info(f'found {len(addresses)} devices on the LAN')
+
+        with self.lock:
+            self.addresses.update(addresses)
+
+        return addresses
+
+    def _spawn(self, worker: WorkerHandle) -> None:
+        parent_conn, child_conn = self.context.Pipe()
+        worker.conn = parent_conn
+        worker.process = self.context.Process(
+            target=worker_main,
+            args=(
+                worker.worker_id,
+                child_conn,
+                self.library_path,
+                self.lan_first,
+                # a worker may take over every camera
+                self.max_devices,
+                self.log_level
+            ),
+            name=f'worker-{worker.worker_id}',
+            daemon=True
+        )
+        worker.process.start()
+        child_conn.close()
+
+        log.info(
+            f'started worker {worker.worker_id}, pid={worker.process.pid}'
+        )
+
+    def _send(
+        self,
+        worker: WorkerHandle,
+        message: tuple
+    ) -> None:
+        try:
+            worker.conn.send(message)
+        except (BrokenPipeError, OSError) as e:
+            # _supervise sees the exit and re-homes its cameras
+            log.warn(f'unable to reach worker {worker.worker_id}: {e!r}')
+
+    def _assign(self, uid: str) -> None:
+        live = [w for w in self.workers if w.alive()]
+
+        if not live:
+            self.unassigned.append(uid)
+            return
+
+        worker = min(live, key=lambda w: len(w.uids))
+        worker.uids.add(uid)
+        ip_address, port = self.addresses.get(uid, (None, 0))
+        self._send(
+            worker,
+            ('start', uid, self.settings[uid], ip_address, port)
+        )
+
+        log.info(f'assigned {uid} to worker {worker.worker_id}')
+
+    def _rebalance(self) -> None:
+        """
+        Moves cameras off workers holding more than their share.  Each is
+        stopped first and assigned again once its worker reports it stopped
+        (see _on_stopped), which puts it on the least loaded worker.
+        """
+        live = [w for w in self.workers if w.alive()]
+
+        if not live:
+            return
+
+        total = sum(len(w.uids) for w in live) + len(self.moving)
+        share = -(-total // len(live))
+
+        for worker in live:
+            for uid in sorted(worker.uids)[share:]:
+                log.info(f'moving {uid} off worker {worker.worker_id}')
+                worker.uids.discard(uid)
+                self.stream_infos.pop(uid, None)
+                self.moving[uid] = worker
+                self._send(worker, ('stop', uid))
+
+    def _on_stopped(
+        self,
+        worker: WorkerHandle,
+        uid: str
+    ) -> None:
+        if self.moving.get(uid) is worker:
+            del self.moving[uid]
+            self._assign(uid)
+
+    def add(
+        self,
+        uid: str,
+        settings: TutkDeviceSettings,
+        sinks: list[FrameSink] = None
+    ) -> None:
+        """
+        Starts streaming a camera on the least loaded worker.
+        """
+        name = frame_bus_name(uid)
+
+        bus = FrameBusWriter.create(name)
+
+        with self.lock:
+            self.settings[uid] = settings
+            self.buses[uid] = bus
+
+            if sinks:
+                self.readers[uid] = (FrameBusReader(name), sinks)
+
+            self._assign(uid)
+
+    def remove(self, uid: str) -> None:
+        """
+        Stops streaming a camera and releases its frame bus.  Its reader and
+        sinks are closed by the collector, between reads.
+        """
+        with self.lock:
+            for worker in self.workers:
+                if uid in worker.uids:
+                    worker.uids.discard(uid)
+                    self._send(worker, ('stop', uid))
+
+            if uid in self.unassigned:
+                self.unassigned.remove(uid)
+
+            self.moving.pop(uid, None)
+
+            self.settings.pop(uid, None)
+            self.stream_infos.pop(uid, None)
+            reader = self.readers.pop(uid, None)
+            bus = self.buses.pop(uid)
+
+            if reader:
+                self.retired.append(reader)
+
+        bus.close()
+
+    def _on_exit(self, worker: WorkerHandle) -> None:
+        exitcode = worker.process.exitcode
+        cause = f'signal {signal.Signals(-exitcode).name}' \
+            if exitcode is not None and exitcode < 0 else f'code {exitcode}'
+
+        # including cameras it was asked to give up but hadn't yet
+        orphans = sorted(worker.uids | {
+            uid for uid, w in self.moving.items() if w is worker
+        })
+        worker.uids.clear()
+
+        for uid in orphans:
+            self.moving.pop(uid, None)
+
+        worker.process = None
+        worker.conn.close()
+        worker.crashes += 1
+        backoff = min(
+            WORKER_RESTART_BACKOFF * 2 ** (worker.crashes - 1),
+            WORKER_RESTART_MAX_BACKOFF
+        )
+        worker.restart_at = time.monotonic() + backoff
+
+        log.error(
+            f'worker {worker.worker_id} exited with {cause}, re-homing '
+            f'{len(orphans)} cameras, restarting in {backoff}s'
+        )
+
+        for uid in orphans:
+            self._assign(uid)
+
+    def _supervise(self) -> None:
+        while not self.stopped.is_set():
+            with self.lock:
+                live = [w for w in self.workers if w.alive()]
+                handles = {w.conn: w for w in live}
+                handles.update({w.process.sentinel: w for w in live})
+
+            for ready in wait(list(handles), WORKER_STATUS_INTERVAL):
+                worker = handles[ready]
+
+                if ready is worker.conn:
+                    try:
+                        kind, payload = worker.conn.recv()
+                    except (EOFError, OSError):
+                        continue
+
+                    with self.lock:
+                        if kind == 'stopped':
+                            self._on_stopped(worker, payload)
+                            continue
+
+                        self.stream_infos.update({
+                            uid: info for uid, info in payload.items()
+                            if uid in worker.uids
+                        })
+
+            if self.stopped.is_set():
+                break
+
+            now = time.monotonic()
+
+            with self.lock:
+                for worker in self.workers:
+                    if worker.alive() and not worker.process.is_alive():
+                        self._on_exit(worker)
+
+                respawned = False
+
+                for worker in self.workers:
+                    if not worker.alive() and now >= worker.restart_at:
+                        self._spawn(worker)
+                        respawned = True
+
+                unassigned, self.unassigned = self.unassigned, list()
+
+                for uid in unassigned:
+                    self._assign(uid)
+
+                if respawned:
+                    self._rebalance()
+
+    def _close_sink(self, sink: FrameSink) -> None:
+        try:
+            sink.flush()
+            sink.close()
+        except Exception as e:
+            log.warn(f'unable to close sink {sink!r}: {e!r}')
+
+    def _close_readers(
+        self,
+        readers: list[tuple[FrameBusReader, list[FrameSink]]]
+    ) -> None:
+        for reader, sinks in readers:
+            reader.close()
+
+            for sink in sinks:
+                self._close_sink(sink)
+
+    def _collect(self) -> None:
+        while not self.stopped.is_set():
+            with self.lock:
+                readers = list(self.readers.values())
+                retired, self.retired = self.retired, list()
+
+            # removed before this pass began, so no longer being read
+            self._close_readers(retired)
+
+            received = 0
+
+            for reader, sinks in readers:
+                while True:
+                    frame, data = reader.read()
+
+                    if frame is None:
+                        break
+
+                    received += 1
+
+                    for sink in list(sinks):
+                        try:
+                            sink.write(frame, data)
+                        except Exception as e:
+                            # one bad sink mustn't stop the others recording
+                            log.warn(f'dropping sink {sink!r}: {e!r}')
+                            sinks.remove(sink)
+                            self._close_sink(sink)
+
+            if not received:
+                time.sleep(FRAME_BUS_POLL_INTERVAL)
+
+    def wait(self) -> None:
+        """
+        Blocks until stop() is called.
+        """
+        self.stopped.wait()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def close(self) -> None:
+        """
+        Stops every worker, then the collector, and releases frame buses.
+        """
+        self.stopped.set()
+
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join()
+
+        live = [w for w in self.workers if w.alive()]
+
+        for worker in live:
+            self._send(worker, ('exit',))
+
+        for worker in live:
+            worker.process.join(WORKER_EXIT_TIMEOUT)
+
+            if worker.process.is_alive():
+                log.warn(f'worker {worker.worker_id} didn\'t exit, killing')
+                worker.process.kill()
+                worker.process.join()
+
+            worker.uids.clear()
+
+        for uid in list(self.buses):
+            self.remove(uid)
+
+        # the collector has exited, so nothing else will close these
+        with self.lock:
+            retired, self.retired = self.retired, list()
+
+        self._close_readers(retired)
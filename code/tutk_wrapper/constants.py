@@ -106,6 +106,15 @@ class AVErrorCode(IntEnum):
     AV_ER_DASA_CLEAN_BUFFER = -20032
 
 
+class AvIOCtrlQuality(IntEnum):
+    AVIOCTRL_QUALITY_UNKNOWN = 0x00
+    AVIOCTRL_QUALITY_MAX = 0x01
+    AVIOCTRL_QUALITY_HIGH = 0x02
+    AVIOCTRL_QUALITY_MIDDLE = 0x03
+    AVIOCTRL_QUALITY_LOW = 0x04
+    AVIOCTRL_QUALITY_MIN = 0x05
+
+
 class AvIOCtrlMsgType(IntEnum):
     IOTYPE_INNER_SND_DATA_DELAY = 0xFF
     
@@ -94,3 +94,66 @@ class st_LanSearchInfo2(c.Structure):
         ("DeviceName", c.c_byte * 129),
         ("Reserved", c.c_byte)
     ]
+
+
+class SMsgAVIoctrlAVStream(c.Structure):
+    """
+    Payload for IOTYPE_USER_IPCAM_START/STOP and related stream messages.
+    """
+
+    """
+    unsigned int channel; // Camera Index
+    unsigned char reserved[4];
+    """
+    _fields_ = [
+        ("channel", c.c_uint),
+        ("reserved", c.c_ubyte * 4)
+    ]
+
+
+class SMsgAVIoctrlSetStreamCtrlReq(c.Structure):
+    """
+    Payload for IOTYPE_USER_IPCAM_SETSTREAMCTRL_REQ.
+    """
+
+    """
+    unsigned int channel; // Camera Index
+    unsigned char quality; //refer to ENUM_QUALITY_LEVEL
+    unsigned char reserved[3];
+    """
+    _fields_ = [
+        ("channel", c.c_uint),
+        ("quality", c.c_ubyte),
+        ("reserved", c.c_ubyte * 3)
+    ]
+
+
+class SMsgAVIoctrlSetStreamCtrlResp(c.Structure):
+    """
+    Payload for IOTYPE_USER_IPCAM_SETSTREAMCTRL_RESP.
+    """
+
+    """
+    int result; // 0: success; otherwise: failed.
+    unsigned char reserved[4];
+    """
+    _fields_ = [
+        ("result", c.c_int),
+        ("reserved", c.c_ubyte * 4)
+    ]
+
+
+"""
+typedef void (*sessionChannelRecvCB)(int nIOTCSessionID,
+    unsigned char nIOTCChannelID, char *pData, int nSize, void *pUserData);
+
+Called on a library thread when data arrives on an IOTC channel.
+"""
+SESSION_CHANNEL_RECV_CB = c.CFUNCTYPE(
+    None,
+    c.c_int,
+    c.c_ubyte,
+    c.POINTER(c.c_char),
+    c.c_int,
+    c.c_void_p
+)
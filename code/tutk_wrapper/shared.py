@@ -1,4 +1,7 @@
 import ctypes as c
 
 library_instance: c.CDLL = None
-av_initialized: bool = False
\ No newline at end of file
+av_initialized: bool = False
+
+# library functions with their prototype set, by name; see wrapper.prototype
+prototypes: dict = dict()
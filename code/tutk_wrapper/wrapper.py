@@ -19,12 +19,49 @@ from .exceptions import (
 from .models import (
     st_SInfo,
     st_LanSearchInfo2,
-    FRAMEINFO
+    FRAMEINFO,
+    SESSION_CHANNEL_RECV_CB
 )
 import tutk_wrapper.shared as shared
 
 logger = logging.getLogger(__name__)
 
+# argtypes and restype of functions called through prototype()
+PROTOTYPES = {
+    'avRecvFrameData2': (
+        (
+            c.c_int,
+            c.POINTER(c.c_char),
+            c.c_int,
+            c.POINTER(c.c_int),
+            c.POINTER(c.c_int),
+            c.POINTER(FRAMEINFO),
+            c.c_int,
+            c.POINTER(c.c_int),
+            c.POINTER(c.c_int)
+        ),
+        c.c_int
+    )
+}
+
+
+def prototype(name: str):
+    """
+    Returns a library function with its argtypes and restype from PROTOTYPES
+    set, doing so once per loaded library rather than on every call.
+    """
+    func = shared.prototypes.get(name)
+
+    if func is None:
+        if not shared.library_instance:
+            raise TutkLibraryNotLoadedException()
+
+        func = getattr(shared.library_instance, name)
+        func.argtypes, func.restype = PROTOTYPES[name]
+        shared.prototypes[name] = func
+
+    return func
+
 
 @log_args
 def initialise(library_path: str='tutk_wrapper/lib/libIOTCAPIs_ALL.so') \
@@ -35,6 +72,7 @@ def initialise(library_path: str='tutk_wrapper/lib/libIOTCAPIs_ALL.so') \
 
     try:
         shared.library_instance = c.CDLL(library_path)
+        shared.prototypes.clear()
         logger.info(f'successfully loaded library at {library_path}')
 
     except OSError:
@@ -44,11 +82,11 @@ def initialise(library_path: str='tutk_wrapper/lib/libIOTCAPIs_ALL.so') \
 
 @requires_tutk_library
 @log_args
-def avInitialize(max_channel_num: c.c_int = 1) -> None:
+def avInitialize(max_channel_num: c.c_int = 1) -> c.c_int:
     """
     This function is used by AV servers or AV clients to initialize AV
     module and shall be called before any AV module related function
-    is invoked.
+    is invoked.  Returns the number of AV channels actually allocated.
     """
     func = shared.library_instance.avInitialize
     func.argtypes = (c.c_int,)
@@ -61,6 +99,8 @@ def avInitialize(max_channel_num: c.c_int = 1) -> None:
     
     shared.av_initialized = True
 
+    return rc
+
 
 @requires_av_initialized
 @requires_tutk_library
@@ -78,6 +118,8 @@ def avDeInitialize() -> None:
     if rc != AVErrorCode.AV_ER_NoERROR:
         raise TutkLibraryException(AVErrorCode(rc))
 
+    shared.av_initialized = False
+
 
 @requires_av_initialized
 @requires_tutk_library
@@ -97,6 +139,54 @@ def avClientCleanBuf(channel_id: c.c_int = 1) -> None:
         raise TutkLibraryException(AVErrorCode(rc))
 
 
+@requires_av_initialized
+@requires_tutk_library
+@log_args
+def avClientCleanVideoBuf(channel_id: c.c_int) -> None:
+    """
+    Discards the video frames an AV client has received but not yet read,
+    e.g. to catch up with live video after falling behind.
+    """
+    func = shared.library_instance.avClientCleanVideoBuf
+    func.argtypes = (c.c_int,)
+    func.restype = c.c_int
+
+    rc = shared.library_instance.avClientCleanVideoBuf(channel_id)
+
+    if rc != AVErrorCode.AV_ER_NoERROR:
+        raise TutkLibraryException(AVErrorCode(rc))
+
+
+@requires_av_initialized
+@requires_tutk_library
+@log_args
+def avClientSetMaxBufSize(max_buf_size_kb: c.c_uint) -> None:
+    """
+    Sets the size, in kilobytes, of the video buffer of AV clients started
+    after this call.  The setting is process-wide.
+    """
+    func = shared.library_instance.avClientSetMaxBufSize
+    func.argtypes = (c.c_uint,)
+    func.restype = None
+
+    shared.library_instance.avClientSetMaxBufSize(max_buf_size_kb)
+
+
+@requires_av_initialized
+@requires_tutk_library
+@log_args
+def avResendBufUsageRate(channel_id: c.c_int) -> float:
+    """
+    Returns how full an AV client's resend buffer is, from 0 to 1.  Usage
+    that stays high means frames are arriving faster than they're read.
+    """
+    func = shared.library_instance.avResendBufUsageRate
+    func.argtypes = (c.c_int,)
+    func.restype = c.c_float
+
+    return shared.library_instance.avResendBufUsageRate(channel_id)
+
+
 @requires_av_initialized
 @requires_tutk_library
 @log_args
@@ -146,6 +236,42 @@ def avRecvFrameData2(
     return rc
 
 
+def avRecvFrameData2_rc(
+    channel_id: c.c_int,
+    frame_data_buffer: c.POINTER(c.c_char),
+    frame_data_buffer_size: c.c_int,
+    frame_data_size_received: c.POINTER(c.c_int),
+    frame_data_size_sent: c.POINTER(c.c_int),
+    frame_info: c.POINTER(FRAMEINFO),
+    frame_info_size: c.c_int,
+    frame_info_size_received: c.POINTER(c.c_int),
+    frame_number: c.POINTER(c.c_int)
+) -> int:
+    """
+    As avRecvFrameData2, but returns the library's return code (the frame
+    size, or a negative AVErrorCode) rather than raising, and doesn't log its
+    arguments.  For receive loops, where no frame being ready is the common
+    case and is polled for many times a second.
+    """
+    if not shared.av_initialized:
+        raise TutkAVLibraryNotInitializedException()
+
+    func = shared.prototypes.get('avRecvFrameData2') \
+        or prototype('avRecvFrameData2')
+
+    return func(
+        channel_id,
+        frame_data_buffer,
+        frame_data_buffer_size,
+        frame_data_size_received,
+        frame_data_size_sent,
+        frame_info,
+        frame_info_size,
+        frame_info_size_received,
+        frame_number
+    )
+
+
 @requires_av_initialized
 @requires_tutk_library
 @log_args
@@ -180,6 +306,44 @@ def avSendIOCtrl(
     return rc
 
 
+@requires_av_initialized
+@requires_tutk_library
+@log_args
+def avRecvIOCtrl(
+    channel_id: c.c_int,
+    io_ctrl_type: c.POINTER(c.c_uint),
+    io_ctrl_buffer: c.POINTER(c.c_char),
+    io_ctrl_buffer_max_size: c.c_int,
+    timeout_ms: c.c_uint
+) -> c.c_int:
+    """
+    This function is used by AV servers or AV clients to receive a AV IO
+    control.  Returns the size of the IO control data received.
+    """
+    func = shared.library_instance.avRecvIOCtrl
+    func.argtypes = (
+        c.c_int,
+        c.POINTER(c.c_uint),
+        c.POINTER(c.c_char),
+        c.c_int,
+        c.c_uint
+    )
+    func.restype = c.c_int
+
+    rc = shared.library_instance.avRecvIOCtrl(
+        channel_id,
+        io_ctrl_type,
+        io_ctrl_buffer,
+        io_ctrl_buffer_max_size,
+        timeout_ms
+    )
+
+    if rc < AVErrorCode.AV_ER_NoERROR:
+        raise TutkLibraryException(AVErrorCode(rc))
+    
+    return rc
+
+
 @requires_av_initialized
 @requires_tutk_library
 @log_args
@@ -226,6 +390,42 @@ def avClientStart2(
     return rc
 
 
+@requires_av_initialized
+@requires_tutk_library
+@log_args
+def avClientExit(
+    session_id: c.c_int,
+    channel_id: c.c_ubyte
+) -> None:
+    """
+    Stops an avClientStart2() in progress on a session's IOTC channel from
+    another thread; the start returns #AV_ER_CLIENT_EXIT.
+    """
+    func = shared.library_instance.avClientExit
+    func.argtypes = (
+        c.c_int,
+        c.c_ubyte
+    )
+    func.restype = None
+
+    shared.library_instance.avClientExit(session_id, channel_id)
+
+
+@requires_av_initialized
+@requires_tutk_library
+@log_args
+def avClientStop(channel_id: c.c_int) -> None:
+    """
+    An AV client uses this function to stop receiving audio and video data
+    from an AV server and release the AV channel.
+    """
+    func = shared.library_instance.avClientStop
+    func.argtypes = (c.c_int,)
+    func.restype = None
+
+    shared.library_instance.avClientStop(channel_id)
+
+
 @requires_tutk_library
 @log_args
 def IOTC_Connect_ByUID(device_uid: c.POINTER(c.c_char)) -> c.c_int:
@@ -293,7 +493,74 @@ def IOTC_Connect_ByUID_Parallel(
 
     if rc < IOTCErrorCode.IOTC_ER_NoERROR:
         raise TutkLibraryException(IOTCErrorCode(rc))
-    
+
+    return rc
+
+
+@requires_tutk_library
+@log_args
+def IOTC_Connect_Stop_BySID(session_id: c.c_int) -> c.c_int:
+    """
+    Stops an IOTC_Connect_ByUID_Parallel() in progress on session_id from
+    another thread; the connect returns #IOTC_ER_ABORTED.  The session ID
+    still has to be released with IOTC_Session_Close().
+    """
+    func = shared.library_instance.IOTC_Connect_Stop_BySID
+    func.argtypes = (c.c_int,)
+    func.restype = c.c_int
+
+    rc = shared.library_instance.IOTC_Connect_Stop_BySID(session_id)
+
+    if rc < IOTCErrorCode.IOTC_ER_NoERROR:
+        raise TutkLibraryException(IOTCErrorCode(rc))
+
+    return rc
+
+
+@requires_tutk_library
+@log_args
+def IOTC_Setup_LANConnection_Timeout(timeout_ms: c.c_uint) -> None:
+    """
+    Sets how long, in milliseconds, connects search the local network for a
+    device before trying other paths.  The setting is process-wide.
+    """
+    func = shared.library_instance.IOTC_Setup_LANConnection_Timeout
+    func.argtypes = (c.c_uint,)
+    func.restype = None
+
+    shared.library_instance.IOTC_Setup_LANConnection_Timeout(timeout_ms)
+
+
+@requires_tutk_library
+@log_args
+def IOTC_Setup_P2PConnection_Timeout(timeout_ms: c.c_uint) -> None:
+    """
+    Sets how long, in milliseconds, connects attempt a P2P path through the
+    IOTC servers before falling back to relay.  The setting is process-wide.
+    """
+    func = shared.library_instance.IOTC_Setup_P2PConnection_Timeout
+    func.argtypes = (c.c_uint,)
+    func.restype = None
+
+    shared.library_instance.IOTC_Setup_P2PConnection_Timeout(timeout_ms)
+
+
+@requires_tutk_library
+@log_args
+def IOTC_Setup_DetectNetwork_Timeout(timeout_ms: c.c_uint) -> c.c_int:
+    """
+    Sets how long, in milliseconds, the library waits to reach the IOTC
+    master servers when detecting the network.  The setting is process-wide.
+    """
+    func = shared.library_instance.IOTC_Setup_DetectNetwork_Timeout
+    func.argtypes = (c.c_uint,)
+    func.restype = c.c_int
+
+    rc = shared.library_instance.IOTC_Setup_DetectNetwork_Timeout(timeout_ms)
+
+    if rc < IOTCErrorCode.IOTC_ER_NoERROR:
+        raise TutkLibraryException(IOTCErrorCode(rc))
+
     return rc
 
 
@@ -354,6 +621,20 @@ def IOTC_Lan_Search2(
     return rc
 
 
+@requires_tutk_library
+@log_args
+def IOTC_Set_Max_Session_Number(max_session_num: c.c_uint) -> None:
+    """
+    Sets the maximum number of IOTC sessions in this process.  Only takes
+    effect if called before IOTC_Initialize2().
+    """
+    func = shared.library_instance.IOTC_Set_Max_Session_Number
+    func.argtypes = (c.c_uint,)
+    func.restype = None
+
+    shared.library_instance.IOTC_Set_Max_Session_Number(max_session_num)
+
+
 @requires_tutk_library
 @log_args
 def IOTC_Initialize2(udp_port: c.c_ushort = 0) -> c.c_int:
@@ -424,6 +705,39 @@ def IOTC_Session_Channel_ON(
     return rc
 
 
+@requires_tutk_library
+@log_args
+def IOTC_Session_Set_Channel_RcvCb(
+    session_id: c.c_int,
+    channel_id: c.c_ubyte,
+    callback: SESSION_CHANNEL_RECV_CB,
+    user_data: c.c_void_p = None
+) -> None:
+    """
+    Registers a function the library calls, on its own thread, when data
+    arrives on an IOTC channel.  Pass None to unregister.  The caller must
+    keep callback referenced while it is registered.
+    """
+    func = shared.library_instance.IOTC_Session_Set_Channel_RcvCb
+    func.argtypes = (
+        c.c_int,
+        c.c_ubyte,
+        SESSION_CHANNEL_RECV_CB,
+        c.c_void_p
+    )
+    func.restype = c.c_int
+
+    rc = shared.library_instance.IOTC_Session_Set_Channel_RcvCb(
+        session_id,
+        channel_id,
+        callback or SESSION_CHANNEL_RECV_CB(),
+        user_data
+    )
+
+    if rc < IOTCErrorCode.IOTC_ER_NoERROR:
+        raise TutkLibraryException(IOTCErrorCode(rc))
+
+
 @requires_tutk_library
 @log_args
 def IOTC_Session_Get_Free_Channel(session_id: c.c_int) -> c.c_int:
@@ -451,14 +765,11 @@ def IOTC_Session_Get_Free_Channel(session_id: c.c_int) -> c.c_int:
 @log_args
 def IOTC_Session_Close(session_id: c.c_int) -> None:
     """
-    Close a session.
+    Close a session.  The library returns nothing, so failures aren't
+    reported.
     """
     func = shared.library_instance.IOTC_Session_Close
     func.argtypes = (c.c_int,)
-    func.restype = c.c_int
-
-    rc = \
-        shared.library_instance.IOTC_Session_Close(session_id)
+    func.restype = None
 
-    if rc != IOTCErrorCode.IOTC_ER_NoERROR:
-        raise TutkLibraryException(IOTCErrorCode(rc))
+    shared.library_instance.IOTC_Session_Close(session_id)